@@ -0,0 +1,194 @@
+#-*- coding: utf-8 -*-
+
+"""
+file: dictionaries.py
+
+Description: measures the matching of multiword dictionaries on documents.
+The multiword dictionaries of a directory feature (by default the french
+NER-directory) are matched on the segmented documents by walking their trie
+from every position of a sentence, as SEM used to, and with their
+Aho-Corasick automaton (see sem.storage.automaton). Both are also measured
+as RuleFeature uses them: the length of the match at every position. The
+results of both methods are checked to be identical. The directory feature
+itself is then measured feature by feature and in merged mode (a single
+automaton for the dictionaries of the directory).
+
+usage: python benchmarks/dictionaries.py [-n REPEAT] [-e ENRICH] [-d DIRECTORY] file [file ...]
+example: python benchmarks/dictionaries.py corpus.txt
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from __future__ import print_function
+
+import argparse
+import gc
+import os.path
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import sem.misc
+from sem.constants import NUL
+from sem.features import MultiwordDictionaryFeature
+from sem.features.directoryfeatures import DirectoryFeature
+from sem.modules.enrich import SEMModule as EnrichModule
+from sem.modules.segmentation import SEMModule as SegmentationModule
+
+DEFAULT_ENRICH = os.path.join(ROOT, u"resources", u"enrich", u"fr", u"NER.xml")
+
+def trie_walk(feature, list2dict):
+    # how MultiwordDictionaryFeature matched entries before automata.
+    l = [u"O"]*len(list2dict)
+    data = feature._value._data
+    tmp = data
+    length = len(list2dict)
+    fst = 0
+    lst = -1
+    cur = 0
+    while fst < length - 1:
+        cont = True
+        while cont and (cur < length):
+            if NUL in tmp: lst = cur
+            tmp = tmp.get(list2dict[cur][feature._entry], {})
+            cont = len(tmp) != 0
+            cur += int(cont)
+        if NUL in tmp: lst = cur
+        if lst != -1:
+            l[fst] = u"B" + feature._appendice
+            for i in range(fst+1, lst):
+                l[i] = u"I" + feature._appendice
+            fst = lst
+        else:
+            fst += 1
+        cur = fst
+        tmp = data
+        lst = -1
+    if NUL in data.get(list2dict[-1][feature._entry], []):
+        l[-1] = u"B" + feature._appendice
+    return l
+
+def trie_step(feature, list2dict, i):
+    # how MultiwordDictionaryFeature.step matched entries before automata.
+    tmp = feature._value._data
+    lst = -1
+    cur = i
+    if i < len(list2dict) - 1:
+        cont = True
+        while cont and (cur < len(list2dict)):
+            if NUL in tmp: lst = cur
+            tmp = tmp.get(list2dict[cur][feature._entry], {})
+            cont = len(tmp) != 0
+            cur += int(cont)
+        if NUL in tmp: lst = cur
+        return (lst - i if lst != -1 else 0)
+    return int(NUL in feature._value._data.get(list2dict[-1][feature._entry], []))
+
+def best_time(function, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        gc.disable()
+        start = time.time()
+        result = function()
+        laps = time.time() - start
+        gc.enable()
+        best = (laps if best is None else min(best, laps))
+    return best, result
+
+def measure(features, sentences, repeat):
+    start = time.time()
+    automata = [feature._value.automaton() for feature in features]
+    laps = time.time() - start
+    print(u"{0} multiword dictionaries, {1} entries, {2} sentences, {3} tokens".format(len(features), sum([len(automaton.entries()) for automaton in automata]), len(sentences), sum([len(p) for p in sentences])))
+    print(u"\tautomata built in:     {0:.3f}s ({1} states)".format(laps, sum([len(automaton) for automaton in automata])))
+
+    walk, walk_result = best_time(lambda: [trie_walk(feature, p) for feature in features for p in sentences], repeat)
+    automaton, automaton_result = best_time(lambda: [feature(p) for feature in features for p in sentences], repeat)
+    if walk_result != automaton_result:
+        raise RuntimeError(u"automata and tries do not give the same matches")
+    print(u"\ttrie walk:             {0:.3f}s".format(walk))
+    print(u"\tautomaton:             {0:.3f}s (x{1:.2f})".format(automaton, walk / automaton))
+
+    walk, walk_result = best_time(lambda: [trie_step(feature, p, i) for feature in features for p in sentences for i in range(len(p))], repeat)
+    automaton, automaton_result = best_time(lambda: [feature.step(p, i) for feature in features for p in sentences for i in range(len(p))], repeat)
+    if walk_result != automaton_result:
+        raise RuntimeError(u"automata and tries do not give the same match lengths")
+    print(u"\tsteps, trie walk:      {0:.3f}s".format(walk))
+    print(u"\tsteps, automaton:      {0:.3f}s (x{1:.2f})".format(automaton, walk / automaton))
+
+def measure_directory(directory, sentences, repeat):
+    merged = directory._merged
+    try:
+        directory._merged = False
+        separate, separate_result = best_time(lambda: [directory(p) for p in sentences], repeat)
+        directory._merged = True
+        start = time.time()
+        directory._groups = directory.merge()
+        laps = time.time() - start
+        together, together_result = best_time(lambda: [directory(p) for p in sentences], repeat)
+    finally:
+        directory._merged = merged
+    if separate_result != together_result:
+        raise RuntimeError(u"merged mode does not give the same tags")
+    print(u"\tdirectory:             {0:.3f}s".format(separate))
+    print(u"\tdirectory, merged:     {0:.3f}s (x{1:.2f}, automaton built in {2:.3f}s)".format(together, separate / together, laps))
+
+def main(args):
+    enrich = EnrichModule(path=args.enrich_file)
+    directories = [feature for feature in enrich.features if isinstance(feature, DirectoryFeature) and (args.directory is None or feature.name == args.directory)]
+    if not directories:
+        raise ValueError(u"no directory feature found in {0}".format(args.enrich_file))
+
+    documents = sem.misc.documents_from_list(args.infiles, "guess")
+    segmentation = SegmentationModule(args.tokeniser)
+    for document in documents:
+        segmentation.process_document(document)
+    sentences = [p for document in documents for p in document.corpus]
+    for p in sentences:
+        for token in p:
+            token[u"lower"] = token[u"word"].lower()
+
+    for directory in directories:
+        print(directory.name)
+        measure([feature for feature in directory.features if isinstance(feature, MultiwordDictionaryFeature)], sentences, args.repeat)
+        measure_directory(directory, sentences, args.repeat)
+
+parser = argparse.ArgumentParser(description="Measure the matching of multiword dictionaries with trie walks and with automata.")
+parser.add_argument("infiles", nargs="+",
+                    help="The documents to process.")
+parser.add_argument("-e", "--enrich", dest="enrich_file", default=DEFAULT_ENRICH,
+                    help="The enrich file defining the directory features (default: the french NER enrich file).")
+parser.add_argument("-d", "--directory", dest="directory",
+                    help="The name of the directory feature to measure (default: every directory feature).")
+parser.add_argument("-t", "--tokeniser", dest="tokeniser", default="fr",
+                    help="The tokeniser of the documents (default: %(default)s).")
+parser.add_argument("-n", "--repeat", dest="repeat", type=int, default=3,
+                    help="The number of runs, the best one is reported (default: %(default)s).")
+
+if __name__ == "__main__":
+    main(parser.parse_args())
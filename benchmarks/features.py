@@ -0,0 +1,145 @@
+#-*- coding: utf-8 -*-
+
+"""
+file: features.py
+
+Description: measures the evaluation of enrich features on documents. The
+pipes of a master file before each of its enrich pipes are run (enrich
+files may also be given directly, documents are then only segmented), then
+the features of the enrich are evaluated token by token, with the compiled
+plan (see sem.features.compiler) without cache and with the cache of token
+types, starting from an empty cache. The hit rate of the cache over the
+documents and the speedups are reported.
+
+usage: python benchmarks/features.py [-n REPEAT] [-m MASTER ...] [-e ENRICH ...] file [file ...]
+example: python benchmarks/features.py -m resources/master/fr/NER.xml corpus.txt
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from __future__ import print_function
+
+import argparse
+import copy
+import gc
+import os.path
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import sem.misc
+from sem.modules.tagger import load_master
+from sem.modules.enrich import SEMModule as EnrichModule
+from sem.modules.segmentation import SEMModule as SegmentationModule
+from sem.features.compiler import FeaturePlan, TYPE_CACHE_SIZE
+
+DEFAULT_MASTERS = [os.path.join(ROOT, u"resources", u"master", u"fr", name) for name in (u"NER.xml", u"pos-lefff.xml")]
+
+def per_token(enrich, sentences):
+    for p in sentences:
+        for feature in enrich.features:
+            if feature.is_sequence:
+                continue
+            for i in range(len(p)):
+                value = feature(p, i)
+                p[i][feature.name] = (int(value) if feature.is_boolean else (value if value is not None else feature.default()))
+
+def compiled(plans, cache_size):
+    # a new plan (with an empty cache) for each run, plans are kept in plans.
+    def evaluate(enrich, sentences):
+        plan = FeaturePlan(enrich.features, cache_size=cache_size)
+        plans.append(plan)
+        for p in sentences:
+            memo = {}
+            for feature in enrich.features:
+                if feature.is_sequence:
+                    continue
+                for token, value in zip(p, plan.values(feature, p, memo)):
+                    token[feature.name] = (int(value) if feature.is_boolean else (value if value is not None else feature.default()))
+    return evaluate
+
+def best_time(function, enrich, sentences, repeat):
+    best = None
+    for _ in range(repeat):
+        copies = copy.deepcopy(sentences)
+        gc.disable()
+        start = time.time()
+        function(enrich, copies)
+        laps = time.time() - start
+        gc.enable()
+        best = (laps if best is None else min(best, laps))
+    return best
+
+def measure(enrich, documents, repeat):
+    # sequence features are computed beforehand, the other features may use them.
+    sentences = copy.deepcopy([p for document in documents for p in document.corpus])
+    enrich.enrich_sentences(sentences)
+    baseline = best_time(per_token, enrich, sentences, repeat)
+    uncached = best_time(compiled([], 0), enrich, sentences, repeat)
+    plans = []
+    cached = best_time(compiled(plans, TYPE_CACHE_SIZE), enrich, sentences, repeat)
+    info = plans[-1].cache_info()
+    lookups = info[u"hits"] + info[u"misses"]
+    print(u"{0} ({1} tokens, {2} features)".format(os.path.relpath(enrich.source, ROOT), sum([len(p) for p in sentences]), len([f for f in enrich.features if not f.is_sequence])))
+    print(u"\ttoken by token:        {0:.3f}s".format(baseline))
+    print(u"\tcompiled, no cache:    {0:.3f}s (x{1:.2f})".format(uncached, baseline / uncached))
+    print(u"\tcompiled, type cache:  {0:.3f}s (x{1:.2f})".format(cached, baseline / cached))
+    print(u"\ttype cache hit rate:   {0:.1%} ({1} lookups, {2} types cached)".format((float(info[u"hits"]) / lookups if lookups else 0.0), lookups, info[u"size"]))
+
+def main(args):
+    for master in (args.masters or ([] if args.enrich_files else DEFAULT_MASTERS)):
+        pipeline = load_master(master)[0]
+        documents = sem.misc.documents_from_list(args.infiles, "guess")
+        enrich_pipes = [i for i, pipe in enumerate(pipeline.pipes) if isinstance(pipe, EnrichModule)]
+        for pipe in pipeline.pipes[ : (enrich_pipes[-1] + 1 if enrich_pipes else 0)]:
+            if isinstance(pipe, EnrichModule):
+                measure(pipe, documents, args.repeat)
+            for document in documents:
+                pipe.process_document(document)
+    
+    if args.enrich_files:
+        documents = sem.misc.documents_from_list(args.infiles, "guess")
+        segmentation = SegmentationModule(args.tokeniser)
+        for document in documents:
+            segmentation.process_document(document)
+        for enrich_file in args.enrich_files:
+            measure(EnrichModule(path=enrich_file), documents, args.repeat)
+
+parser = argparse.ArgumentParser(description="Measure the evaluation of enrich features token by token, compiled and with the cache of token types.")
+parser.add_argument("infiles", nargs="+",
+                    help="The documents to process.")
+parser.add_argument("-m", "--master", dest="masters", action="append",
+                    help="A master file whose enrich pipes are measured, may be given several times (default: the french NER and POS master files).")
+parser.add_argument("-e", "--enrich", dest="enrich_files", action="append",
+                    help="An enrich file that only uses words, measured on the documents segmented with --tokeniser. May be given several times.")
+parser.add_argument("-t", "--tokeniser", dest="tokeniser", default="fr",
+                    help="The tokeniser of the documents of --enrich files (default: %(default)s).")
+parser.add_argument("-n", "--repeat", dest="repeat", type=int, default=3,
+                    help="The number of runs, the best one is reported (default: %(default)s).")
+
+if __name__ == "__main__":
+    main(parser.parse_args())
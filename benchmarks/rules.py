@@ -0,0 +1,213 @@
+#-*- coding: utf-8 -*-
+
+"""
+file: rules.py
+
+Description: measures rule features on documents. Rules (from an enrich
+file, or a few rules on words by default) are evaluated on the segmented
+documents with the compiled engine of sem.features.rulefeatures and with
+the backtracking interpreter SEM used before, results are checked to be
+identical. Long sentences are where the interpreter is the slowest: it
+starts again from the next token after every failed match. The tokens of
+the documents can be regrouped in sentences of a given length to see it.
+
+usage: python benchmarks/rules.py [-n REPEAT] [-e ENRICH] [-l LENGTH] file [file ...]
+example: python benchmarks/rules.py -l 500 corpus.txt
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from __future__ import print_function
+
+import argparse
+import gc
+import os.path
+import sys
+import time
+
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import sem.misc
+from sem.features.rulefeatures import RuleFeature
+from sem.features.xml2feature import XML2Feature
+from sem.modules.enrich import SEMModule as EnrichModule
+from sem.modules.segmentation import SEMModule as SegmentationModule
+from sem.storage import Entry
+
+DEFAULT_RULES = [
+    u'<rule name="capitalised"><regexp action="check" card="+">^[A-Z]</regexp></rule>',
+    u'<rule name="quantity"><regexp action="check" card="+">^[0-9]</regexp><regexp action="check" card="?">^[a-z]</regexp></rule>',
+    u'<rule name="clause"><regexp action="check" card="*">^[a-z]</regexp><regexp action="check">^[,;:]$</regexp></rule>',
+]
+
+class LegacyRuleFeature(object):
+    """
+    The interpreter of rules SEM used before rules were compiled.
+    """
+
+    def __init__(self, features):
+        self._features = features
+
+    def _func(self, feat):
+        return (feat.__call__ if feat.is_boolean else feat.step)
+
+    def __call__(self, list2dict):
+        pos_beg = 0
+        pos_cur = 0
+        feat_index = 0
+        feat = self._features[feat_index]
+        remain_min = feat.min_match
+        remain_max = feat.max_match
+        matches = []
+        func = self._func(feat)
+        while pos_beg < len(list2dict)-1:
+            while remain_min <= 0 and not pos_cur >= len(list2dict) and not func(list2dict, pos_cur) and feat_index < len(self._features)-1:
+                feat_index += 1
+                feat = self._features[feat_index]
+                func = self._func(feat)
+                remain_min = feat.min_match
+                remain_max = feat.max_match
+            if feat_index >= len(self._features) or pos_cur >= len(list2dict):
+                pos_beg += 1
+                pos_cur = pos_beg
+                feat_index = 0
+                feat = self._features[feat_index]
+                func = self._func(feat)
+                remain_min = feat.min_match
+                remain_max = feat.max_match
+                continue
+            if func(list2dict, pos_cur):
+                N = int(func(list2dict, pos_cur))
+                pos_cur += N
+                remain_min -= 1
+                remain_max -= 1
+            elif remain_min <= 0:
+                if feat_index < len(self._features)-1:
+                    feat_index += 1
+                else:
+                    matches.append([pos_beg, pos_cur])
+                    pos_beg = pos_cur
+                    pos_cur = pos_beg
+                    feat_index = 0
+                feat = self._features[feat_index]
+                func = self._func(feat)
+                remain_min = feat.min_match
+                remain_max = feat.max_match
+            elif remain_max >= 0:
+                pos_beg += 1
+                pos_cur = pos_beg
+                feat_index = 0
+                feat = self._features[feat_index]
+                func = self._func(feat)
+                remain_min = feat.min_match
+                remain_max = feat.max_match
+            if remain_max == 0:
+                if feat_index < len(self._features)-1:
+                    feat_index += 1
+                else:
+                    feat_index = 0
+                    matches.append([pos_beg, pos_cur])
+                    pos_beg = pos_cur
+                    pos_cur = pos_beg
+                feat = self._features[feat_index]
+                func = self._func(feat)
+                remain_min = feat.min_match
+                remain_max = feat.max_match
+        return matches
+
+def chunks(tags):
+    # the [start, end] of the chunks of a BIO column, as the interpreter gives matches.
+    result = []
+    for index, tag in enumerate(tags):
+        if tag[0] == u"B":
+            result.append([index, index+1])
+        elif tag[0] == u"I":
+            result[-1][1] = index+1
+    return result
+
+def best_time(function, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        gc.disable()
+        start = time.time()
+        result = function()
+        laps = time.time() - start
+        gc.enable()
+        best = (laps if best is None else min(best, laps))
+    return best, result
+
+def measure(rule, sentences, repeat):
+    legacy = LegacyRuleFeature(rule._features)
+    interpreted, interpreted_result = best_time(lambda: [legacy(p) for p in sentences], repeat)
+    compiled, compiled_result = best_time(lambda: [chunks(rule(p)) for p in sentences], repeat)
+    if interpreted_result != compiled_result:
+        raise RuntimeError(u"{0}: the compiled rule does not give the same matches".format(rule.name))
+    print(u"{0} ({1} matches)".format(rule.name, sum([len(matches) for matches in compiled_result])))
+    print(u"\tinterpreted:  {0:.3f}s".format(interpreted))
+    print(u"\tcompiled:     {0:.3f}s (x{1:.2f})".format(compiled, interpreted / compiled))
+
+def main(args):
+    documents = sem.misc.documents_from_list(args.infiles, "guess")
+    segmentation = SegmentationModule(args.tokeniser)
+    for document in documents:
+        segmentation.process_document(document)
+    sentences = [p for document in documents for p in document.corpus]
+    if args.length:
+        tokens = [token for p in sentences for token in p]
+        sentences = [tokens[i : i+args.length] for i in range(0, len(tokens), args.length)]
+    print(u"{0} sentences, {1} tokens, longest sentence: {2} tokens".format(len(sentences), sum([len(p) for p in sentences]), max([len(p) for p in sentences] or [0])))
+
+    if args.enrich_file:
+        enrich = EnrichModule(path=args.enrich_file)
+        enrich.enrich_sentences(sentences) # rules may use the other features
+        rules = [feature for feature in enrich.features if isinstance(feature, RuleFeature)]
+    else:
+        x2f = XML2Feature([Entry(u"word")], path=os.path.join(ROOT, u"rules.xml"))
+        rules = [x2f.parse(ET.fromstring(rule)) for rule in DEFAULT_RULES]
+
+    for rule in rules:
+        measure(rule, sentences, args.repeat)
+
+parser = argparse.ArgumentParser(description="Measure rule features with the compiled engine and with the former interpreter.")
+parser.add_argument("infiles", nargs="+",
+                    help="The documents to process.")
+parser.add_argument("-e", "--enrich", dest="enrich_file",
+                    help="An enrich file whose rule features are measured (default: a few rules on words).")
+parser.add_argument("-t", "--tokeniser", dest="tokeniser", default="fr",
+                    help="The tokeniser of the documents (default: %(default)s).")
+parser.add_argument("-l", "--length", dest="length", type=int,
+                    help="Regroup the tokens of the documents in sentences of this length (default: keep the sentences).")
+parser.add_argument("-n", "--repeat", dest="repeat", type=int, default=3,
+                    help="The number of runs, the best one is reported (default: %(default)s).")
+
+if __name__ == "__main__":
+    main(parser.parse_args())
@@ -0,0 +1,101 @@
+#-*- coding: utf-8 -*-
+
+"""
+file: startup.py
+
+Description: measures the startup time of SEM's command-line interface.
+Each command is run several times with "python -X importtime" (python 3.7+)
+and the wall-clock time, total import time and the most expensive imports
+are reported.
+
+usage: python benchmarks/startup.py [-n REPEAT] [-t TOP] [command ...]
+example: python benchmarks/startup.py tagger -h
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os.path
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def parse_importtime(stderr):
+    """
+    Parse the output of "python -X importtime". Returns the list of
+    (module, self time, cumulative time, depth) in microseconds.
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith(u"import time:") or u"self [us]" in line:
+            continue
+        self_time, cumulative, module = line[len(u"import time:"):].split(u"|")
+        depth = (len(module) - len(module.lstrip())) // 2
+        imports.append((module.strip(), int(self_time), int(cumulative), depth))
+    return imports
+
+def run(command, repeat=5):
+    """
+    Run "python -X importtime -m sem <command>" repeat times. Returns the
+    best wall-clock time and the imports of the corresponding run.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        process = subprocess.Popen([sys.executable, "-X", "importtime", "-m", "sem"] + command, cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout, stderr = process.communicate()
+        laps = time.time() - start
+        if best is None or laps < best[0]:
+            best = (laps, parse_importtime(stderr.decode("utf-8", "replace")))
+    return best
+
+def main(args):
+    command = args.command or ["--version"]
+    laps, imports = run(command, args.repeat)
+    total = sum([cumulative for module, self_time, cumulative, depth in imports if depth == 0])
+    sem_modules = [module for module, self_time, cumulative, depth in imports if module == u"sem" or module.startswith(u"sem.")]
+
+    print(u"command: python -m sem {0}".format(u" ".join(command)))
+    print(u"wall-clock time (best of {0}): {1:.3f}s".format(args.repeat, laps))
+    print(u"total import time: {0:.3f}s".format(total / 1e6))
+    print(u"imported modules: {0} ({1} from sem)".format(len(imports), len(sem_modules)))
+    print(u"most expensive imports (cumulative):")
+    for module, self_time, cumulative, depth in sorted(imports, key=lambda x: -x[2])[:args.top]:
+        print(u"\t{0:>8.1f}ms  {1}".format(cumulative / 1e3, module))
+
+parser = argparse.ArgumentParser(description="Measure the startup time of SEM's command-line interface with python -X importtime.")
+parser.add_argument("command", nargs=argparse.REMAINDER,
+                    help='The SEM command to run (default: "--version").')
+parser.add_argument("-n", "--repeat", dest="repeat", type=int, default=5,
+                    help="The number of runs, the best one is reported (default: %(default)s).")
+parser.add_argument("-t", "--top", dest="top", type=int, default=15,
+                    help="The number of imports to display (default: %(default)s).")
+
+if __name__ == "__main__":
+    main(parser.parse_args())
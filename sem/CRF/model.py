@@ -32,7 +32,37 @@ import time, codecs
 import itertools
 
 from sem.storage import Coder
-from .template   import ListPattern
+from .template   import ListPattern, IdentityPattern
+
+def read_templates(filename, encoding="utf-8"):
+    """
+    Read the templates of a wapiti model without loading the rest of the
+    model.
+    """
+    templates = []
+    with codecs.open(filename, "r", encoding) as input_stream:
+        input_stream.readline() # "#mdl#" header
+        n_patterns = int(input_stream.readline().split(u"#")[-1].split(u"/")[0])
+        for i in range(n_patterns):
+            line = input_stream.readline().strip()
+            templates.append(ListPattern.from_string(line.split(u":",1)[1][:-1]))
+    return templates
+
+def template_columns(templates):
+    """
+    Return the set of columns used by templates.
+    """
+    return set([pattern.y for template in templates for pattern in template.patterns if isinstance(pattern, IdentityPattern)])
+
+def model_columns(filename, encoding="utf-8"):
+    """
+    Return the set of columns used by the templates of a wapiti model, None
+    if the model cannot be read.
+    """
+    try:
+        return template_columns(read_templates(filename, encoding))
+    except (IOError, OSError, ValueError, IndexError):
+        return None
 
 class Model(object):
     def __init__(self, constraints={}):
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+
+"""
+file: shape.py
+
+Description: the shape of a token: the character classes of templates
+(\\l, \\u, \\d and \\p) it contains, the classes of its first and last
+characters, its length and its prefixes and suffixes. Shapes are computed
+once per token type, features and template patterns that only need them
+do not search regular expressions in tokens.
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import re
+
+from sem.CRF.template import UNICODE_LOWERS, UNICODE_UPPERS, UNICODE_DIGITS, UNICODE_PUNCTS
+
+# character classes, the first four are those of templates, a character is in one of the first five.
+LOWER   = 1
+UPPER   = 2
+DIGIT   = 4
+PUNCT   = 8
+OTHER   = 16
+NEWLINE = 32 # "\n", where ^ and $ also match in templates
+CASED   = 64 # str.isupper, which is not exactly \u
+CLASSES = LOWER | UPPER | DIGIT | PUNCT | OTHER
+
+AFFIX_LENGTH = 4 # the length of the longest prefix and suffix kept in shapes
+SHAPE_CACHE_SIZE = 2**16 # the maximum number of token types whose shape is kept
+
+_classifiers = [
+    (LOWER, re.compile(u"[{0}]".format(UNICODE_LOWERS), re.U).match),
+    (UPPER, re.compile(u"[{0}]".format(UNICODE_UPPERS), re.U).match),
+    (DIGIT, re.compile(u"[{0}]".format(UNICODE_DIGITS), re.U).match),
+    (PUNCT, re.compile(u"[{0}]".format(UNICODE_PUNCTS), re.U).match),
+]
+_char_classes = {}
+_shapes = {}
+
+def char_class(char):
+    """
+    Return the classes of a character.
+    """
+    try:
+        return _char_classes[char]
+    except KeyError:
+        pass
+    classes = OTHER
+    for bit, match in _classifiers:
+        if match(char):
+            classes = bit
+            break
+    if char == u"\n":
+        classes |= NEWLINE
+    if char.isupper():
+        classes |= CASED
+    _char_classes[char] = classes
+    return classes
+
+class Shape(object):
+    """
+    The shape of a token.
+
+    Attributes
+    ----------
+    mask : int
+        the classes of the characters of the token.
+    first : int
+        the classes of the first character of the token (0 if it is empty).
+    last : int
+        the classes of the last character of the token (0 if it is empty).
+    length : int
+        the number of characters of the token.
+    prefixes : tuple of str
+        the prefixes of the token up to AFFIX_LENGTH characters, by length.
+    suffixes : tuple of str
+        the suffixes of the token up to AFFIX_LENGTH characters, by length.
+    """
+
+    __slots__ = ("mask", "first", "last", "length", "prefixes", "suffixes")
+
+    def __init__(self, value):
+        classes = [char_class(char) for char in value]
+        mask = 0
+        for bits in classes:
+            mask |= bits
+        self.mask = mask
+        self.first = (classes[0] if classes else 0)
+        self.last = (classes[-1] if classes else 0)
+        self.length = len(value)
+        affixes = range(1, min(len(value), AFFIX_LENGTH) + 1)
+        self.prefixes = tuple([value[: n] for n in affixes])
+        self.suffixes = tuple([value[-n :] for n in affixes])
+
+    def all(self, classes):
+        """
+        Return whether every character is in one of classes (True for the
+        empty token).
+        """
+        return not (self.mask & CLASSES & ~classes)
+
+    def prefix(self, n):
+        """
+        Return the prefix of length n, None if it is not kept.
+        """
+        if n == 0:
+            return u""
+        if n <= len(self.prefixes):
+            return self.prefixes[n-1]
+        return None
+
+    def suffix(self, n):
+        """
+        Return the suffix of length n, None if it is not kept.
+        """
+        if n == 0:
+            return u""
+        if n <= len(self.suffixes):
+            return self.suffixes[n-1]
+        return None
+
+def shape(value):
+    """
+    Return the shape of value, shapes are computed once per value (up to
+    SHAPE_CACHE_SIZE values, the cache is emptied when it is full).
+    """
+    try:
+        return _shapes[value]
+    except KeyError:
+        pass
+    result = Shape(value)
+    if len(_shapes) >= SHAPE_CACHE_SIZE:
+        _shapes.clear()
+    _shapes[value] = result
+    return result
+
+def clear_cache():
+    """
+    Empty the caches of shapes and character classes.
+    """
+    _shapes.clear()
+    _char_classes.clear()
+
+#
+# tests of template patterns that only need the shape of tokens
+#
+
+_ESCAPES = {u"l": LOWER, u"u": UPPER, u"d": DIGIT, u"p": PUNCT, u"a": LOWER | UPPER, u"w": LOWER | UPPER | DIGIT}
+_META = u".^$*+?{}[]()|\\"
+_atom = re.compile(u"\\\\([{0}])([*+]?)|([^{1}])".format(u"".join(_ESCAPES), re.escape(_META)), re.U)
+
+def _parse(pattern):
+    # the anchors and atoms (escape or literal, quantifier) of a pattern, None if it has other constructs.
+    start = pattern.startswith(u"^")
+    end = pattern.endswith(u"$") and not pattern.endswith(u"\\$") and len(pattern) > int(start)
+    body = pattern[int(start) : len(pattern) - int(end)]
+    atoms = []
+    position = 0
+    while position < len(body):
+        found = _atom.match(body, position)
+        if found is None:
+            return None
+        atoms.append((found.group(1), found.group(2) or u"", found.group(3)))
+        position = found.end()
+    return start, end, atoms
+
+def shape_test(pattern):
+    """
+    Return a function telling, from the shape of a token, whether pattern
+    (a template regular expression, with \\l, \\u, \\d, \\p, \\a and \\w
+    classes) is found in the token. None if the pattern needs a regular
+    expression search. The function returns None for tokens with a newline
+    (^ and $ also match around newlines in templates).
+    """
+    parsed = _parse(pattern)
+    if parsed is None or not parsed[2]:
+        return None
+    start, end, atoms = parsed
+
+    if all([escape is None for escape, quantifier, literal in atoms]): # a string
+        string = u"".join([literal for escape, quantifier, literal in atoms])
+        n = len(string)
+        def test(value):
+            signature = shape(value)
+            if signature.mask & NEWLINE:
+                return None
+            if start and end:
+                return value == string
+            if start:
+                return (signature.prefix(n) if n <= AFFIX_LENGTH else value[: n]) == string
+            if end:
+                return (signature.suffix(n) if n <= AFFIX_LENGTH else value[-n :]) == string
+            return string in value
+        return test
+
+    escapes = set([escape for escape, quantifier, literal in atoms])
+    if None in escapes:
+        return None
+
+    if start and end and len(escapes) == 1: # every character in a class, between two lengths
+        classes = _ESCAPES[escapes.pop()]
+        minimum = len([1 for escape, quantifier, literal in atoms if quantifier != u"*"])
+        bounded = all([quantifier == u"" for escape, quantifier, literal in atoms])
+        def test(value):
+            signature = shape(value)
+            if signature.mask & NEWLINE:
+                return None
+            return signature.all(classes) and signature.length >= minimum and (not bounded or signature.length == minimum)
+        return test
+
+    if len(atoms) != 1 or atoms[0][1] == u"*": # \u* is found everywhere
+        return None
+    classes = _ESCAPES[atoms[0][0]]
+    if start: # ^\u and ^\u+
+        def test(value):
+            signature = shape(value)
+            return (None if signature.mask & NEWLINE else bool(signature.first & classes))
+    elif end: # \u$ and \u+$
+        def test(value):
+            signature = shape(value)
+            return (None if signature.mask & NEWLINE else bool(signature.last & classes))
+    else: # \u and \u+
+        def test(value):
+            return bool(shape(value).mask & classes)
+    return test
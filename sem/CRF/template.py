@@ -37,6 +37,8 @@ UNICODE_PUNCTS = u"-֊־᠆‒–—―⸗〜〰゠︱﹣－_︳︴﹍﹎﹏＿\
 UNICODE_ALPHAS = UNICODE_LOWERS + UNICODE_UPPERS
 UNICODE_ALPHANUMS = UNICODE_ALPHAS + UNICODE_DIGITS
 
+TEST_CACHE_SIZE = 2**16 # the maximum number of cells whose result is kept by a TestPattern
+
 class Pattern(object):
     def __init__(self, case_insensitive=False, *args):
         self._case_insensitive = case_insensitive
@@ -63,7 +65,7 @@ class ConstantPattern(Pattern):
         return self._value
 
 class IdentityPattern(Pattern):
-    __pattern = re.compile(u"%x\\[(-?[0-9]+),([0-9]+)\\]")
+    __pattern = re.compile(u"%x\\[(-?[0-9]+),([0-9]+)\\]", re.I)
     
     def __init__(self, x, y, case_insensitive=False, column=None, *args):
         self._x = x
@@ -144,6 +146,23 @@ class RegexPattern(IdentityPattern):
 class TestPattern(RegexPattern):
     __pattern = re.compile('%t\\[\s*(-?[0-9]+),([0-9]+),"(.+)"\\]', re.I)
     
+    def __init__(self, x, y, pattern, case_insensitive=False, *args):
+        super(TestPattern, self).__init__(x, y, pattern, case_insensitive, *args)
+        self._source = pattern
+        self._test = _shape_test(pattern)
+        self._results = {}
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_test"]
+        del state["_results"]
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._test = _shape_test(self._source)
+        self._results = {}
+    
     def __str__(self):
         p = self._pattern.pattern[:]
         for x,y in RegexPattern.sub().items():
@@ -159,7 +178,16 @@ class TestPattern(RegexPattern):
     def instanciate(self, matrix, index, case_insensitive=False):
         cell = super(TestPattern, self).instanciate(matrix, index)
         
-        return unicode(self._pattern.search(cell) is not None).lower()
+        result = self._results.get(cell)
+        if result is None:
+            found = (self._test(cell) if self._test is not None else None) # the shape of the cell may be enough
+            if found is None:
+                found = self._pattern.search(cell) is not None
+            result = unicode(found).lower()
+            if len(self._results) >= TEST_CACHE_SIZE:
+                self._results.clear()
+            self._results[cell] = result
+        return result
     
     @classmethod
     def from_string(cls, string, case_insensitive=False, column=None):
@@ -232,12 +260,16 @@ class ListPattern(Pattern):
             patterns.append(ConstantPattern(string[prev : ]))
         return ListPattern(patterns)
 
+def _shape_test(pattern):
+    from sem.CRF.shape import shape_test # shape uses the character classes of this module
+    return shape_test(pattern)
+
 def pattern_factory(string):
     low = string.lower()
-    if string.startswith("%x"):
+    if low.startswith("%x"):
         return IdentityPattern.from_string(string, case_insensitive=string[1].isupper(), column=None)
-    elif string.startswith("%t"):
+    elif low.startswith("%t"):
         return TestPattern.from_string(string, case_insensitive=string[1].isupper(), column=None)
-    elif string.startswith("%m"):
+    elif low.startswith("%m"):
         return MatchPattern.from_string(string, case_insensitive=string[1].isupper(), column=None)
     return ConstantPattern(string)
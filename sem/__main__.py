@@ -35,14 +35,12 @@ from __future__ import print_function
 
 import logging
 import os.path
-import unittest
 import sys
 
 import sem
 import sem.modules
 
 from sem.logger import logging_format
-from sem.misc import find_suggestions
 
 sem_logger = logging.getLogger("sem")
 
@@ -65,22 +63,20 @@ def main(args=None):
         random.shuffle(l)
         return l[0]
         
-    modules = {}
-    for element in os.listdir(os.path.join(sem.SEM_HOME, "modules")):
-        m = element[:-3]
-        if valid_module(element):
-            modules[m] = sem.modules.get_package(m)
+    # only the module that is called is imported.
+    modules = sorted([element[:-3] for element in os.listdir(os.path.join(sem.SEM_HOME, "modules")) if valid_module(element)])
     name = os.path.basename(sys.argv[0])
     operation = (sys.argv[1] if len(sys.argv) > 1 else "-h")
 
     if operation in modules:
-        module = modules[operation]
+        module = sem.modules.get_package(operation)
         module.main(sem.argument_parser.parse_args())
     elif operation in ["-h", "--help"]:
         print("Usage: {0} <module> [module arguments]\n".format(name))
         print("Module list:")
+        width = max([len(module) for module in modules])
         for module in modules:
-            print("\t{0}".format(module))
+            print("\t{0}  {1}".format(module.ljust(width), sem.modules.descriptions.get(module, u"")).rstrip())
         print()
         print("for SEM's current version: -v or --version\n")
         print("for informations about the last revision: -i or --informations")
@@ -94,9 +90,11 @@ def main(args=None):
         except UnicodeEncodeError:
             print(informations.encode(sys.getfilesystemencoding(), errors="replace"))
     elif operation == "--test":
+        import unittest
         testsuite = unittest.TestLoader().discover(os.path.join(sem.SEM_HOME, "tests"))
         unittest.TextTestRunner(verbosity=2).run(testsuite)
     else:
+        from sem.misc import find_suggestions
         print("Module not found: " + operation)
         suggestions = find_suggestions(operation, modules)
         if len(suggestions) > 0:
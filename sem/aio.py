@@ -0,0 +1,167 @@
+#-*- coding: utf-8 -*-
+
+"""
+file: aio.py
+
+Description: asyncio interface to pipelines (python 3.5+). Pipes run in an
+executor so that they do not block the event loop, wapiti is called through
+asyncio subprocess streams when the python-wapiti wrapper is not available.
+The number of documents processed at once in an event loop can be limited.
+
+usage:
+    document = await pipeline.aprocess(document)
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import threading
+import weakref
+
+import sem.wapiti
+
+from sem.logger import default_handler
+from sem.misc import check_model_available
+
+aio_logger = logging.getLogger("sem.aio")
+aio_logger.addHandler(default_handler)
+
+_lock = threading.Lock()
+_executor = None
+_managed = False # whether _executor was created by SEM
+_max_workers = None
+_max_concurrent = None
+_semaphores = weakref.WeakKeyDictionary() # event loop: semaphore limiting the documents processed at once
+
+def configure(max_workers=None, max_concurrent=None, executor=None):
+    """
+    Configure the asyncio interface.
+
+    Parameters
+    ----------
+    max_workers : int
+        the number of threads of the default executor (default: the default
+        of concurrent.futures.ThreadPoolExecutor).
+    max_concurrent : int
+        the maximum number of documents processed at once in an event loop,
+        other documents wait for their turn (None: no limit).
+    executor : concurrent.futures.Executor
+        the executor pipes run in, replaces the default one. It is not shut
+        down by SEM.
+    """
+    global _executor, _managed, _max_workers, _max_concurrent
+    with _lock:
+        if _managed:
+            _executor.shutdown(wait=False)
+        _max_workers = max_workers
+        _executor = executor
+        _managed = False
+        _max_concurrent = max_concurrent
+        _semaphores.clear()
+
+def get_executor():
+    global _executor, _managed
+    with _lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(max_workers=_max_workers)
+            _managed = True
+        return _executor
+
+def _semaphore(loop):
+    if _max_concurrent is None:
+        return None
+    with _lock:
+        if loop not in _semaphores:
+            _semaphores[loop] = asyncio.Semaphore(_max_concurrent)
+        return _semaphores[loop]
+
+async def run_in_executor(function, *args, **kwargs):
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(function, *args, **kwargs))
+
+async def alabel_unicode(corpus_unicode, model, encoding):
+    """
+    Label CoNLL-formatted data with "wapiti label --label" without blocking
+    the event loop. If the task is cancelled, wapiti is killed.
+    """
+    check_model_available(model, logger=aio_logger)
+    process = await asyncio.create_subprocess_exec(*sem.wapiti.label_command(model), stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    try:
+        stdout, stderr = await process.communicate(corpus_unicode.encode(encoding))
+    except asyncio.CancelledError:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    sem.wapiti.check_status(process.returncode, stderr, encoding)
+    return sem.wapiti.parse_labels(stdout, encoding)
+
+async def awapiti_label(pipe, document, encoding="utf-8", **kwargs):
+    from sem.modules.wapiti_label import wapiti_api
+    if wapiti_api or pipe.field in document.corpus.fields:
+        await run_in_executor(pipe.process_document, document, encoding=encoding, **kwargs)
+        return
+    fields = (pipe.annotation_fields if pipe.annotation_fields else document.corpus.fields)
+    tags = await alabel_unicode(sem.wapiti.corpus_unicode(document.corpus, fields, pipe.columns), pipe.model, encoding)
+    document.corpus.fields.append(pipe.field)
+    document.add_annotation_from_tags(tags, pipe.field, pipe.field)
+
+def _handler(pipe):
+    # pipes that have a non-blocking implementation, the others run in the executor.
+    from sem.modules.wapiti_label import SEMModule as WapitiLabelModule
+    if isinstance(pipe, WapitiLabelModule):
+        return awapiti_label
+    return None
+
+async def aprocess_pipe(pipe, document, **kwargs):
+    handler = _handler(pipe)
+    if handler is not None:
+        await handler(pipe, document, **kwargs)
+    else:
+        await run_in_executor(pipe.process_document, document, **kwargs)
+
+async def aprocess(pipeline, document, **kwargs):
+    """
+    Process document with pipeline without blocking the event loop. When the
+    task is cancelled, the pipe that is running in the executor (if any)
+    finishes, but the next ones are not run.
+    """
+    semaphore = _semaphore(asyncio.get_event_loop())
+    if semaphore is not None:
+        await semaphore.acquire()
+    try:
+        pipes = pipeline.pipes # pipes may be swapped by reload, a document is processed by a single version
+        for pipe in pipes:
+            if pipeline.pipeline_mode == "all" or pipe.pipeline_mode in ("all", pipeline.pipeline_mode):
+                await aprocess_pipe(pipe, document, **kwargs)
+            else:
+                aio_logger.warn(u"pipe %s not executed", pipe)
+    finally:
+        if semaphore is not None:
+            semaphore.release()
+    return document
@@ -28,9 +28,9 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import sys
+
 from .annotator import Annotator
-from .wapiti import Annotator as WapitiAnnotator
-from .lexicon import Annotator as LexiconAnnotator
 
 try:
     from importlib import import_module
@@ -45,3 +45,36 @@ def get_package(name):
 def get_annotator(name):
     module = import_module("sem.annotators.{0}".format(name))
     return module.Annotator
+
+_exported_annotators = {
+    "WapitiAnnotator": "wapiti",
+    "LexiconAnnotator": "lexicon",
+}
+
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        # annotators are only imported when they are first accessed (PEP 562).
+        try:
+            annotator = get_annotator(_exported_annotators[name])
+        except KeyError:
+            raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+        globals()[name] = annotator
+        return annotator
+else:
+    import types
+    
+    class _LazyPackage(types.ModuleType):
+        # PEP 562 is not available, the package is replaced in sys.modules by
+        # a module whose __getattr__ imports the annotators when they are first accessed.
+        def __getattr__(self, name):
+            try:
+                annotator = get_annotator(_exported_annotators[name])
+            except KeyError:
+                raise AttributeError("module {0!r} has no attribute {1!r}".format(self.__name__, name))
+            setattr(self, name, annotator)
+            return annotator
+    
+    _package = _LazyPackage(__name__, __doc__)
+    _package.__dict__.update(globals())
+    _package._module = sys.modules[__name__] # keeps the globals of the functions above alive
+    sys.modules[__name__] = _package
@@ -89,44 +89,9 @@ class LexicaFeature(MultiwordDictionaryFeature):
     
     def __call__(self, list2dict, *args, **kwargs):
         l           = [u"O" for _ in range(len(list2dict))]
-        tmp         = self._value._data
-        length      = len(list2dict)
-        fst         = 0
-        lst         = -1 # last match found
-        cur         = 0
         entry       = self._entry
-        ckey        = None  # Current KEY
-        entities    = []
-        value       = None
-        while fst < length - 1:
-            cont = True
-            while cont and (cur < length):
-                ckey  = list2dict[cur][entry]
-                if l[cur] == "O":
-                    if NUL in tmp:
-                        lst = cur
-                        value = tmp[NUL]
-                    tmp   = tmp.get(ckey, {})
-                    cont  = len(tmp) != 0
-                    cur  += int(cont)
-                else:
-                    cont = False
-            
-            if NUL in tmp:
-                lst = cur
-                value = tmp[NUL]
-            
-            if lst != -1:
-                entities.append([value, fst, lst])
-                fst = lst
-                cur = fst
-                value = None
-            else:
-                fst += 1
-                cur  = fst
-            
-            tmp = self._value._data
-            lst = -1
+        automaton   = self._value.automaton()
+        entities    = [[automaton.value(state), fst, lst] for fst, lst, state in self.matches(self.tokens(list2dict))]
         
         if NUL in self._value._data.get(list2dict[-1][entry], []):
             entities.append([self._value._data[list2dict[-1][entry]][NUL], len(list2dict)-1, len(list2dict)])
@@ -0,0 +1,229 @@
+#-*- coding: utf-8 -*-
+
+"""
+file: batch.py
+
+Description: resumable batch runs over a manifest of files. The manifest
+lists the files to process, one per line. Every processed file is recorded
+in an append-only journal along with the hash of its output, so that a run
+that stopped can be started again without processing completed files. A
+manifest can be split in shards so that several processes (or machines)
+share it without processing the same file twice.
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import codecs
+import hashlib
+import json
+import logging
+import os
+import os.path
+import time
+
+import sem.cache
+
+from sem.logger import default_handler
+
+batch_logger = logging.getLogger("sem.batch")
+batch_logger.addHandler(default_handler)
+
+DONE = u"done"
+FAILED = u"failed"
+
+def manifest_entries(filename, encoding="utf-8"):
+    """
+    Read the files listed in a manifest, one per line, as (entry, path)
+    couples. Empty lines and lines starting with "#" are ignored. entry is
+    the line of the manifest, normalised with "/" separators, path is the
+    file to open: relative entries are relative to the directory of the
+    manifest. Shards and journals are keyed on entries, so that machines
+    mounting the manifest at different paths agree on them.
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    entries = []
+    with codecs.open(filename, "r", encoding) as input_stream:
+        for line in input_stream:
+            line = line.strip()
+            if not line or line.startswith(u"#"):
+                continue
+            entry = os.path.normpath(line).replace(os.sep, u"/")
+            entries.append((entry, os.path.normpath(os.path.join(directory, os.path.expanduser(line)))))
+    return entries
+
+def read_manifest(filename, encoding="utf-8"):
+    """
+    Read the files listed in a manifest (see manifest_entries), returns the
+    paths to open.
+    """
+    return [path for entry, path in manifest_entries(filename, encoding)]
+
+def parse_shard(shard):
+    """
+    Parse a "i/N" shard specification, i is in [0, N). Returns (i, N).
+    """
+    try:
+        index, count = [int(value) for value in shard.split(u"/")]
+    except ValueError:
+        raise ValueError(u'invalid shard "{0}", expected "i/N"'.format(shard))
+    if count < 1 or not (0 <= index < count):
+        raise ValueError(u'invalid shard "{0}", expected 0 <= i < N'.format(shard))
+    return index, count
+
+def shard_of(entry, count):
+    """
+    Return the shard of a manifest entry among count shards. It only depends
+    on the entry, so files keep their shard when the manifest is reordered
+    or extended, or read from another mount point.
+    """
+    return int(hashlib.md5(entry.encode("utf-8")).hexdigest(), 16) % count
+
+def select_shard(entries, index, count, key=None):
+    """
+    Return the entries of shard index among count shards. key gives the
+    manifest entry of an element of entries (default: the element itself).
+    """
+    key = key or (lambda entry: entry)
+    return [entry for entry in entries if shard_of(key(entry), count) == index]
+
+def journal_name(manifest, shard=None):
+    """
+    The default journal of a manifest. Each shard has its own journal, so
+    that processes never write in the same file.
+    """
+    if shard is None or shard[1] == 1:
+        return manifest + u".journal"
+    return u"{0}.{1}-of-{2}.journal".format(manifest, shard[0], shard[1])
+
+class Journal(object):
+    """
+    An append-only journal of the files processed in a batch run. Each line
+    is a JSON record with the path of the input file (its manifest entry,
+    see manifest_entries), its status ("done" or
+    "failed") and, when done, the path and SHA-1 of the output. Records are
+    flushed to disk as soon as they are written. A truncated last line (the
+    process was killed while writing it) is ignored when reading.
+
+    Attributes
+    ----------
+    _filename : str
+        the path to the journal file.
+    _done : dict
+        the record of every completed file.
+    _failures : dict
+        the number of failed attempts of files that are not completed.
+    """
+
+    def __init__(self, filename):
+        self._filename = os.path.abspath(filename)
+        self._done = {}
+        self._failures = {}
+        self._stream = None
+
+        if os.path.exists(self._filename):
+            self._replay()
+
+    @property
+    def filename(self):
+        return self._filename
+
+    @property
+    def done(self):
+        return self._done
+
+    @property
+    def failures(self):
+        return self._failures
+
+    def _replay(self):
+        with codecs.open(self._filename, "r", "utf-8") as input_stream:
+            for nth, line in enumerate(input_stream, 1):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    batch_logger.warn(u"ignoring unreadable line %i of journal %s", nth, self._filename)
+                    continue
+                self._update(record)
+
+    def _update(self, record):
+        path = record[u"path"]
+        if record[u"status"] == DONE:
+            self._done[path] = record
+            self._failures.pop(path, None)
+        elif path not in self._done:
+            self._failures[path] = self._failures.get(path, 0) + 1
+
+    def is_done(self, path):
+        return path in self._done
+
+    def attempts(self, path):
+        return self._failures.get(path, 0)
+
+    def write(self, record):
+        if self._stream is None:
+            directory = os.path.dirname(self._filename)
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            truncated = False
+            if os.path.exists(self._filename) and os.path.getsize(self._filename) > 0:
+                with open(self._filename, "rb") as input_stream:
+                    input_stream.seek(-1, os.SEEK_END)
+                    truncated = (input_stream.read(1) != b"\n")
+            self._stream = codecs.open(self._filename, "a", "utf-8")
+            # a line left truncated by a crash must not be merged with the next record.
+            if truncated:
+                self._stream.write(u"\n")
+        record = dict(record)
+        record.setdefault(u"time", time.time())
+        self._stream.write(json.dumps(record, sort_keys=True) + u"\n")
+        self._stream.flush()
+        os.fsync(self._stream.fileno())
+        self._update(record)
+
+    def record_done(self, path, output=None):
+        record = {u"path": path, u"status": DONE, u"output": output}
+        if output is not None and os.path.exists(output):
+            record[u"sha1"] = sem.cache.path_digest(output)
+        self.write(record)
+
+    def record_failure(self, path, error):
+        self.write({u"path": path, u"status": FAILED, u"error": error})
+
+    def pending(self, paths, max_attempts=3):
+        """
+        Return the paths that are neither done nor failed max_attempts times.
+        """
+        return [path for path in paths if path not in self._done and self.attempts(path) < max_attempts]
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
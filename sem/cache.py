@@ -0,0 +1,455 @@
+#-*- coding: utf-8 -*-
+
+"""
+file: cache.py
+
+Description: an on-disk cache of processed documents. Entries are keyed by
+the content of the document and by a fingerprint of the pipeline (master
+file and the resources it uses: models, dictionaries, enrich files, etc.).
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import os.path
+import shutil
+import tempfile
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+try:
+    from xml.etree import cElementTree as ET
+except ImportError:
+    from xml.etree import ElementTree as ET
+
+import sem
+import sem.misc
+
+from sem.logger import default_handler
+from sem.storage import Corpus, Segmentation, Annotation, Tag, Span
+
+cache_logger = logging.getLogger("sem.cache")
+cache_logger.addHandler(default_handler)
+
+_entry_extension = u".pkl"
+_stats_filename = u"stats.json"
+
+def resolve_path(value, reference):
+    """
+    Resolve a value of a master (or enrich) file the same way the tagger
+    does: "~/" is expanded and relative paths are relative to the directory
+    of the reference file.
+    """
+    if value.startswith(u"~/"):
+        return os.path.expanduser(value)
+    elif sem.misc.is_relative_path(value):
+        return os.path.abspath(os.path.join(os.path.dirname(reference), value))
+    return value
+
+def add_resource(path, resources):
+    """
+    Add path to the set of resources. XML files (eg: enrich files) are
+    looked into to find the files they use. Wapiti models that are not
+    extracted yet are given as their archive.
+    """
+    if path in resources:
+        return
+    if os.path.exists(path):
+        resources.add(path)
+        if path.endswith(u".xml") and os.path.isfile(path):
+            try:
+                root = ET.parse(path).getroot()
+            except Exception: # not an XML file, nothing more to find
+                return
+            for node in root.iter():
+                subpath = node.attrib.get("path")
+                if subpath:
+                    add_resource(os.path.abspath(os.path.join(os.path.dirname(path), subpath)), resources)
+    elif os.path.exists(path + u".tar.gz"):
+        resources.add(path + u".tar.gz")
+
+def file_resources(path):
+    """
+    Return the sorted list of files and directories path depends on,
+    including itself.
+    """
+    resources = set()
+    add_resource(os.path.abspath(path), resources)
+    return sorted(resources)
+
+def master_resources(master):
+    """
+    Return the sorted list of files and directories a master file depends
+    on.
+    """
+    resources = set()
+    xmlpipes = list(ET.parse(os.path.abspath(master)).getroot())[0]
+    for xmlpipe in xmlpipes.iter(): # pipes may be nested in parallel branches
+        for value in xmlpipe.attrib.values():
+            path = resolve_path(value, master)
+            if path != value or os.path.isabs(path):
+                add_resource(path, resources)
+    return sorted(resources)
+
+def update_with_path(digest, path):
+    """
+    Update digest with the content of path. Directories are walked in a
+    deterministic order.
+    """
+    if os.path.isdir(path):
+        for root, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                filepath = os.path.join(root, filename)
+                digest.update(os.path.relpath(filepath, path).encode("utf-8"))
+                update_with_path(digest, filepath)
+    else:
+        with open(path, "rb") as input_stream:
+            for chunk in iter(lambda: input_stream.read(2**16), b""):
+                digest.update(chunk)
+
+def path_digest(path):
+    digest = hashlib.sha1()
+    update_with_path(digest, path)
+    return digest.hexdigest()
+
+def path_signature(path):
+    """
+    Return a cheap (mtime, size) signature of path. For directories, the
+    latest mtime and the total size of the files it contains are used.
+    """
+    if not os.path.isdir(path):
+        stat = os.stat(path)
+        return (stat.st_mtime, stat.st_size)
+    mtime = os.stat(path).st_mtime
+    size = 0
+    for root, dirnames, filenames in os.walk(path):
+        for filename in filenames:
+            stat = os.stat(os.path.join(root, filename))
+            mtime = max(mtime, stat.st_mtime)
+            size += stat.st_size
+    return (mtime, size)
+
+def pipeline_fingerprint(master, force_format="default", pipeline_mode="all"):
+    """
+    Return a hash identifying the result of a master pipeline: SEM version,
+    master file, output format and every resource used by the pipeline.
+    """
+    digest = hashlib.sha1()
+    digest.update(sem.version().encode("utf-8"))
+    digest.update(u"{0}|{1}".format(force_format, pipeline_mode).encode("utf-8"))
+    update_with_path(digest, master)
+    for resource in master_resources(master):
+        digest.update(resource.encode("utf-8"))
+        update_with_path(digest, resource)
+    return digest.hexdigest()
+
+def document_key(document):
+    """
+    Return a hash of everything in document that may change the output of
+    a pipeline: its content, metadatas, corpus and existing annotations.
+    """
+    digest = hashlib.sha1()
+    digest.update((document.content or u"").encode("utf-8"))
+    for key, value in sorted(document.metadatas.items()):
+        digest.update(u"{0}={1}".format(key, value).encode("utf-8"))
+    digest.update(u"\t".join(document.corpus.fields).encode("utf-8"))
+    for sentence in document.corpus:
+        for token in sentence:
+            digest.update(u"\t".join([u"{0}".format(token.get(field)) for field in document.corpus.fields]).encode("utf-8"))
+        digest.update(b"\n")
+    for name, segmentation in sorted(document.segmentations.items()):
+        digest.update(name.encode("utf-8"))
+        digest.update(u" ".join([u"{0}:{1}".format(span.lb, span.ub) for span in segmentation]).encode("utf-8"))
+    for name, annotation in sorted(document.annotations.items()):
+        digest.update(name.encode("utf-8"))
+        digest.update(u" ".join([u"{0}:{1}:{2}".format(tag.value, tag.lb, tag.ub) for tag in annotation]).encode("utf-8"))
+    return digest.hexdigest()
+
+def document_state(document):
+    """
+    Return the parts of a document a pipeline may create, as plain python
+    data.
+    """
+    def reference_name(reference):
+        if reference is None or sem.misc.is_string(reference):
+            return reference
+        return reference.name
+
+    segmentations = [(seg.name, reference_name(seg.reference), [(span.lb, span.ub) for span in seg]) for seg in document.segmentations.values()]
+    annotations = [(annot.name, reference_name(annot.reference), [(tag.value, tag.lb, tag.ub) for tag in annot]) for annot in document.annotations.values()]
+    return {
+        u"metadatas": dict(document.metadatas),
+        u"segmentations": segmentations,
+        u"annotations": annotations,
+        u"fields": document.corpus.fields[:],
+        u"sentences": document.corpus.sentences,
+    }
+
+def restore_document_state(document, state):
+    """
+    Set the segmentations, annotations and corpus of document from a state
+    given by document_state.
+    """
+    document._segmentations = {}
+    document._annotations = {}
+    document._metadatas = state[u"metadatas"]
+
+    remaining = list(state[u"segmentations"])
+    while remaining: # segmentations referencing others have to be added after them
+        not_added = []
+        for name, reference, spans in remaining:
+            if reference is not None and document.segmentation(reference) is None:
+                not_added.append((name, reference, spans))
+                continue
+            reference = (document.segmentation(reference) if reference is not None else None)
+            document.add_segmentation(Segmentation(name, reference=reference, spans=[Span(lb, ub) for lb, ub in spans]))
+        if len(not_added) == len(remaining):
+            raise ValueError("Cannot resolve segmentation references: {0}".format(u", ".join([r[0] for r in remaining])))
+        remaining = not_added
+
+    for name, reference, tags in state[u"annotations"]:
+        reference = (document.segmentation(reference) if reference is not None else None)
+        document.add_annotation(Annotation(name, reference=reference, annotations=[Tag(value, lb, ub) for value, lb, ub in tags]))
+
+    document._corpus = Corpus(state[u"fields"], sentences=state[u"sentences"])
+
+class DocumentCache(object):
+    """
+    The DocumentCache object. Stores the state of documents after they went
+    through a pipeline in a directory. Each pipeline fingerprint has its own
+    subdirectory, the size limit applies to the whole cache directory.
+
+    Attributes
+    ----------
+    _directory : str
+        the root directory of the cache.
+    _fingerprint : str
+        the fingerprint of the pipeline whose documents are cached.
+    _max_size : int
+        the maximum size of the cache in bytes (None: no limit).
+    """
+
+    def __init__(self, directory, fingerprint, max_size=None):
+        self._directory = os.path.abspath(os.path.expanduser(directory))
+        self._fingerprint = fingerprint
+        self._max_size = max_size
+
+        if not os.path.exists(self.pipeline_directory):
+            os.makedirs(self.pipeline_directory)
+
+    @property
+    def directory(self):
+        return self._directory
+
+    @property
+    def fingerprint(self):
+        return self._fingerprint
+
+    @property
+    def pipeline_directory(self):
+        return os.path.join(self._directory, self._fingerprint)
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    def entry_path(self, key):
+        return os.path.join(self.pipeline_directory, key + _entry_extension)
+
+    def restore(self, document, key=None):
+        """
+        Restore the state of document if it is in the cache. Returns
+        whether the document was found in the cache.
+        """
+        path = self.entry_path(key or document_key(document))
+        if not os.path.exists(path):
+            return False
+
+        try:
+            with open(path, "rb") as input_stream:
+                state = pickle.load(input_stream)
+        except Exception: # corrupted or incompatible entry
+            cache_logger.warn(u"invalid cache entry %s, removing it", path)
+            remove_file(path)
+            return False
+
+        restore_document_state(document, state)
+        try:
+            os.utime(path, None) # recently used entries are evicted last
+        except OSError:
+            pass
+        return True
+
+    def store(self, document, key):
+        """
+        Store the state of document in the cache. key is the key of the
+        document before it was processed. The entry is written in a
+        temporary file first so concurrent readers never see partial entries.
+        """
+        path = self.entry_path(key)
+        fd, tmp_path = tempfile.mkstemp(suffix=u".tmp", dir=self.pipeline_directory)
+        try:
+            with os.fdopen(fd, "wb") as output_stream:
+                pickle.dump(document_state(document), output_stream, pickle.HIGHEST_PROTOCOL)
+            if sem.ON_WINDOWS and os.path.exists(path):
+                os.remove(path)
+            os.rename(tmp_path, path)
+        except Exception:
+            remove_file(tmp_path)
+            raise
+
+    def entries(self):
+        return cache_entries(self._directory)
+
+    def evict(self, max_size=None):
+        """
+        Remove least recently used entries until the cache is no bigger than
+        max_size bytes (default: the maximum size of the cache). Returns the
+        number of removed entries.
+        """
+        max_size = (max_size if max_size is not None else self._max_size)
+        if max_size is None:
+            return 0
+        return evict(self._directory, max_size, keep=[self._fingerprint])
+
+    def update_stats(self, **counts):
+        stats = read_stats(self._directory)
+        for key, value in counts.items():
+            stats[key] = stats.get(key, 0) + value
+        write_stats(self._directory, stats)
+
+    def report(self):
+        return cache_report(self._directory)
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def cache_entries(directory):
+    """
+    Return the (path, size, last access) of every entry in a cache
+    directory, for all pipelines.
+    """
+    entries = []
+    for root, dirnames, filenames in os.walk(directory):
+        for filename in filenames:
+            if filename.endswith(_entry_extension):
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError: # removed by another process
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+    return entries
+
+def read_stats(directory):
+    try:
+        with open(os.path.join(directory, _stats_filename)) as input_stream:
+            return json.load(input_stream)
+    except (IOError, OSError, ValueError):
+        return {}
+
+def write_stats(directory, stats):
+    with open(os.path.join(directory, _stats_filename), "w") as output_stream:
+        json.dump(stats, output_stream, indent=2, sort_keys=True)
+
+def cache_report(directory):
+    """
+    Return statistics about a cache directory: number of entries, size,
+    number of pipelines and the hit/miss/eviction counters.
+    """
+    directory = os.path.abspath(os.path.expanduser(directory))
+    stats = read_stats(directory)
+    entries = cache_entries(directory)
+    hits = stats.get(u"hits", 0)
+    misses = stats.get(u"misses", 0)
+    return {
+        u"directory": directory,
+        u"pipelines": len([name for name in (os.listdir(directory) if os.path.isdir(directory) else []) if os.path.isdir(os.path.join(directory, name))]),
+        u"entries": len(entries),
+        u"size": sum([entry[1] for entry in entries]),
+        u"hits": hits,
+        u"misses": misses,
+        u"hit_rate": (float(hits) / (hits + misses) if hits + misses > 0 else 0.0),
+        u"evictions": stats.get(u"evictions", 0),
+    }
+
+def evict(directory, max_size, keep=()):
+    """
+    Remove least recently used entries of a cache directory until it is no
+    bigger than max_size bytes. Pipeline directories left empty are removed,
+    unless their fingerprint is in keep. Returns the number of removed
+    entries.
+    """
+    directory = os.path.abspath(os.path.expanduser(directory))
+    entries = sorted(cache_entries(directory), key=lambda entry: entry[2])
+    total = sum([entry[1] for entry in entries])
+    evicted = 0
+    for path, size, _ in entries:
+        if total <= max_size:
+            break
+        remove_file(path)
+        total -= size
+        evicted += 1
+    for name in os.listdir(directory):
+        subdirectory = os.path.join(directory, name)
+        if name not in keep and os.path.isdir(subdirectory) and not os.listdir(subdirectory):
+            os.rmdir(subdirectory)
+    if evicted > 0:
+        cache_logger.info(u"evicted %i cache entries", evicted)
+        stats = read_stats(directory)
+        stats[u"evictions"] = stats.get(u"evictions", 0) + evicted
+        write_stats(directory, stats)
+    return evicted
+
+def invalidate(directory, fingerprint=None):
+    """
+    Remove cached entries. If fingerprint is given, only the entries of the
+    corresponding pipeline are removed, otherwise the whole cache is cleared.
+    Returns the number of removed entries.
+    """
+    directory = os.path.abspath(os.path.expanduser(directory))
+    if not os.path.isdir(directory):
+        return 0
+
+    names = ([fingerprint] if fingerprint is not None else os.listdir(directory))
+    removed = 0
+    for name in names:
+        subdirectory = os.path.join(directory, name)
+        if os.path.isdir(subdirectory):
+            removed += len([f for f in os.listdir(subdirectory) if f.endswith(_entry_extension)])
+            shutil.rmtree(subdirectory)
+    if fingerprint is None:
+        remove_file(os.path.join(directory, _stats_filename))
+    return removed
@@ -28,16 +28,7 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-from .brat import Exporter as BratExporter
-from .conll import Exporter as CoNLLExporter
-from .gate import Exporter as GateExporter
-from .html import Exporter as HTMLExporter
-from .jason import Exporter as JSONExporter
-from .sem_xml import Exporter as SEMExporter
-from .tei_analec import Exporter as AnalecTEIExporter
-from .tei_reden import Exporter as REDENTEIExporter
-from .tei_np import Exporter as TEINPExporter
-from .text import Exporter as TextExporter
+import sys
 
 try:
     from importlib import import_module
@@ -48,3 +39,44 @@ except ImportError: # backward compatibility for python < 2.7
 def get_exporter(name):
     module = import_module("sem.exporters.{0}".format(name))
     return module.Exporter
+
+_exported_exporters = {
+    "BratExporter": "brat",
+    "CoNLLExporter": "conll",
+    "GateExporter": "gate",
+    "HTMLExporter": "html",
+    "JSONExporter": "jason",
+    "SEMExporter": "sem_xml",
+    "AnalecTEIExporter": "tei_analec",
+    "REDENTEIExporter": "tei_reden",
+    "TEINPExporter": "tei_np",
+    "TextExporter": "text",
+}
+
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        # exporters are only imported when they are first accessed (PEP 562).
+        try:
+            exporter = get_exporter(_exported_exporters[name])
+        except KeyError:
+            raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+        globals()[name] = exporter
+        return exporter
+else:
+    import types
+    
+    class _LazyPackage(types.ModuleType):
+        # PEP 562 is not available, the package is replaced in sys.modules by
+        # a module whose __getattr__ imports the exporters when they are first accessed.
+        def __getattr__(self, name):
+            try:
+                exporter = get_exporter(_exported_exporters[name])
+            except KeyError:
+                raise AttributeError("module {0!r} has no attribute {1!r}".format(self.__name__, name))
+            setattr(self, name, exporter)
+            return exporter
+    
+    _package = _LazyPackage(__name__, __doc__)
+    _package.__dict__.update(globals())
+    _package._module = sys.modules[__name__] # keeps the globals of the functions above alive
+    sys.modules[__name__] = _package
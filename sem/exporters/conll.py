@@ -39,14 +39,17 @@ class Exporter(DefaultExporter):
         pass
     
     def document_to_unicode(self, document, couples, **kwargs):
+        return u"".join(self.document_to_chunks(document, couples, **kwargs))
+    
+    def document_to_chunks(self, document, couples, **kwargs):
         logger = kwargs.get("logger", None)
         if len(document.corpus.fields) == 0:
             if logger is not None:
                 logger.warn("No fields found for Corpus, cannot create string.")
-            return u""
+            return iter([])
         
-        if not couples or (len(couples)==0) or (len(couples)==1 and (couples.keys()[0].lower() in ["word", "token"])):
-            return unicode(document.corpus)
+        if not couples or (len(couples)==0) or (len(couples)==1 and (list(couples.keys())[0].lower() in ["word", "token"])):
+            return document.corpus.iter_unicode(document.corpus.fields)
         else:
             lower  = {}
             fields = []
@@ -67,7 +70,7 @@ class Exporter(DefaultExporter):
                         logger.warn('field "%s" not in corpus, adding', field)
                     document.add_to_corpus(field)
             
-            return document.corpus.unicode(fields)
+            return document.corpus.iter_unicode(fields)
     
     def corpus_to_unicode(self, corpus, couples, **kwargs):
         values = couples.values()
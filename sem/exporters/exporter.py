@@ -113,9 +113,28 @@ class Exporter(object):
         """
         if is_string(output):
             with codecs.open(output, "w", encoding) as O:
-                O.write(self.document_to_unicode(document, couples, **kwargs))
+                for chunk in self.document_to_chunks(document, couples, **kwargs):
+                    O.write(chunk)
         else:
-            output.write(self.document_to_unicode(document, couples, **kwargs))
+            for chunk in self.document_to_chunks(document, couples, **kwargs):
+                output.write(chunk)
+    
+    def document_to_chunks(self, document, couples, **kwargs):
+        """
+        yields the unicode representation of the document by chunks, so
+        that it can be written without being built entirely in memory. By
+        default, the whole representation is a single chunk.
+        
+        Parameters
+        ----------
+            document : Document
+                the input document to export
+            couples : dict (string -> string)
+                the "entry name" <=> "entry index" that allows to
+                retrieve information to export.
+                ex: couples = {u"chunking":u"C", u"NER":u"N"}
+        """
+        yield self.document_to_unicode(document, couples, **kwargs)
     
     def document_to_data(self, document, couples, **kwargs):
         """
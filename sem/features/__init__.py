@@ -39,3 +39,5 @@ from .triggeredfeatures import TriggeredFeature
 from .directoryfeatures import DirectoryFeature, FillerFeature
 
 from .xml2feature import XML2Feature
+from .compiler import FeaturePlan
+from .profiler import FeatureProfiler
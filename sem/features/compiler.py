@@ -0,0 +1,617 @@
+# -*- coding: utf-8 -*-
+
+"""
+file: compiler.py
+
+Description: compile features into a plan that evaluates them over whole
+sentences instead of one token at a time. Each feature becomes a tree of
+columns, columns that compute the same thing (the same entry at the same
+shift, the same regular expression on the same column, ...) are shared
+between features and only computed once per sentence. Boolean operators,
+lists, triggers and fillers only evaluate their operands on the tokens
+where the per-token features would, so that features fail (or not) on the
+same tokens. Features the compiler does not know are called token by token.
+Operations on the values of tokens (lower, substring, regular expressions,
+dictionaries, ...) only depend on the value, the costly ones are computed
+once per token type and cached across sentences and documents. The regular
+expressions checked on the same column (same entry, same shift) are grouped
+in a set: each token type is searched once for all of them and a token only
+costs one lookup in the cache.
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from timeit import default_timer
+
+from .getterfeatures import IdentityFeature, DictGetterFeature, FindForwardFeature, FindBackwardFeature
+from .arityfeatures import BOSFeature, EOSFeature, LowerFeature, SubstringFeature, IsUpperFeature, SubstitutionFeature, SequencerFeature
+from .booleanfeatures import NotFeature, AndFeature, OrFeature
+from .dictionaryfeatures import TokenDictionaryFeature, MapperFeature
+from .listfeatures import SomeFeature, AllFeature, NoneFeature
+from .matcherfeatures import CheckFeature, SubsequenceFeature, TokenFeature
+from .stringfeatures import EqualFeature, EqualCaselessFeature
+from .triggeredfeatures import TriggeredFeature
+from .directoryfeatures import FillerFeature
+
+#
+# operations on the values of a getter, applied to a whole column at once
+#
+
+def _lower(feature, values):
+    return [value.lower() for value in values]
+
+def _substring(feature, values):
+    from_index = feature._from_index
+    to_index = feature._to_index
+    default = feature._default
+    return [(value[from_index : to_index] or default) for value in values]
+
+def _isupper(feature, values):
+    index = feature._index
+    return [value[index].isupper() for value in values]
+
+def _substitute(feature, values):
+    sub = feature._replacer.sub
+    replacement = feature._replacement
+    return [sub(replacement, value) for value in values]
+
+def _equal(feature, values):
+    reference = feature._reference
+    return [reference == value for value in values]
+
+def _equal_caseless(feature, values):
+    reference = feature._reference
+    return [reference == value.lower() for value in values]
+
+def _check(feature, values):
+    search = feature._regexp.search
+    return [search(value) is not None for value in values]
+
+def _subsequence(feature, values):
+    search = feature._regexp.search
+    result = []
+    for value in values:
+        matcher = search(value)
+        if matcher is None:
+            result.append(feature._default if feature._default else value)
+        else:
+            result.append(matcher.group())
+    return result
+
+def _token(feature, values):
+    search = feature._regexp.search
+    result = []
+    for value in values:
+        matcher = search(value)
+        if matcher is None:
+            result.append(feature._default if feature._default else value)
+        else:
+            result.append(matcher.string)
+    return result
+
+def _in_dictionary(feature, values):
+    dictionary = feature._value
+    return [value in dictionary for value in values]
+
+def _map(feature, values):
+    get = feature._value.get
+    default = feature._default
+    return [get(value, default) for value in values]
+
+def _resource(feature):
+    # dictionaries loaded from the same file have the same content.
+    return (feature._path if feature._path is not None else id(feature._value))
+
+TYPE_CACHE_SIZE = 2**16 # the maximum number of token types whose results are cached, per operation
+
+# feature class: (operation, parameters identifying what the operation computes, whether results are cached)
+# Only the results of operations that cost more than a lookup in the cache are cached.
+OPERATIONS = {
+    LowerFeature: (_lower, lambda feature: (), False),
+    SubstringFeature: (_substring, lambda feature: (feature._from_index, feature._to_index, feature._default), False),
+    IsUpperFeature: (_isupper, lambda feature: (feature._index,), False),
+    SubstitutionFeature: (_substitute, lambda feature: (feature._replacer.pattern, feature._replacer.flags, feature._replacement), True),
+    EqualFeature: (_equal, lambda feature: (feature._reference,), False),
+    EqualCaselessFeature: (_equal_caseless, lambda feature: (feature._reference,), False),
+    CheckFeature: (_check, lambda feature: (feature._regexp.pattern, feature._regexp.flags), True),
+    SubsequenceFeature: (_subsequence, lambda feature: (feature._regexp.pattern, feature._regexp.flags, feature._default), True),
+    TokenFeature: (_token, lambda feature: (feature._regexp.pattern, feature._regexp.flags, feature._default), True),
+    TokenDictionaryFeature: (_in_dictionary, lambda feature: (_resource(feature),), False),
+    MapperFeature: (_map, lambda feature: (_resource(feature), feature._default), False),
+}
+
+_missing = object()
+
+class Everywhere(list):
+    """
+    The positions of every token of a sentence, columns evaluated on them
+    are memoised.
+    """
+
+#
+# columns
+#
+
+class Column(object):
+    """
+    The values of an expression for the tokens of a sentence. Columns are
+    evaluated on a list of positions and memoised per sentence (in memo,
+    by key) when they are evaluated on every token. A safe column cannot
+    fail, it is always evaluated on every token. When profile is a list,
+    the time spent evaluating the column (its columns included) and the
+    number of values computed are added to its two items.
+    """
+    
+    safe = False
+    profile = None
+    
+    def __init__(self, key):
+        self.key = key
+    
+    def __call__(self, p, positions, memo):
+        """
+        Return the values for positions (None: every token of p). The
+        values may be the ones in memo, they must not be modified.
+        """
+        every = (positions is None or type(positions) is Everywhere)
+        if self.key in memo:
+            values = memo[self.key]
+            return (values if every else [values[i] for i in positions])
+        evaluate = (self.evaluate if self.profile is None else self.timed)
+        if every or self.safe:
+            values = memo[self.key] = evaluate(p, Everywhere(range(len(p))), memo)
+            return (values if every else [values[i] for i in positions])
+        return evaluate(p, positions, memo)
+    
+    def evaluate(self, p, positions, memo):
+        raise NotImplementedError()
+    
+    def timed(self, p, positions, memo):
+        """
+        evaluate, measured in profile.
+        """
+        start = default_timer()
+        values = self.evaluate(p, positions, memo)
+        self.profile[0] += default_timer() - start
+        self.profile[1] += len(positions)
+        return values
+
+class EntryColumn(Column):
+    safe = True
+    
+    def __init__(self, entry):
+        super(EntryColumn, self).__init__((u"entry", entry))
+        self.entry = entry
+    
+    def evaluate(self, p, positions, memo):
+        entry = self.entry
+        return [p[i].get(entry, None) for i in positions]
+
+class ShiftColumn(Column):
+    safe = True
+    
+    def __init__(self, column, shift):
+        super(ShiftColumn, self).__init__((u"shift", column.key, shift))
+        self.column = column
+        self.shift = shift
+    
+    def evaluate(self, p, positions, memo):
+        values = self.column(p, None, memo)
+        length = len(values)
+        shift = self.shift
+        return [(values[i + shift] if 0 <= i + shift < length else None) for i in positions]
+
+class PositionColumn(Column):
+    safe = True
+    
+    def __init__(self, last):
+        super(PositionColumn, self).__init__((u"eos" if last else u"bos",))
+        self.last = last
+    
+    def evaluate(self, p, positions, memo):
+        target = (len(p) - 1 if self.last else 0)
+        return [i == target for i in positions]
+
+class CachedColumn(Column):
+    """
+    A column whose values only depend on the values of another column. They
+    are computed once per distinct value (token type) and kept in a cache
+    of at most cache_size values (0: no cache) that lives as long as the
+    plan, it is shared by every document.
+    """
+    
+    def __init__(self, key, column, cache_size=0):
+        super(CachedColumn, self).__init__(key)
+        self.column = column
+        self.cache_size = cache_size
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+    
+    def compute(self, values):
+        """
+        Return the results for values (a list), in the same order.
+        """
+        raise NotImplementedError()
+    
+    def evaluate(self, p, positions, memo):
+        values = self.column(p, positions, memo)
+        if not self.cache_size:
+            return self.compute(values)
+        get = self.cache.get
+        try:
+            results = [get(value, _missing) for value in values]
+        except TypeError: # unhashable values
+            return self.compute(values)
+        unknown = [j for j, result in enumerate(results) if result is _missing]
+        if unknown:
+            missing = [] # in order of first occurrence, so that the same token fails first
+            seen = set()
+            for j in unknown:
+                if values[j] not in seen:
+                    seen.add(values[j])
+                    missing.append(values[j])
+            computed = dict(zip(missing, self.compute(missing)))
+            for j in unknown:
+                results[j] = computed[values[j]]
+            if len(self.cache) + len(computed) > self.cache_size:
+                self.cache.clear()
+            self.cache.update(computed)
+            self.misses += len(computed)
+        self.hits += len(values) - len(unknown)
+        return results
+
+class OperationColumn(CachedColumn):
+    """
+    An operation on the values of a column. Only costly operations are
+    cached (see OPERATIONS).
+    """
+    
+    def __init__(self, feature, column, cache_size=0):
+        operation, parameters, cached = OPERATIONS[type(feature)]
+        super(OperationColumn, self).__init__((type(feature).__name__, parameters(feature), column.key), column, (cache_size if cached else 0))
+        self.feature = feature
+    
+    def compute(self, values):
+        return OPERATIONS[type(self.feature)][0](self.feature, values)
+
+class RegexSetColumn(CachedColumn):
+    """
+    The results of the regular expressions searched in the values of a
+    column, as tuples of booleans: whether each regular expression is found
+    in the value. Rows are cached by token type, a token only costs one
+    lookup in the cache for all the regular expressions.
+    """
+    
+    def __init__(self, column, cache_size=0):
+        super(RegexSetColumn, self).__init__((u"regexset", column.key), column, cache_size)
+        self.regexps = []
+    
+    def add(self, regexp):
+        """
+        Add a compiled regular expression to the set, return its index in
+        the results.
+        """
+        for index, known in enumerate(self.regexps):
+            if (known.pattern, known.flags) == (regexp.pattern, regexp.flags):
+                return index
+        self.regexps.append(regexp)
+        self.cache.clear()
+        return len(self.regexps) - 1
+    
+    def compute(self, values):
+        searches = [regexp.search for regexp in self.regexps]
+        return [tuple([search(value) is not None for search in searches]) for value in values]
+
+class RegexColumn(Column):
+    """
+    The result of one of the regular expressions of a RegexSetColumn.
+    """
+    
+    def __init__(self, feature, regexes):
+        super(RegexColumn, self).__init__((type(feature).__name__, OPERATIONS[type(feature)][1](feature), regexes.column.key))
+        self.regexes = regexes
+        self.index = regexes.add(feature._regexp)
+    
+    def evaluate(self, p, positions, memo):
+        index = self.index
+        return [row[index] for row in self.regexes(p, positions, memo)]
+
+class NotColumn(Column):
+    def __init__(self, column):
+        super(NotColumn, self).__init__((u"not", column.key))
+        self.column = column
+    
+    def evaluate(self, p, positions, memo):
+        return [not value for value in self.column(p, positions, memo)]
+
+class BinaryColumn(Column):
+    """
+    "and" and "or": the right operand is only evaluated on the tokens where
+    the left one does not decide the value.
+    """
+    
+    def __init__(self, is_and, left, right):
+        super(BinaryColumn, self).__init__((u"and" if is_and else u"or", left.key, right.key))
+        self.is_and = is_and
+        self.left = left
+        self.right = right
+    
+    def evaluate(self, p, positions, memo):
+        values = list(self.left(p, positions, memo))
+        undecided = [j for j, value in enumerate(values) if bool(value) == self.is_and]
+        if undecided:
+            for j, value in zip(undecided, self.right(p, [positions[j] for j in undecided], memo)):
+                values[j] = value
+        return values
+
+class ListColumn(Column):
+    """
+    "some", "all" and "none": each element is only evaluated on the tokens
+    whose value is not known yet.
+    """
+    
+    def __init__(self, action, elements):
+        super(ListColumn, self).__init__((action,) + tuple([element.key for element in elements]))
+        self.action = action
+        self.elements = elements
+    
+    def evaluate(self, p, positions, memo):
+        stop_on = (self.action != u"all") # the value of an element that decides the value of the list
+        decided = (self.action == u"some") # the value of the list when an element decides it
+        values = [not decided] * len(positions)
+        remaining = list(range(len(positions)))
+        for element in self.elements:
+            if not remaining:
+                break
+            results = element(p, [positions[j] for j in remaining], memo)
+            left = []
+            for j, result in zip(remaining, results):
+                if bool(result) == stop_on:
+                    values[j] = decided
+                else:
+                    left.append(j)
+            remaining = left
+        return values
+
+class ChoiceColumn(Column):
+    """
+    The value of then where condition is true, the value of otherwise
+    elsewhere (triggers and fillers). otherwise may be a constant.
+    """
+    
+    def __init__(self, key, condition, then, otherwise):
+        super(ChoiceColumn, self).__init__(key)
+        self.condition = condition
+        self.then = then
+        self.otherwise = otherwise
+    
+    def evaluate(self, p, positions, memo):
+        conditions = self.condition(p, positions, memo)
+        chosen = [j for j, value in enumerate(conditions) if value]
+        others = [j for j, value in enumerate(conditions) if not value]
+        values = [None] * len(positions)
+        for j, value in zip(chosen, (self.then(p, [positions[j] for j in chosen], memo) if chosen else [])):
+            values[j] = value
+        if isinstance(self.otherwise, Column):
+            for j, value in zip(others, (self.otherwise(p, [positions[j] for j in others], memo) if others else [])):
+                values[j] = value
+        else:
+            for j in others:
+                values[j] = self.otherwise
+        return values
+
+class FindColumn(Column):
+    """
+    The value of entry at the nearest token after (forward) or before each
+    token where matcher is true. The matcher is evaluated once per token and
+    the nearest matches are found in a single pass over the sentence.
+    """
+    
+    def __init__(self, forward, matcher, entry):
+        super(FindColumn, self).__init__((u"find", forward, matcher.key, entry))
+        self.forward = forward
+        self.matcher = matcher
+        self.entry = entry
+    
+    def evaluate(self, p, positions, memo):
+        # the tokens find features evaluate the matcher on: every token but the first (forward) or the last (backward).
+        length = len(p)
+        entry = self.entry
+        values = [None] * length
+        found = None
+        if self.forward:
+            matched = self.matcher(p, list(range(1, length)), memo)
+            for i in range(length - 1, 0, -1):
+                values[i] = found
+                if matched[i - 1]:
+                    found = p[i][entry]
+            if length:
+                values[0] = found
+        else:
+            matched = self.matcher(p, list(range(0, length - 1)), memo)
+            for i in range(length - 1):
+                values[i] = found
+                if matched[i]:
+                    found = p[i][entry]
+            if length:
+                values[length - 1] = found
+        return (values if type(positions) is Everywhere else [values[i] for i in positions])
+
+class FeatureColumn(Column):
+    """
+    A feature the compiler does not know, called token by token.
+    """
+    
+    def __init__(self, feature):
+        super(FeatureColumn, self).__init__((u"feature", id(feature)))
+        self.feature = feature
+    
+    def evaluate(self, p, positions, memo):
+        feature = self.feature
+        return [feature(p, i) for i in positions]
+
+#
+# the plan
+#
+
+class FeaturePlan(object):
+    """
+    The compiled form of a list of features. Sequence features (that give
+    the values of a whole sentence at once) are not compiled.
+    
+    Attributes
+    ----------
+    _cache_size : int
+        the maximum number of token types cached by each operation (0: no
+        cache).
+    _columns : dict
+        the shared columns, by key.
+    _compiled : list
+        the (feature, column) of each compiled feature.
+    _roots : dict
+        the column of each compiled feature, by feature id.
+    _nodes : dict
+        the (feature, column) of every feature compiled, nested ones
+        included, by feature id.
+    """
+    
+    def __init__(self, features, cache_size=TYPE_CACHE_SIZE):
+        self._cache_size = cache_size
+        self._columns = {}
+        self._nodes = {}
+        self._compiled = [(feature, self.compile(feature)) for feature in features if not feature.is_sequence]
+        self._roots = dict([(id(feature), column) for feature, column in self._compiled])
+    
+    def __getstate__(self):
+        # ids change when unpickled
+        return {"_cache_size": self._cache_size, "_columns": self._columns, "_compiled": self._compiled, "_nodes": list(self._nodes.values())}
+    
+    def __setstate__(self, state):
+        nodes = state.pop("_nodes", [])
+        self.__dict__.update(state)
+        self._roots = dict([(id(feature), column) for feature, column in self._compiled])
+        self._nodes = dict([(id(feature), (feature, column)) for feature, column in nodes])
+    
+    def __contains__(self, feature):
+        return id(feature) in self._roots
+    
+    def _shared(self, column):
+        return self._columns.setdefault(column.key, column)
+    
+    def getter(self, getter, source=None):
+        """
+        Compile the getter of a feature. source is the column an identity
+        getter gives (in a sequencer), None if it is not known.
+        """
+        if type(getter) is DictGetterFeature:
+            column = self._shared(EntryColumn(getter.entry))
+            return (self._shared(ShiftColumn(column, getter.shift)) if getter.shift != 0 else column)
+        if type(getter) is IdentityFeature:
+            return source
+        return self._shared(FeatureColumn(getter))
+    
+    def compile(self, feature, source=None):
+        """
+        Return the column of feature, shared with the columns already
+        compiled when they compute the same values.
+        """
+        cls = type(feature)
+        column = None
+        if cls is CheckFeature:
+            getter = self.getter(feature._getter, source)
+            if getter is not None:
+                regexes = self._shared(RegexSetColumn(getter, self._cache_size))
+                column = RegexColumn(feature, regexes)
+        elif cls in OPERATIONS:
+            getter = self.getter(feature._getter, source)
+            if getter is not None:
+                column = OperationColumn(feature, getter, self._cache_size)
+        elif cls is BOSFeature or cls is EOSFeature:
+            column = PositionColumn(cls is EOSFeature)
+        elif cls is NotFeature:
+            column = NotColumn(self.compile(feature.element))
+        elif cls is AndFeature or cls is OrFeature:
+            column = BinaryColumn(cls is AndFeature, self.compile(feature.left), self.compile(feature.right))
+        elif cls in (SomeFeature, AllFeature, NoneFeature):
+            action = {SomeFeature: u"some", AllFeature: u"all", NoneFeature: u"none"}[cls]
+            column = ListColumn(action, [self.compile(element) for element in feature._elements])
+        elif cls is TriggeredFeature:
+            trigger = self.compile(feature.trigger)
+            operation = self.compile(feature.operation)
+            column = ChoiceColumn((u"trigger", trigger.key, operation.key, feature.default), trigger, operation, feature.default)
+        elif cls is FillerFeature:
+            condition = self.compile(feature.condition)
+            filler = self.getter(feature.filler)
+            default = self.getter(feature.default)
+            column = ChoiceColumn((u"fill", condition.key, filler.key, default.key), condition, filler, default)
+        elif cls is FindForwardFeature or cls is FindBackwardFeature:
+            column = FindColumn(cls is FindForwardFeature, self.compile(feature._matcher), feature._return_entry)
+        elif cls is SequencerFeature and source is None:
+            column = self.compile(feature._features[0])
+            for element in feature._features[1:]:
+                if type(element) not in OPERATIONS or type(element._getter) is not IdentityFeature:
+                    column = None
+                    break
+                column = self._shared(OperationColumn(element, column, self._cache_size))
+        column = self._shared(column if column is not None else FeatureColumn(feature))
+        self._nodes[id(feature)] = (feature, column)
+        return column
+    
+    def column(self, feature):
+        """
+        Return the column feature was compiled in (nested features
+        included), None if it was not compiled.
+        """
+        node = self._nodes.get(id(feature))
+        return (node[1] if node is not None and node[0] is feature else None)
+    
+    def cache_info(self):
+        """
+        Return the number of hits and misses of the caches of token types
+        and the number of types in cache.
+        """
+        columns = [column for column in self._columns.values() if isinstance(column, CachedColumn)]
+        return {
+            u"hits": sum([column.hits for column in columns]),
+            u"misses": sum([column.misses for column in columns]),
+            u"size": sum([len(column.cache) for column in columns]),
+        }
+    
+    def clear_cache(self):
+        for column in self._columns.values():
+            if isinstance(column, CachedColumn):
+                column.cache.clear()
+    
+    def values(self, feature, p, memo=None):
+        """
+        Return the values of feature for every token of sentence p, as
+        feature(p, i) would give them. memo holds the columns already
+        computed for p, it may be shared by the features of a plan.
+        """
+        column = self._roots.get(id(feature))
+        if column is None:
+            return [feature(p, i) for i in range(len(p))]
+        return list(column(p, None, ({} if memo is None else memo)))
@@ -99,39 +99,26 @@ class MultiwordDictionaryFeature(DictionaryFeature):
         else:
             self._value = Trie()
     
+    def tokens(self, list2dict, entry=None):
+        entry = (entry if entry is not None else self._entry)
+        return [token[entry] for token in list2dict]
+    
+    def matches(self, tokens):
+        """
+        The (start, end, state) of the entries found in tokens, see
+        Automaton.leftmost_longest. Entries may only start before the last
+        token, the last token is checked alone by callers.
+        """
+        return self._value.automaton().leftmost_longest(tokens, len(tokens) - 1)
+    
     def __call__(self, list2dict, *args, **kwargs):
         l         = ["O"]*len(list2dict)
-        tmp       = self._value._data
-        length    = len(list2dict)
-        fst       = 0
-        lst       = -1 # last match found
-        cur       = 0
-        ckey      = None  # Current KEY
         entry     = self._entry
         appendice = self._appendice
-        while fst < length - 1:
-            cont = True
-            while cont and (cur < length):
-                ckey  = list2dict[cur][entry]
-                if NUL in tmp: lst = cur
-                tmp   = tmp.get(ckey, {})
-                cont  = len(tmp) != 0
-                cur  += int(cont)
-            
-            if NUL in tmp: lst = cur
-            
-            if lst != -1:
-                l[fst] = u'B' + appendice
-                for i in range(fst+1, lst):
-                    l[i] = u'I' + appendice
-                fst = lst
-                cur = fst
-            else:
-                fst += 1
-                cur  = fst
-            
-            tmp = self._value._data
-            lst = -1
+        for fst, lst, state in self.matches(self.tokens(list2dict)):
+            l[fst] = u'B' + appendice
+            for i in range(fst+1, lst):
+                l[i] = u'I' + appendice
         
         if NUL in self._value._data.get(list2dict[-1][entry], []):
             l[-1] = u'B' + appendice
@@ -139,33 +126,25 @@ class MultiwordDictionaryFeature(DictionaryFeature):
         return l
     
     def step(self, list2dict, i, *args, **kwargs):
-        tmp       = self._value._data
-        length    = len(list2dict)
-        fst       = i
-        lst       = -1 # last match found
-        cur       = fst
-        ckey      = None  # Current KEY
-        entry     = self._entry
-        while fst < length - 1:
-            cont = True
-            while cont and (cur < length):
-                ckey  = list2dict[cur][entry]
-                if NUL in tmp: lst = cur
-                tmp   = tmp.get(ckey, {})
-                cont  = len(tmp) != 0
-                cur  += int(cont)
-            
-            if NUL in tmp: lst = cur
-            
-            if lst != -1:
-                return lst - fst
-            
-            return 0
+        if i < len(list2dict) - 1:
+            # the longest entries of the last sentence are kept, step is called on every token of a sentence.
+            cached = getattr(self, "_step_cache", None)
+            if cached is None or cached[0] is not list2dict or cached[1] is not getattr(self._value, "_automaton", None):
+                automaton = self._value.automaton()
+                cached = (list2dict, automaton, automaton.longest(self.tokens(list2dict)))
+                self._step_cache = cached
+            state = cached[2].get(i)
+            return (cached[1].depth(state) if state else 0)
         
-        if NUL in self._value._data.get(list2dict[-1][entry], []):
+        if NUL in self._value._data.get(list2dict[-1][self._entry], []):
             return 1
         
         return 0
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_step_cache", None)
+        return state
 
 class MapperFeature(DictionaryFeature):
     def __init__(self, getter=DEFAULT_GETTER, default="O", *args, **kwargs):
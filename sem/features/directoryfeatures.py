@@ -39,16 +39,31 @@ except ImportError:
 
 from . import Feature
 from . import DEFAULT_GETTER, DictGetterFeature
-from . import MultiwordDictionaryFeature, MapperFeature
+from . import TokenDictionaryFeature, MultiwordDictionaryFeature, MapperFeature, NUL
 from . import TriggeredFeature
 from . import SubsequenceFeature
 from sem.storage.annotation import Tag, Annotation, get_top_level, chunk_annotation_from_sentence
+from sem.storage.automaton import Automaton, merge_data
 
 class DirectoryFeature(Feature):
-    def __init__(self, path, x2f, order=".order", ambiguous=False, *args, **kwargs):
+    """
+    Tags the longest (top level) matches of the features defined in the
+    files of a directory. For matches of the same span, the feature added
+    last to the annotation wins (see Annotation.add and get_top_level).
+    features holds the .order file reversed, so the last feature of
+    features, which is the first line of the .order file, wins.
+    
+    In merged mode, the multiword dictionaries and the token dictionaries
+    of the directory that read the same entry are matched together with a
+    single automaton. Matches are the same as those of each feature.
+    """
+    
+    def __init__(self, path, x2f, order=".order", ambiguous=False, merged=False, *args, **kwargs):
         super(DirectoryFeature, self).__init__(self, *args, **kwargs)
         self._is_sequence = True
         self._ambiguous   = ambiguous
+        self._merged      = merged
+        self._groups      = None # see merge
         
         order = order or ".order"
         
@@ -77,8 +92,113 @@ class DirectoryFeature(Feature):
             if isinstance(self.features[-1], MultiwordDictionaryFeature):
                 self.features[-1]._appendice = self.features[-1]._appendice or u"-{0}".format(name)
     
+    def merge(self):
+        """
+        Group the features that can be matched by an automaton by the entry
+        they read, returns the (entry, indices of features, automaton, strict)
+        of each group and the indices of the other features. The values of
+        the automaton of a group are the positions of features in indices.
+        """
+        entries = {}
+        others  = []
+        for index, feature in enumerate(self.features):
+            if type(feature) is MultiwordDictionaryFeature:
+                entries.setdefault(feature._entry, []).append(index)
+            elif type(feature) is TokenDictionaryFeature and isinstance(feature._getter, DictGetterFeature) and feature._getter.shift == 0:
+                entries.setdefault(feature._getter.entry, []).append(index)
+            else:
+                others.append(index)
+        
+        groups = []
+        for entry, indices in sorted(entries.items()):
+            datas = []
+            for index in indices:
+                feature = self.features[index]
+                if feature.is_sequence:
+                    datas.append(feature._value._data)
+                else:
+                    datas.append(dict([(token, {NUL: {}}) for token in feature._value]))
+            # multiword dictionaries fail on tokens without the entry, token dictionaries do not match them.
+            strict = any([self.features[index].is_sequence for index in indices])
+            groups.append((entry, indices, Automaton(merge_data(datas)), strict))
+        return groups, others
+    
+    def _chunks(self, feature, longest, list2dict):
+        # the matches of a multiword dictionary, as chunks of its output (see MultiwordDictionaryFeature.__call__).
+        length = len(list2dict)
+        chunks = []
+        end    = 0
+        for start in sorted(longest):
+            if start >= length - 1:
+                break
+            if start >= end:
+                end = longest[start]
+                chunks.append([start, end])
+        
+        if NUL in feature._value._data.get(list2dict[-1][feature._entry], []):
+            if chunks and chunks[-1][1] == length:
+                chunks[-1][1] -= 1
+            chunks.append([length-1, length])
+        
+        return chunks
+    
+    def merged_tags(self, list2dict):
+        """
+        Return the top level matches of the features as (lb, ub, value)
+        triplets, see merge.
+        """
+        if self._groups is None:
+            self._groups = self.merge()
+        groups, others = self._groups
+        
+        # sorted like Annotation.add: by start, then longest first, then the last feature of self.features
+        # (-index: the feature added last wins, it is the first line of the .order file).
+        candidates = []
+        for entry, indices, automaton, strict in groups:
+            if strict:
+                tokens = [token[entry] for token in list2dict]
+            else:
+                tokens = [token.get(entry, None) for token in list2dict]
+            longest = {}
+            for start, end, state in automaton.find_all(tokens):
+                for position in automaton.value(state):
+                    index = indices[position]
+                    if self.features[index].is_boolean:
+                        candidates.append((start, -end, -index, self.features[index].name))
+                    else:
+                        longest.setdefault(index, {})[start] = end # by increasing end, the last one is the longest
+            for index in indices:
+                feature = self.features[index]
+                if feature.is_sequence:
+                    value = (u"B" + feature._appendice)[2:]
+                    candidates.extend([(lb, -ub, -index, value) for lb, ub in self._chunks(feature, longest.get(index, {}), list2dict)])
+        
+        for index in others:
+            feature = self.features[index]
+            if feature.is_boolean:
+                candidates.extend([(x, -(x+1), -index, feature.name) for x in range(len(list2dict)) if feature(list2dict, x)])
+            elif feature.is_sequence:
+                candidates.extend([(tag.lb, -tag.ub, -index, tag.value) for tag in chunk_annotation_from_sentence([{"tag": tag} for tag in feature(list2dict)], "tag")])
+        
+        candidates.sort()
+        tags = []
+        end  = 0
+        for lb, ub, index, value in candidates:
+            if lb >= end:
+                tags.append((lb, -ub, value))
+                end = -ub
+        return tags
+    
     def __call__(self, list2dict, *args, **kwargs):
         data = [u"O"]*len(list2dict)
+        
+        if self._merged and not self._ambiguous and list2dict:
+            for lb, ub, value in self.merged_tags(list2dict):
+                data[lb] = u"B-{}".format(value)
+                for index in range(lb+1, ub):
+                    data[index] = u"I-{}".format(value)
+            return data
+        
         annotation = Annotation("")
         
         for feature in self.features:
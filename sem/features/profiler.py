@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+
+"""
+file: profiler.py
+
+Description: measures the features of an enrich file. Every node of the
+feature trees built by XML2Feature is measured, nested ones included: the
+time spent computing its values (its children included), the number of
+values computed and, for operations cached by token type, the hits and
+misses of the cache. Compiled nodes are measured through the columns of the
+plan, the others through a proxy put in the place of the feature in its
+parent.
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+
+from timeit import default_timer
+
+from .getterfeatures import FindFeature
+from .arityfeatures import SequencerFeature
+from .booleanfeatures import NotFeature, AndFeature, OrFeature
+from .listfeatures import ListFeature
+from .rulefeatures import RuleFeature, OrRuleFeature
+from .triggeredfeatures import TriggeredFeature
+from .directoryfeatures import DirectoryFeature, FillerFeature
+from .compiler import CachedColumn, RegexColumn
+
+# the attributes of features that hold their children: a feature or a list of features.
+CHILDREN = [
+    (NotFeature, (u"element",)),
+    ((AndFeature, OrFeature), (u"left", u"right")),
+    (ListFeature, (u"_elements",)),
+    (TriggeredFeature, (u"trigger", u"operation")),
+    (FillerFeature, (u"condition",)),
+    (FindFeature, (u"_matcher",)),
+    (SequencerFeature, (u"_features",)),
+    (DirectoryFeature, (u"features",)),
+    ((RuleFeature, OrRuleFeature), (u"_features",)),
+]
+
+def children(feature):
+    """
+    Return the (attribute, index, child) of every child of feature, index
+    is None when the attribute holds a single feature.
+    """
+    result = []
+    for classes, attributes in CHILDREN:
+        if isinstance(feature, classes):
+            for attribute in attributes:
+                value = getattr(feature, attribute)
+                if isinstance(value, (list, tuple)):
+                    result.extend([(attribute, index, child) for index, child in enumerate(value)])
+                else:
+                    result.append((attribute, None, value))
+            break
+    return result
+
+class ProfiledFeature(object):
+    """
+    Stands for a feature in its parent, the calls to the feature (__call__
+    and step) are measured in stats: [seconds, calls]. Every other
+    attribute is the one of the feature.
+    """
+    
+    def __init__(self, feature, stats):
+        self._feature = feature
+        self._stats   = stats
+    
+    def __getattr__(self, name):
+        return getattr(self._feature, name)
+    
+    def __call__(self, *args, **kwargs):
+        start = default_timer()
+        try:
+            return self._feature(*args, **kwargs)
+        finally:
+            self._stats[0] += default_timer() - start
+            self._stats[1] += 1
+    
+    def step(self, *args, **kwargs):
+        start = default_timer()
+        try:
+            return self._feature.step(*args, **kwargs)
+        finally:
+            self._stats[0] += default_timer() - start
+            self._stats[1] += 1
+
+class ProfileNode(object):
+    """
+    A feature of the trees measured by a FeatureProfiler.
+    
+    Attributes
+    ----------
+    path : str
+        the names of the feature and of its ancestors, separated by "/".
+        Unnamed features are named after the attribute of their parent
+        that holds them.
+    feature : sem.features.Feature
+        the feature measured.
+    depth : int
+        the depth of the feature in its tree (0 for the features of the
+        enrich file).
+    column : sem.features.compiler.Column
+        the column of the plan the feature was compiled in, None if it
+        was not compiled.
+    stats : list
+        the seconds and calls measured outside of the plan.
+    column_stats : list
+        the seconds and values measured in column (shared by the nodes of
+        the column), None if there is no column.
+    baseline : tuple
+        the hits and misses of the cache of column when the profiler was
+        attached.
+    counts : tuple
+        the hits and misses of the cache of column when the profiler was
+        detached, None while it is attached.
+    """
+    
+    __slots__ = ("path", "feature", "depth", "column", "stats", "column_stats", "baseline", "counts")
+    
+    def __init__(self, path, feature, depth, column):
+        self.path     = path
+        self.feature  = feature
+        self.depth    = depth
+        self.column   = column
+        self.stats    = [0.0, 0]
+        self.column_stats = None
+        self.baseline = _cache_counts(column)
+        self.counts   = None
+
+def _cache(column):
+    # the column whose cache holds the values of column, None if they are not cached.
+    if isinstance(column, RegexColumn):
+        column = column.regexes
+    if isinstance(column, CachedColumn) and column.cache_size:
+        return column
+    return None
+
+def _cache_counts(column):
+    cache = _cache(column)
+    return ((cache.hits, cache.misses) if cache is not None else None)
+
+class FeatureProfiler(object):
+    """
+    Measures the features of an enrich file and the features nested in
+    them. The features of the enrich file are measured by their caller (see
+    record), as nested features may be called directly or evaluated in the
+    columns of a plan. Times include the time spent in children, a column
+    shared by several features is reported with each of them.
+    """
+    
+    def __init__(self, features, plan=None):
+        self._features = features
+        self._plan     = plan
+        self._nodes    = []
+        self._roots    = {} # the node of each feature of the enrich file, by id
+        self._slots    = [] # the (parent, attribute, original value) of slots holding a ProfiledFeature
+        self._columns  = [] # the columns measured
+        self._attached = False
+    
+    @property
+    def attached(self):
+        return self._attached
+    
+    def attach(self):
+        """
+        Build the nodes of the feature trees, put a ProfiledFeature in the
+        place of every nested feature and measure the columns of the plan.
+        """
+        if self._attached:
+            return
+        self._attached = True
+        self._nodes = []
+        self._roots = {}
+        visited = set()
+        for feature in self._features:
+            node = self._add(feature.name or type(feature).__name__, feature, 0)
+            self._roots[id(feature)] = node
+            self._attach_children(node, visited)
+        for node in self._nodes:
+            if node.column is not None:
+                if node.column.profile is None:
+                    node.column.profile = [0.0, 0]
+                    self._columns.append(node.column)
+                node.column_stats = node.column.profile
+    
+    def detach(self):
+        """
+        Put the features back in their parents and stop measuring columns.
+        Measures are kept until the profiler is attached again.
+        """
+        for parent, attribute, value in reversed(self._slots):
+            if isinstance(value, list):
+                getattr(parent, attribute)[:] = value
+            else:
+                setattr(parent, attribute, value)
+        self._slots = []
+        for node in self._nodes:
+            node.counts = _cache_counts(node.column)
+        for column in self._columns:
+            column.__dict__.pop("profile", None)
+        self._columns = []
+        self._attached = False
+    
+    def _add(self, path, feature, depth):
+        column = (self._plan.column(feature) if self._plan is not None else None)
+        node = ProfileNode(path, feature, depth, column)
+        self._nodes.append(node)
+        return node
+    
+    def _attach_children(self, node, visited):
+        feature = node.feature
+        if id(feature) in visited: # already measured where it was first found
+            return
+        visited.add(id(feature))
+        if isinstance(feature, DirectoryFeature) and feature._merged and feature._groups is None:
+            feature._groups = feature.merge() # merge tells features apart by their class
+        
+        proxies = {}
+        for attribute, index, child in children(feature):
+            slot = (attribute.lstrip(u"_") if index is None else u"{0}[{1}]".format(attribute.lstrip(u"_"), index))
+            child_node = self._add(u"{0}/{1}".format(node.path, child.name or slot), child, node.depth + 1)
+            self._attach_children(child_node, visited)
+            proxies.setdefault(attribute, []).append(ProfiledFeature(child, child_node.stats))
+        
+        for attribute, values in proxies.items():
+            value = getattr(feature, attribute)
+            if isinstance(value, list):
+                self._slots.append((feature, attribute, list(value)))
+                value[:] = values
+            elif isinstance(value, tuple):
+                self._slots.append((feature, attribute, value))
+                setattr(feature, attribute, tuple(values))
+            else:
+                self._slots.append((feature, attribute, value))
+                setattr(feature, attribute, values[0])
+    
+    def record(self, feature, seconds, calls):
+        """
+        Add the seconds and calls spent computing a feature of the enrich
+        file.
+        """
+        node = self._roots.get(id(feature))
+        if node is not None:
+            node.stats[0] += seconds
+            node.stats[1] += calls
+    
+    def report(self):
+        """
+        Return the measures of every feature, the slowest first, as dicts:
+        feature (the path), type, depth, seconds, calls (the number of
+        values computed: one per token, or one per sentence for sequence
+        features), hits, misses and hit_rate (None if the values of the
+        feature are not cached by token type).
+        """
+        rows = []
+        for node in self._nodes:
+            seconds, calls = node.stats
+            if node.depth > 0 and node.column_stats is not None:
+                seconds += node.column_stats[0]
+                calls += node.column_stats[1]
+            hits = misses = hit_rate = None
+            counts = (_cache_counts(node.column) if self._attached else node.counts)
+            if counts is not None:
+                hits = counts[0] - node.baseline[0]
+                misses = counts[1] - node.baseline[1]
+                hit_rate = (float(hits) / (hits + misses) if hits + misses else None)
+            rows.append({
+                u"feature": node.path,
+                u"type": type(node.feature).__name__,
+                u"depth": node.depth,
+                u"seconds": seconds,
+                u"calls": calls,
+                u"hits": hits,
+                u"misses": misses,
+                u"hit_rate": hit_rate,
+            })
+        rows.sort(key=lambda row: -row[u"seconds"])
+        return rows
+    
+    def format_report(self):
+        """
+        Return the report as a table, one feature per line.
+        """
+        lines = [u"{0:>10} {1:>10} {2:>9}  {3:<28} {4}".format(u"seconds", u"calls", u"hit rate", u"type", u"feature")]
+        for row in self.report():
+            hit_rate = (u"{0:.1%}".format(row[u"hit_rate"]) if row[u"hit_rate"] is not None else u"-")
+            lines.append(u"{0:>10.4f} {1:>10} {2:>9}  {3:<28} {4}".format(row[u"seconds"], row[u"calls"], hit_rate, row[u"type"], row[u"feature"]))
+        return u"\n".join(lines)
+    
+    def to_json(self, **kwargs):
+        """
+        Return the report in JSON, kwargs are given to json.dumps.
+        """
+        return json.dumps(self.report(), **kwargs)
@@ -33,76 +33,139 @@ SOFTWARE.
 from .feature        import Feature
 from .getterfeatures import DEFAULT_GETTER
 
+_unknown = object()
+
 class RuleFeature(Feature):
+    """
+    A sequence of features, each one with a cardinality (min_match and
+    max_match attributes). Rules are compiled: a match is a run of a small
+    automaton whose states are the current feature, the number of matches
+    it still needs and the number it still allows. The run from a state at
+    a position does not depend on where the match started, runs are
+    memoised so that each state is run once per position and the values of
+    features are computed once per token.
+    """
+    
     def __init__(self, features, *args, **kwargs):
         super(RuleFeature, self).__init__(self, *args, **kwargs)
         self._is_boolean  = False
         self._is_sequence = True
         self._features = features
     
-    def __call__(self, list2dict, *args, **kwargs):
-        l = ["O"]*len(list2dict)
-        pos_beg = 0
-        pos_cur = 0
-        feat_index = 0
-        feat = self._features[feat_index]
-        remain_min = feat.min_match
-        remain_max = feat.max_match
-        matches = []
-        func = (feat.__call__ if feat.is_boolean else feat.step)
-        while pos_beg < len(list2dict)-1:
-            while remain_min <= 0 and not pos_cur >= len(list2dict) and not func(list2dict, pos_cur) and feat_index < len(self._features)-1:
-                feat_index += 1
-                feat = self._features[feat_index]
-                func = (feat.__call__ if feat.is_boolean else feat.step)
-                remain_min = feat.min_match
-                remain_max = feat.max_match
-            if feat_index >= len(self._features) or pos_cur >= len(list2dict):
-                pos_beg += 1
-                pos_cur = pos_beg
-                feat_index = 0
-                feat = self._features[feat_index]
-                func = (feat.__call__ if feat.is_boolean else feat.step)
-                remain_min = feat.min_match
-                remain_max = feat.max_match
-                continue
-            if func(list2dict, pos_cur):
-                N = int(func(list2dict, pos_cur))
-                pos_cur += N
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_step_cache", None)
+        return state
+    
+    def functions(self):
+        """
+        Return the function giving the value of each feature at a position:
+        __call__ for boolean features, step for the others.
+        """
+        return [(feature.__call__ if feature.is_boolean else feature.step) for feature in self._features]
+    
+    def tables(self, list2dict):
+        """
+        Return the tables of the values of each feature for the tokens of
+        list2dict, values are computed when first needed (see match).
+        """
+        return [[_unknown] * len(list2dict) for _ in self._features]
+    
+    def match(self, list2dict, start, functions, tables, memo, bounded=True):
+        """
+        Return the end of the match starting at start, -1 if there is none.
+        If bounded, a match fails when it reaches the end of the sentence,
+        otherwise features are also evaluated after it (as step does).
+        """
+        length   = len(list2dict)
+        last     = len(self._features) - 1
+        features = self._features
+        horizon  = (length if bounded else 2**29)
+        
+        # most positions do not start a match, they fail before any state is built.
+        if features[0].min_match > 0 and start < length:
+            found = tables[0][start]
+            if found is _unknown:
+                found = tables[0][start] = functions[0](list2dict, start)
+            if not found:
+                return -1
+        
+        index    = 0
+        remain_min = features[0].min_match
+        remain_max = features[0].max_match
+        current  = start
+        visited  = []
+        result   = None
+        while result is None:
+            # remain_min only matters once it reaches 0, remain_max when it may still reach 0.
+            key = (index, (remain_min if remain_min > 0 else 0), (remain_max if remain_max <= horizon - current else None), current)
+            if key in memo:
+                result = memo[key]
+                break
+            visited.append(key)
+            
+            if current >= length:
+                if bounded:
+                    result = -1
+                    break
+                found = functions[index](list2dict, current) # after the end of the sentence, only reached by step
+                while remain_min <= 0 and not found and index < last:
+                    index += 1
+                    remain_min = features[index].min_match
+                    remain_max = features[index].max_match
+                    found = functions[index](list2dict, current)
+            else:
+                found = tables[index][current]
+                if found is _unknown:
+                    found = tables[index][current] = functions[index](list2dict, current)
+                while remain_min <= 0 and not found and index < last:
+                    index += 1
+                    remain_min = features[index].min_match
+                    remain_max = features[index].max_match
+                    found = tables[index][current]
+                    if found is _unknown:
+                        found = tables[index][current] = functions[index](list2dict, current)
+            
+            if found:
+                current += int(found)
                 remain_min -= 1
                 remain_max -= 1
             elif remain_min <= 0:
-                if feat_index < len(self._features)-1:
-                    feat_index += 1
-                else:
-                    matches.append([pos_beg, pos_cur])
-                    pos_beg = pos_cur
-                    pos_cur = pos_beg
-                    feat_index = 0
-                feat = self._features[feat_index]
-                func = (feat.__call__ if feat.is_boolean else feat.step)
-                remain_min = feat.min_match
-                remain_max = feat.max_match
+                if index == last:
+                    result = current
+                    break
+                index += 1
+                remain_min = features[index].min_match
+                remain_max = features[index].max_match
             elif remain_max >= 0:
-                pos_beg += 1
-                pos_cur = pos_beg
-                feat_index = 0
-                feat = self._features[feat_index]
-                func = (feat.__call__ if feat.is_boolean else feat.step)
-                remain_min = feat.min_match
-                remain_max = feat.max_match
+                result = -1
+                break
             if remain_max == 0:
-                if feat_index < len(self._features)-1:
-                    feat_index += 1
-                else:
-                    feat_index = 0
-                    matches.append([pos_beg, pos_cur])
-                    pos_beg = pos_cur
-                    pos_cur = pos_beg
-                feat = self._features[feat_index]
-                func = (feat.__call__ if feat.is_boolean else feat.step)
-                remain_min = feat.min_match
-                remain_max = feat.max_match
+                if index == last:
+                    result = current
+                    break
+                index += 1
+                remain_min = features[index].min_match
+                remain_max = features[index].max_match
+        
+        for key in visited:
+            memo[key] = result
+        return result
+    
+    def __call__(self, list2dict, *args, **kwargs):
+        l = ["O"]*len(list2dict)
+        functions = self.functions()
+        tables = self.tables(list2dict)
+        memo = {}
+        matches = []
+        pos_beg = 0
+        while pos_beg < len(list2dict)-1:
+            pos_end = self.match(list2dict, pos_beg, functions, tables, memo)
+            if pos_end > pos_beg:
+                matches.append([pos_beg, pos_end])
+                pos_beg = pos_end
+            else: # no match or an empty one
+                pos_beg += 1
         for lo,hi in matches:
             l[lo] = "B-{0}".format(self.name)
             for i in range(lo+1, hi):
@@ -110,49 +173,15 @@ class RuleFeature(Feature):
         return l
     
     def step(self, list2dict, i):
-        pos_beg = i
-        pos_cur = pos_beg
-        feat_index = 0
-        feat = self._features[feat_index]
-        remain_min = feat.min_match
-        remain_max = feat.max_match
-        matches = []
-        func = (feat.__call__ if feat.is_boolean else feat.step)
-        while pos_beg < len(list2dict)-1:
-            while remain_min <= 0 and not func(list2dict, pos_cur) and feat_index < len(self._features)-1:
-                feat_index += 1
-                feat = self._features[feat_index]
-                func = (feat.__call__ if feat.is_boolean else feat.step)
-                remain_min = feat.min_match
-                remain_max = feat.max_match
-            if feat_index >= len(self._features):
-                return 0
-            if func(list2dict, pos_cur):
-                N = int(func(list2dict, pos_cur))
-                pos_cur += N
-                remain_min -= 1
-                remain_max -= 1
-            elif remain_min <= 0:
-                if feat_index < len(self._features)-1:
-                    feat_index += 1
-                else:
-                    return pos_cur - pos_beg
-                feat = self._features[feat_index]
-                func = (feat.__call__ if feat.is_boolean else feat.step)
-                remain_min = feat.min_match
-                remain_max = feat.max_match
-            elif remain_max >= 0:
-                return 0
-            if remain_max == 0:
-                if feat_index < len(self._features)-1:
-                    feat_index += 1
-                else:
-                    return pos_cur - pos_beg
-                feat = self._features[feat_index]
-                func = (feat.__call__ if feat.is_boolean else feat.step)
-                remain_min = feat.min_match
-                remain_max = feat.max_match
-        return 0
+        if i >= len(list2dict)-1:
+            return 0
+        # tables and runs of the last sentence are kept, step is called on every token of a sentence.
+        cached = getattr(self, "_step_cache", None)
+        if cached is None or cached[0] is not list2dict:
+            cached = (list2dict, self.functions(), self.tables(list2dict), {})
+            self._step_cache = cached
+        pos_end = self.match(list2dict, i, cached[1], cached[2], cached[3], bounded=False)
+        return (pos_end - i if pos_end >= 0 else 0)
 
 class OrRuleFeature(Feature):
     def __init__(self, features, *args, **kwargs):
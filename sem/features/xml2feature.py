@@ -31,9 +31,15 @@ SOFTWARE.
 """
 
 import re
+import os
 
 from os.path import abspath, dirname, join
 
+try:
+    from xml.etree import cElementTree as ET
+except ImportError:
+    from xml.etree import ElementTree as ET
+
 #import sem.information
 import sem.misc
 
@@ -52,6 +58,28 @@ from . import RuleFeature, OrRuleFeature
 
 from . import TriggeredFeature
 
+def feature_references(definition, directory):
+    """
+    Return the values of the attributes of a feature definition (other than
+    its own name), they include the entries and features it uses. The
+    features of a directory feature are defined in the files of the
+    directory, None is returned if they cannot be read.
+    """
+    element = ET.fromstring(definition)
+    values = set()
+    for node in element.iter():
+        values.update(node.attrib.values())
+        if node.tag == "directory":
+            path = os.path.join(directory, node.attrib.get("path", u""))
+            try:
+                for name in os.listdir(path):
+                    for subnode in ET.parse(os.path.join(path, name)).getroot().iter():
+                        values.update(subnode.attrib.values())
+            except Exception:
+                return None
+    values.discard(element.attrib.get("name"))
+    return values
+
 class XML2Feature(object):
     def __init__(self, entries, path=None):
         self._default_shift = 0
@@ -195,7 +223,8 @@ class XML2Feature(object):
         elif xml.tag == "directory":
             path = abspath(join(dirname(self._path), attrib.pop("path")))
             ambiguous = sem.misc.str2bool(attrib.pop("ambiguous", "false"))
-            return DirectoryFeature(path, self, order=attrib.pop("order",".order"), ambiguous=ambiguous, **attrib)
+            merged = sem.misc.str2bool(attrib.pop("merged", "false"))
+            return DirectoryFeature(path, self, order=attrib.pop("order",".order"), ambiguous=ambiguous, merged=merged, **attrib)
         
         elif xml.tag == "fill":
             entry = attrib.pop("entry")
@@ -258,12 +258,14 @@ def json_data(data):
         spans = [Span(lb=span[u"s"], ub=0, length=span[u"l"]) for span in d[u"spans"]]
         segmentation = Segmentation(segmentation_name, spans=spans, reference=d.get(u"reference", None))
         document.add_segmentation(segmentation)
-    for segmentation in document.segmentations:
-        if segmentation.reference is not None:
-            segmentation.reference = document.segmentation(segmentation.reference)
+    for segmentation in document.segmentations.values():
+        if sem.misc.is_string(segmentation.reference):
+            segmentation._reference = document.segmentation(segmentation.reference)
     
     for annotation_name in data.get(u"annotations", {}):
         d = data[u"annotations"][annotation_name]
         annotations = [Tag(value=annotation[u"v"], lb=annotation[u"s"], ub=0, length=annotation[u"l"]) for annotation in d[u"annotations"]]
-        annotation = Annotation(annotation_name, reference=document.segmentation(d[u"reference"]), annotations=annotations)
+        annotation = Annotation(annotation_name, reference=document.segmentation(d.get(u"reference")), annotations=annotations)
         document.add_annotation(annotation)
+    
+    return document
@@ -26,14 +26,7 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-from .enrich import SEMModule as EnrichModule
-from .label_consistency import SEMModule as LabelConsistencyModule
-from .segmentation import SEMModule as SegmentationModule
-from .annotate import SEMModule as AnnotateModule
-from .wapiti_label import SEMModule as WapitiLabelModule
-from .clean import SEMModule as CleanModule
-from .map_annotations import SEMModule as MapAnnotationsModule
-
+import sys
 
 try:
     from importlib import import_module
@@ -48,3 +41,63 @@ def get_package(name):
 def get_module(name):
     module = import_module("sem.modules.{0}".format(name))
     return module.SEMModule
+
+# short descriptions for "python -m sem -h", so that modules do not have to
+# be imported to be listed.
+descriptions = {
+    u"annotate": u"annotate a file with a given annotator",
+    u"annotation_gui": u"GUI for manual annotation",
+    u"cache": u"inspect and manage the document cache of the tagger",
+    u"clean": u"remove unwanted columns from CoNLL-formatted file",
+    u"compile_dictionary": u"compile a dictionary for the enrich module",
+    u"compile_pipeline": u"save the pipeline of a master file as a snapshot",
+    u"decompile_dictionary": u"decompile a dictionary compiled for the enrich module",
+    u"enrich": u"add features to a file using an XML configuration file",
+    u"evaluate": u"get F1-score for tagging using the IOB scheme",
+    u"export": u"export CoNLL-formatted data to specified format",
+    u"gui": u"GUI for tagging documents and training new models",
+    u"label_consistency": u"broadcast annotations based on form",
+    u"map_annotations": u"map annotations according to a mapping",
+    u"segmentation": u"segment text into tokens and sentences",
+    u"serve": u"annotate documents through a local HTTP JSON API",
+    u"tagger": u"run the pipeline defined in a master file",
+    u"wapiti_label": u'wrapper for "wapiti label" command',
+}
+
+_exported_modules = {
+    "EnrichModule": "enrich",
+    "LabelConsistencyModule": "label_consistency",
+    "SegmentationModule": "segmentation",
+    "AnnotateModule": "annotate",
+    "WapitiLabelModule": "wapiti_label",
+    "CleanModule": "clean",
+    "MapAnnotationsModule": "map_annotations",
+}
+
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        # modules are only imported when they are first accessed (PEP 562).
+        try:
+            module = get_module(_exported_modules[name])
+        except KeyError:
+            raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+        globals()[name] = module
+        return module
+else:
+    import types
+    
+    class _LazyPackage(types.ModuleType):
+        # PEP 562 is not available, the package is replaced in sys.modules by
+        # a module whose __getattr__ imports the modules when they are first accessed.
+        def __getattr__(self, name):
+            try:
+                module = get_module(_exported_modules[name])
+            except KeyError:
+                raise AttributeError("module {0!r} has no attribute {1!r}".format(self.__name__, name))
+            setattr(self, name, module)
+            return module
+    
+    _package = _LazyPackage(__name__, __doc__)
+    _package.__dict__.update(globals())
+    _package._module = sys.modules[__name__] # keeps the globals of the functions above alive
+    sys.modules[__name__] = _package
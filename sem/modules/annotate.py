@@ -43,6 +43,7 @@ from .sem_module import SEMModule as RootModule
 from sem.logger import default_handler, file_handler
 
 import sem.annotators
+import sem.cache
 
 from sem.CRF.model import Model
 
@@ -63,8 +64,22 @@ class SEMModule(RootModule):
             tagging_logger.addHandler(file_handler(self._log_file))
         tagging_logger.setLevel(self._log_level)
         
+        self._arguments = (annotator, field, args, kwargs)
         self._annotator = sem.annotators.get_annotator(annotator)(field, *args, **kwargs)
     
+    def writes(self):
+        return [self._arguments[1]]
+    
+    def resources(self):
+        location = getattr(self._annotator, "_location", None)
+        if location is None:
+            return []
+        return sem.cache.file_resources(location)
+    
+    def reload(self):
+        annotator, field, args, kwargs = self._arguments
+        return SEMModule(annotator, field, self._log_level, self._log_file, *args, **kwargs)
+    
     def process_document(self, document, **kwargs):
         start = time.time()
         self._annotator.process_document(document)
@@ -0,0 +1,102 @@
+#-*- coding:utf-8 -*-
+
+"""
+file: cache.py
+
+Description: inspect and manage the document cache used by the tagger.
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from __future__ import print_function
+
+import json
+import logging
+import os.path
+
+import sem.cache
+
+from sem.logger import default_handler
+
+cache_logger = logging.getLogger("sem.cache")
+cache_logger.addHandler(default_handler)
+
+def main(args):
+    """
+    Manage a cache directory.
+    
+    Parameters
+    ----------
+    action : str
+        stats: print statistics about the cache.
+        invalidate: remove cached documents, only those of the given master
+        file if given, every document otherwise.
+        evict: remove least recently used documents until the cache is no
+        bigger than max_size.
+    directory : str
+        the cache directory.
+    master : str
+        the master file whose documents are concerned (invalidate only).
+    max_size : float
+        the maximum size of the cache in megabytes (evict only).
+    force_format : str
+        the format that was forced when calling the tagger, if any.
+    """
+    
+    cache_logger.setLevel(args.log_level)
+    directory = args.directory
+    
+    if args.action == "stats":
+        print(json.dumps(sem.cache.cache_report(directory), indent=2, sort_keys=True))
+    elif args.action == "invalidate":
+        fingerprint = None
+        if args.master is not None:
+            fingerprint = sem.cache.pipeline_fingerprint(args.master, args.force_format)
+        removed = sem.cache.invalidate(directory, fingerprint)
+        cache_logger.info(u"removed %i cache entries", removed)
+    elif args.action == "evict":
+        if args.max_size is None:
+            raise ValueError("evict requires a maximum size (--max-size)")
+        sem.cache.evict(directory, int(args.max_size * 1024 * 1024))
+
+
+import sem
+
+_subparsers = sem.argument_subparsers
+
+parser = _subparsers.add_parser(os.path.splitext(os.path.basename(__file__))[0], description="Inspect and manage the document cache of the tagger.")
+
+parser.add_argument("action", choices=("stats", "invalidate", "evict"),
+                    help="The operation to perform on the cache.")
+parser.add_argument("directory",
+                    help="The cache directory.")
+parser.add_argument("-m", "--master", dest="master",
+                    help="Only invalidate the documents of this master file (default: every document).")
+parser.add_argument("-f", "--force-format", dest="force_format", default="default",
+                    help='The format forced when calling the tagger (default: "%(default)s").')
+parser.add_argument("-s", "--max-size", dest="max_size", type=float,
+                    help="The maximum size of the cache in megabytes, for evict.")
+parser.add_argument("-l", "--log", dest="log_level", choices=("DEBUG","INFO","WARNING","ERROR","CRITICAL"), default="WARNING",
+                    help="Increase log level (default: %(default)s)")
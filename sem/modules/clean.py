@@ -45,7 +45,7 @@ clean_info_logger = logging.getLogger("sem.clean_info")
 clean_info_logger.addHandler(default_handler)
 
 class SEMModule(RootModule):
-    def __init__(self, to_keep, log_level="WARNING", log_file=None, **kwargs):
+    def __init__(self, to_keep, hidden=None, log_level="WARNING", log_file=None, **kwargs):
         super(SEMModule, self).__init__(log_level=log_level, log_file=log_file, **kwargs)
         
         if is_string(to_keep):
@@ -53,9 +53,29 @@ class SEMModule(RootModule):
         else:
             self._allowed = to_keep
         
+        # values kept in tokens without being fields, so that a later enrich does not compute them again.
+        if is_string(hidden):
+            self._hidden = set(hidden.split(u","))
+        else:
+            self._hidden = set(hidden or [])
+        
         if len(self._allowed) == 0:
             raise ValueError("No more data after cleaning !")
-
+    
+    @property
+    def allowed(self):
+        return self._allowed
+    
+    @property
+    def hidden(self):
+        return self._hidden
+    
+    def reads(self):
+        return []
+    
+    def writes(self):
+        return []
+    
     def process_document(self, document, **kwargs):
         """
         Cleans the sem.storage.corpus of a document, removing unwanted fields.
@@ -87,10 +107,15 @@ class SEMModule(RootModule):
         if len(allowed - fields) > 0:
             clean_info_logger.warn(u"the following fields are not present in document, this might cause an error sometime later: %s", u", ".join(allowed - fields))
         
-        indices = [entry.index for entry in document.corpus.fields]
+        hidden = self._hidden - allowed
         for i in range(len(document.corpus.sentences)):
             for j in range(len(document.corpus.sentences[i])):
-                document.corpus.sentences[i][j] = dict((a,document.corpus.sentences[i][j][a]) for a in allowed)
+                token = document.corpus.sentences[i][j]
+                cleaned = dict((a,token[a]) for a in allowed)
+                for a in hidden:
+                    if a in token:
+                        cleaned[a] = token[a]
+                document.corpus.sentences[i][j] = cleaned
         
         laps = time.time() - start
         clean_info_logger.info(u'done in {0}'.format(timedelta(seconds=laps)))
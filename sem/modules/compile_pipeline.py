@@ -0,0 +1,86 @@
+#-*- coding:utf-8 -*-
+
+"""
+file: compile_pipeline.py
+
+Description: build the pipeline of a master file and save it as a snapshot
+that the tagger can load instead of the master file.
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+import logging
+import os.path
+import time
+from datetime import timedelta
+
+import sem.snapshot
+
+from sem.logger import default_handler
+from sem.modules.tagger import load_master
+
+compile_pipeline_logger = logging.getLogger("sem.compile_pipeline")
+compile_pipeline_logger.addHandler(default_handler)
+
+def compile_pipeline(master, output, force_format="default", pipeline_mode="all", optimise=False):
+    """
+    Build the pipeline described in master and write it as a snapshot in
+    output. If optimise is True, the pipeline is optimised by the planner
+    before being saved. Returns the header of the snapshot.
+    """
+    pipeline, options, exporter, couples = load_master(master, force_format, pipeline_mode, optimise=optimise)
+    return sem.snapshot.write_snapshot(output, master, pipeline, options, exporter, couples, force_format=force_format, pipeline_mode=pipeline_mode)
+
+def main(args):
+    start = time.time()
+    
+    compile_pipeline_logger.setLevel(args.log_level)
+    
+    header = compile_pipeline(args.master, args.output, force_format=args.force_format, pipeline_mode=args.pipeline_mode, optimise=args.optimise)
+    compile_pipeline_logger.info(u"snapshot of %s written to %s (%i resources)", header[u"master"], args.output, len(header[u"resources"]))
+    
+    laps = time.time() - start
+    compile_pipeline_logger.info(u"done in %s", timedelta(seconds=laps))
+
+
+import sem
+
+_subparsers = sem.argument_subparsers
+
+parser = _subparsers.add_parser(os.path.splitext(os.path.basename(__file__))[0], description="Build the pipeline of a master file and save it as a snapshot that the tagger can use instead of the master file.")
+
+parser.add_argument("master",
+                    help="The master configuration file.")
+parser.add_argument("output",
+                    help="The output snapshot file.")
+parser.add_argument("-f", "--force-format", dest="force_format", default="default",
+                    help='Force the output format given in "master", default otherwise (default: "%(default)s").')
+parser.add_argument("-m", "--mode", dest="pipeline_mode", choices=("all", "train", "label"), default="all",
+                    help="The pipeline mode (default: %(default)s).")
+parser.add_argument("-O", "--optimise", action="store_true",
+                    help="Optimise the pipeline with the planner before saving it.")
+parser.add_argument("-l", "--log", dest="log_level", choices=("DEBUG","INFO","WARNING","ERROR","CRITICAL"), default="WARNING",
+                    help="Increase log level (default: %(default)s)")
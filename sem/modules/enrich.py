@@ -31,11 +31,15 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import codecs
 import logging
+import functools
+import multiprocessing
 
 # measuring time laps
 import time
 from datetime import timedelta
+from timeit import default_timer
 
 try:
     from xml.etree.cElementTree import ElementTree, tostring as element2string
@@ -45,18 +49,26 @@ except ImportError:
 from .sem_module import SEMModule as RootModule
 
 from sem.features import XML2Feature
+from sem.features.xml2feature import feature_references
+from sem.features.compiler import FeaturePlan
+from sem.features.profiler import FeatureProfiler
 from sem.IO import KeyReader, KeyWriter
 from sem.logger import default_handler, file_handler
 from sem.misc import is_string
 from sem.importers import conll_file
 from sem.storage import Entry
+from sem.storage.corpus import LazyColumns, LazyToken
+from sem.CRF.model import model_columns
+
+import sem.cache
+import sem.stages
 
 import os.path
 enrich_logger = logging.getLogger("sem.{0}".format(os.path.basename(__file__).split(".")[0]))
 enrich_logger.addHandler(default_handler)
 
 class SEMModule(RootModule):
-    def __init__(self, path=None, bentries=None, aentries=None, features=None, mode=u"label", log_level="WARNING", log_file=None, **kwargs):
+    def __init__(self, path=None, bentries=None, aentries=None, features=None, mode=u"label", model=None, profile=False, log_level="WARNING", log_file=None, **kwargs):
         super(SEMModule, self).__init__(log_level=log_level, log_file=log_file, **kwargs)
         
         self._mode     = mode
@@ -66,6 +78,13 @@ class SEMModule(RootModule):
         self._features = [] # informations that are added
         self._names    = set()
         self._x2f      = None # the feature parser, initialised in parse
+        self._definitions = [] # the XML definition of each feature, empty if not loaded from a file
+        self._reused   = set() # features whose values are already in tokens, they are not computed again
+        self._model    = model # the model fed with the features, only the features it uses are computed eagerly
+        self._lazy     = {} # fields of the document: features computed on first access
+        self._plan     = None # the features compiled to be evaluated sentence-wise, see plan
+        self._profile  = profile # whether features are measured, see profiler
+        self._profiler = None
         
         if self._source is not None:
             enrich_logger.info(u'loading %s', self._source)
@@ -104,6 +123,59 @@ class SEMModule(RootModule):
     def features(self):
         return self._features
     
+    @property
+    def definitions(self):
+        return self._definitions
+    
+    @property
+    def source(self):
+        return self._source
+    
+    @property
+    def model(self):
+        return self._model
+    
+    @property
+    def plan(self):
+        """
+        The features compiled in a sem.features.compiler.FeaturePlan,
+        compiled on first use.
+        """
+        if self._plan is None:
+            self._plan = FeaturePlan(self._features)
+        return self._plan
+    
+    @property
+    def profiler(self):
+        """
+        The sem.features.profiler.FeatureProfiler measuring the features
+        when the module profiles them, attached on first use. None if the
+        module does not profile features.
+        """
+        if self._profile and self._profiler is None:
+            self._profiler = FeatureProfiler(self._features, self.plan)
+            self._profiler.attach()
+        return self._profiler
+    
+    def reads(self):
+        return [entry.name for entry in self._bentries + self._aentries]
+    
+    def writes(self):
+        return [feature.name for feature in self._features if feature.display]
+    
+    def resources(self):
+        resources = []
+        if self._source is not None:
+            resources.extend(sem.cache.file_resources(self._source))
+        if self._model is not None:
+            resources.extend(sem.cache.file_resources(self._model))
+        return resources
+    
+    def reload(self):
+        if self._source is None:
+            return self
+        return SEMModule(path=self._source, mode=self._mode, model=self._model, profile=self._profile, log_level=self._log_level, log_file=self._log_file, pipeline_mode=self.pipeline_mode)
+    
     def process_document(self, document, **kwargs):
         """
         Updates the CoNLL-formatted corpus inside a document with various
@@ -127,35 +199,146 @@ class SEMModule(RootModule):
             enrich_logger.addHandler(file_handler(self._log_file))
         enrich_logger.setLevel(self._log_level)
         
+        self._add_fields(document)
+        enrich_logger.info(u'enriching file "%s"', document.name)
+        
+        self.enrich_sentences(document.corpus, lazy=self.lazy_features(document.corpus.fields))
+        
+        laps = time.time() - start
+        enrich_logger.info(u"done in %s", timedelta(seconds=laps))
+    
+    def process_documents(self, documents, **kwargs):
+        """
+        Updates the CoNLL-formatted corpus of every document. The sentences
+        of all documents are enriched together.
+        """
+        
+        start = time.time()
+        
+        if self._log_file is not None:
+            enrich_logger.addHandler(file_handler(self._log_file))
+        enrich_logger.setLevel(self._log_level)
+        
+        groups = {}
+        for document in documents:
+            self._add_fields(document)
+            groups.setdefault(self.lazy_features(document.corpus.fields), []).append(document)
+        enrich_logger.info(u'enriching %i documents', len(documents))
+        
+        for lazy, group in groups.items():
+            self.enrich_sentences((sentence for document in group for sentence in document.corpus), lazy=lazy)
+        
+        laps = time.time() - start
+        enrich_logger.info(u"done in %s", timedelta(seconds=laps))
+        return documents
+    
+    def _add_fields(self, document):
         missing_fields = set([I.name for I in self.bentries + self.aentries]) - set(document.corpus.fields)
         
         if len(missing_fields) > 0:
             raise ValueError("Missing fields in input corpus: {0}".format(u",".join(sorted(missing_fields))))
         
-        enrich_logger.info(u'enriching file "%s"', document.name)
-        
         new_fields = [feature.name for feature in self.features if feature.display]
         document.corpus.fields += new_fields
+    
+    def lazy_features(self, fields):
+        """
+        Return the names of the features that are computed on first access
+        for a document whose fields are given (enriched fields included).
+        Without a model, every feature is computed eagerly. Otherwise, only
+        the features at the columns used by the model and the features they
+        depend on are.
+        """
+        if self._model is None:
+            return frozenset()
+        fields = tuple(fields)
+        if fields not in self._lazy:
+            columns = model_columns(self._model)
+            names = [feature.name for feature in self._features if feature.name not in self._reused]
+            if columns is None or len(self._definitions) != len(self._features):
+                self._lazy[fields] = frozenset()
+                return self._lazy[fields]
+            directory = os.path.dirname(os.path.abspath(self._source))
+            references = dict([(feature.name, feature_references(definition, directory)) for feature, definition in zip(self._features, self._definitions)])
+            eager = set([fields[column] for column in columns if column < len(fields)])
+            stack = list(eager)
+            while stack:
+                used = references.get(stack.pop(), set())
+                if used is None: # cannot tell what the feature uses
+                    eager.update(names)
+                    break
+                for name in used - eager:
+                    eager.add(name)
+                    stack.append(name)
+            self._lazy[fields] = frozenset([name for name in names if name not in eager])
+            if self._lazy[fields]:
+                enrich_logger.info(u"%i features not used by %s are computed on access", len(self._lazy[fields]), self._model)
+        return self._lazy[fields]
+    
+    def compute(self, feature, p, memo=None):
+        """
+        Add the values of feature to every token of sentence p. memo holds
+        the columns of the plan already computed for p.
+        """
+        if self._profiler is not None:
+            start = default_timer()
+            self._compute(feature, p, memo)
+            self._profiler.record(feature, default_timer() - start, (1 if feature.is_sequence else len(p)))
+        else:
+            self._compute(feature, p, memo)
+    
+    def _compute(self, feature, p, memo):
+        if feature.is_sequence:
+            for i, value in enumerate(feature(p)):
+                p[i][feature.name] = value
+        else:
+            name = feature.name
+            values = self.plan.values(feature, p, memo)
+            if feature.is_boolean:
+                for token, value in zip(p, values):
+                    token[name] = int(value)
+            else:
+                for token, value in zip(p, values):
+                    token[name] = (value if value is not None else feature.default())
+    
+    def enrich_sentences(self, sentences, lazy=frozenset()):
+        """
+        Add the features to every token of sentences. The features in lazy
+        are only computed when one of their values is accessed, tokens of
+        sentences are replaced with LazyToken in that case.
+        """
+        for p in self.enriched(sentences, lazy=lazy):
+            pass
+    
+    def enriched(self, sentences, lazy=frozenset()):
+        """
+        Enrich sentences one at a time (see enrich_sentences), each sentence
+        is yielded once enriched, before the next one is read. Every feature
+        only depends on the sentence of a token, sentences may be read from
+        a stream and written as soon as they are enriched.
+        """
         nth = 0
-        for i, p in enumerate(document.corpus):
-            for feature in self.features:
-                if feature.is_sequence:
-                    for i, value in enumerate(feature(p)):
-                        p[i][feature.name] = value
-                else:
-                    for i in range(len(p)):
-                        p[i][feature.name] = feature(p, i)
-                        if feature.is_boolean:
-                            p[i][feature.name] = int(p[i][feature.name])
-                        elif p[i][feature.name] is None:
-                            p[i][feature.name] = feature.default()
+        if self._profile:
+            self.profiler.attach() # before the features are first called
+        features = [feature for feature in self.features if feature.name not in self._reused and feature.name not in lazy]
+        lazy_features = [feature for feature in self.features if feature.name in lazy]
+        for p in sentences:
+            memo = {}
+            for feature in features:
+                self.compute(feature, p, memo)
+            if lazy_features:
+                p[:] = [LazyToken(token) for token in p]
+                columns = LazyColumns(p, dict([(feature.name, functools.partial(self.compute, feature)) for feature in lazy_features]))
+                for token in p:
+                    token.lazy = columns
             nth += 1
             if (0 == nth % 1000):
                 enrich_logger.debug(u'%i sentences enriched', nth)
+            yield p
         enrich_logger.debug(u'%i sentences enriched', nth)
-        
-        laps = time.time() - start
-        enrich_logger.info(u"done in %s", timedelta(seconds=laps))
+        if enrich_logger.isEnabledFor(logging.DEBUG):
+            info = self.plan.cache_info()
+            enrich_logger.debug(u"token type cache: %i hits, %i misses, %i types", info[u"hits"], info[u"misses"], info[u"size"])
     
     def _parse(self, filename):
         def check_entry(entry_name):
@@ -201,8 +384,12 @@ class SEMModule(RootModule):
         self._x2f = XML2Feature(self.bentries + self.aentries, path=filename)
         
         features = list(children[1])
+        self._plan = None
+        self._profiler = None
         del self._features[:]
+        del self._definitions[:]
         for feature in features:
+            self._definitions.append(element2string(feature).strip()) # before parsing, it removes attributes
             self._features.append(self._x2f.parse(feature))
             if self._features[-1].name is None:
                 try:
@@ -215,10 +402,42 @@ class SEMModule(RootModule):
             check_entry(self._features[-1].name)
 
 
+_processor = None # the enrich module of main, in the processes of its pool
+
+def _set_processor(processor):
+    global _processor
+    _processor = processor
+
+def enrich_chunk(item):
+    """
+    Enrich a chunk of sentences with the enrich module of main, in a process
+    of its pool. item is an (index, sentences) couple, it is returned with
+    the sentences enriched.
+    """
+    index, sentences = item
+    _processor.enrich_sentences(sentences)
+    return index, sentences
+
+def read_chunks(sentences, size):
+    """
+    Yield the sentences by chunks of size sentences (the last chunk may be
+    shorter).
+    """
+    chunk = []
+    for p in sentences:
+        chunk.append(p)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
 def main(args):
     """
     Takes a CoNLL-formatted file and write another CoNLL-formatted file
-    with additional features in it.
+    with additional features in it. The file is streamed: sentences are
+    read, enriched and written one at a time (or one chunk at a time with
+    several processors), the whole file is never in memory.
     
     Parameters
     ----------
@@ -226,10 +445,23 @@ def main(args):
         the CoNLL-formatted input file.
     infofile : str
         the XML file containing the different features.
+    outfile : str
+        the CoNLL-formatted output file.
     mode : str
         the mode to use for infofile. Some inputs may only be present in
         a particular mode. For example, the output tag is only available
         in "train" mode.
+    n_procs : int
+        the number of processes enriching chunks of sentences (0: one per
+        processor). Sentences are written in the order of infile.
+    chunk_size : int
+        the number of sentences of a chunk.
+    profile : str
+        if not None, the format of the profile of features written once the
+        file is enriched: "text" (a table, the slowest features first) or
+        "json". Features are then enriched in a single process.
+    profile_file : str
+        the file the profile is written to (default: standard error).
     log_level : str or int
         the logging level.
     log_file : str
@@ -244,19 +476,55 @@ def main(args):
     enrich_logger.setLevel(args.log_level)
     enrich_logger.info(u'parsing enrichment file "%s"', args.infofile)
     
-    processor = SEMModule(path=args.infofile, mode=args.mode)
+    profile = getattr(args, "profile", None)
+    processor = SEMModule(path=args.infofile, mode=args.mode, profile=profile is not None)
     
     enrich_logger.debug(u'enriching file "%s"', args.infile)
     
     bentries = [entry.name for entry in processor.bentries]
     aentries = [entry.name for entry in processor.aentries]
     features = [feature.name for feature in processor.features if feature.display]
-    document = from_conll(args.infile, bentries + aentries, (bentries + aentries)[0], encoding=args.ienc or args.enc)
+    reader = KeyReader(args.infile, args.ienc or args.enc, bentries + aentries, splitter=lambda line: line.split(u"\t"))
+    sentences = (list(p) for p in reader) # the reader reuses its list for every sentence
+    
+    n_procs = getattr(args, "n_procs", 1)
+    if n_procs == 0:
+        n_procs = multiprocessing.cpu_count()
+    if sem.ON_WINDOWS:
+        n_procs = 1
+    if profile is not None and n_procs > 1:
+        enrich_logger.warning(u"features are profiled in a single process")
+        n_procs = 1
     
-    processor.process_document(document)
     with KeyWriter(args.outfile, args.oenc or args.enc, bentries + features + aentries) as O:
-        for p in document.corpus:
-            O.write_p(p)
+        if n_procs <= 1:
+            for p in processor.enriched(sentences):
+                O.write_p(p)
+        else:
+            enrich_logger.info(u"enriching chunks of %i sentences with %i processes", args.chunk_size, n_procs)
+            pool = multiprocessing.Pool(processes=n_procs, initializer=_set_processor, initargs=(processor,))
+            try:
+                process_map = sem.stages.pool_map(pool, enrich_chunk, 2 * n_procs)
+                pending = {}
+                following = 0
+                for index, chunk in process_map(enumerate(read_chunks(sentences, args.chunk_size))):
+                    pending[index] = chunk
+                    while following in pending: # chunks are written in order
+                        for p in pending.pop(following):
+                            O.write_p(p)
+                        following += 1
+            finally:
+                pool.terminate()
+    
+    if profile is not None:
+        report = (processor.profiler.to_json(indent=2) if profile == u"json" else processor.profiler.format_report())
+        if getattr(args, "profile_file", None):
+            with codecs.open(args.profile_file, "w", "utf-8") as output_stream:
+                output_stream.write(report)
+                output_stream.write(u"\n")
+        else:
+            sys.stderr.write(report)
+            sys.stderr.write(u"\n")
     
     laps = time.time() - start
     enrich_logger.info(u"done in %s", timedelta(seconds=laps))
@@ -278,6 +546,14 @@ parser.add_argument("outfile",
                     help="The output file (CoNLL format)")
 parser.add_argument("-m", "--mode", dest="mode", default=u"train", choices=(u"train", u"label", u"annotate", u"annotation"),
                     help="The mode for enrichment. May make entries vary (default: %(default)s)")
+parser.add_argument("-p", "--processors", dest="n_procs", type=int, default=1,
+                    help="The number of processes enriching chunks of sentences, 0 for one per processor (default: %(default)s)")
+parser.add_argument("--chunk-size", dest="chunk_size", type=int, default=200,
+                    help="The number of sentences of a chunk with several processes (default: %(default)s)")
+parser.add_argument("--profile", dest="profile", choices=(u"text", u"json"),
+                    help="Profile the features and write the report in this format once the file is enriched (forces a single process)")
+parser.add_argument("--profile-file", dest="profile_file",
+                    help="The file the profile is written to (default: standard error)")
 parser.add_argument("--input-encoding", dest="ienc",
                     help="Encoding of the input (default: UTF-8)")
 parser.add_argument("--output-encoding", dest="oenc",
@@ -70,6 +70,9 @@ class SEMModule(RootModule):
             export_logger.info(u'using loaded exporter')
             self._exporter = exporter
     
+    def writes(self):
+        return []
+    
     def process_document(self, document, outfile=sys.stdout, output_encoding="utf-8", **kwargs):
         start = time.time()
         
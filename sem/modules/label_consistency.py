@@ -209,41 +209,14 @@ class LabelConsistencyFeature(MultiwordDictionaryFeature):
         ne_entry    = (annot_entry if annot_entry is not None else self._ne_entry)
         l           = [t[ne_entry][:] for t in list2dict]
         form2entity = self._form2entity
-        tmp         = self._value._data
-        length      = len(list2dict)
-        fst         = 0
-        lst         = -1 # last match found
-        cur         = 0
         entry       = (token_entry if token_entry is not None else self._entry)
-        ckey        = None  # Current KEY
-        while fst < length - 1:
-            cont = True
-            while cont and (cur < length):
-                ckey  = list2dict[cur][entry]
-                if l[cur] == "O":
-                    if NUL in tmp: lst = cur
-                    tmp   = tmp.get(ckey, {})
-                    cont  = len(tmp) != 0
-                    cur  += int(cont)
-                else:
-                    cont = False
-            
-            if NUL in tmp: lst = cur
-            
-            if lst != -1:
-                form = u" ".join([list2dict[i][entry] for i in range(fst,lst)])
-                appendice = u"-" + form2entity[form]
-                l[fst] = u'B' + appendice
-                for i in range(fst+1, lst):
-                    l[i] = u'I' + appendice
-                fst = lst
-                cur = fst
-            else:
-                fst += 1
-                cur  = fst
-            
-            tmp = self._value._data
-            lst = -1
+        tokens      = [(t[entry] if tag == "O" else None) for t, tag in zip(list2dict, l)] # entities are not matched again
+        for fst, lst, state in self.matches(tokens):
+            form = u" ".join([list2dict[i][entry] for i in range(fst,lst)])
+            appendice = u"-" + form2entity[form]
+            l[fst] = u'B' + appendice
+            for i in range(fst+1, lst):
+                l[i] = u'I' + appendice
         
         if NUL in self._value._data.get(list2dict[-1][entry], []) and l[-1] == "O":
             l[-1] = u'B-' + form2entity[list2dict[-1][entry]]
@@ -259,39 +232,11 @@ class OverridingLabelConsistencyFeature(LabelConsistencyFeature):
     def __call__(self, list2dict, token_entry=None, annot_entry=None, *args, **kwargs):
         l           = [u"O" for _ in range(len(list2dict))]
         form2entity = self._form2entity
-        tmp         = self._value._data
-        length      = len(list2dict)
-        fst         = 0
-        lst         = -1 # last match found
-        cur         = 0
         entry       = (token_entry if token_entry is not None else self._entry)
-        ckey        = None  # Current KEY
         entities    = []
-        while fst < length - 1:
-            cont = True
-            while cont and (cur < length):
-                ckey  = list2dict[cur][entry]
-                if l[cur] == "O":
-                    if NUL in tmp: lst = cur
-                    tmp   = tmp.get(ckey, {})
-                    cont  = len(tmp) != 0
-                    cur  += int(cont)
-                else:
-                    cont = False
-            
-            if NUL in tmp: lst = cur
-            
-            if lst != -1:
-                form = u" ".join([list2dict[i][entry] for i in range(fst, lst)])
-                entities.append(Tag(form2entity[form], fst, lst))
-                fst = lst
-                cur = fst
-            else:
-                fst += 1
-                cur  = fst
-            
-            tmp = self._value._data
-            lst = -1
+        for fst, lst, state in self.matches(self.tokens(list2dict, entry)):
+            form = u" ".join([list2dict[i][entry] for i in range(fst, lst)])
+            entities.append(Tag(form2entity[form], fst, lst))
         
         if NUL in self._value._data.get(list2dict[-1][entry], []):
             entities.append(Tag(form2entity[list2dict[-1][entry]], len(list2dict)-1, len(list2dict)))
@@ -333,6 +278,12 @@ class SEMModule(RootModule):
         else:
             self._feature = LabelConsistencyFeature(None, ne_entry=self._field, entry=self._token_field, entries=None)
     
+    def reads(self):
+        return [self._token_field, self._field]
+    
+    def writes(self):
+        return [self._field]
+    
     def process_document(self, document, abbreviation_resolution=True, **kwargs):
         corpus = document.corpus.sentences
         field = self._field
@@ -59,6 +59,12 @@ class SEMModule(RootModule):
         
         self._annotation_name = annotation_name
     
+    def reads(self):
+        return []
+    
+    def writes(self):
+        return [self._annotation_name]
+    
     def process_document(self, document, **kwargs):
         """
         Updates a document with various segmentations and creates
@@ -28,22 +28,85 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import copy
 import logging
 import multiprocessing
+import multiprocessing.pool
 import functools
+import threading
 
 from .sem_module import SEMModule
 from sem.logger import default_handler, file_handler
+from sem.cache import path_signature
+from sem.storage.corpus import Corpus
+from sem.misc import is_string
 
 pipeline_logger = logging.getLogger("sem.pipeline")
 pipeline_logger.addHandler(default_handler)
 
+def document_size(document):
+    """
+    Return the number of tokens of document. If it is not segmented yet,
+    the number of whitespace-separated words is used instead.
+    """
+    if len(document.corpus) > 0:
+        return sum([len(sentence) for sentence in document.corpus])
+    return len((document.content or u"").split())
+
+def token_batches(documents, max_tokens=None):
+    """
+    Split documents in consecutive batches of at most max_tokens tokens.
+    """
+    if max_tokens is None:
+        if documents:
+            yield documents
+        return
+    
+    batch = []
+    size = 0
+    for document in documents:
+        document_tokens = document_size(document)
+        if batch and size + document_tokens > max_tokens:
+            yield batch
+            batch = []
+            size = 0
+        batch.append(document)
+        size += document_tokens
+    if batch:
+        yield batch
+
+def resource_signatures(pipe):
+    """
+    Return the signature of every resource of pipe, None for missing ones.
+    Pipes that do not define resources are considered to have none.
+    """
+    signatures = {}
+    for path in (pipe.resources() if hasattr(pipe, "resources") else []):
+        try:
+            signatures[path] = path_signature(path)
+        except OSError:
+            signatures[path] = None
+    return signatures
+
 class Pipeline(SEMModule):
     def __init__(self, pipes, log_level="WARNING", log_file=None, pipeline_mode="all", **kwargs):
         super(Pipeline, self).__init__(log_level=log_level, log_file=log_file, **kwargs)
         
         self._pipes = pipes
         self._pipeline_mode = pipeline_mode
+        self._signatures = [resource_signatures(pipe) for pipe in self._pipes]
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_reload_lock"]
+        state["_watcher"] = None
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reload_lock = threading.Lock()
     
     def __iter__(self):
         for pipe in self._pipes:
@@ -67,19 +130,140 @@ class Pipeline(SEMModule):
             pipe.check_mode(self.pipeline_mode)
     
     def append(self, pipe):
-        self._pipes.append(pipe)
+        with self._reload_lock:
+            self._pipes.append(pipe)
+            self._signatures.append(resource_signatures(pipe))
     
     def remove(self, pipe):
-        self._pipes.remove(pipe)
+        with self._reload_lock:
+            index = self._pipes.index(pipe)
+            del self._pipes[index]
+            del self._signatures[index]
+    
+    def resources(self):
+        return sorted(set([path for pipe in self._pipes for path in resource_signatures(pipe)]))
+    
+    def changed(self):
+        """
+        Return the indices of the pipes whose resources changed since they
+        were built.
+        """
+        return [i for i, pipe in enumerate(self._pipes) if resource_signatures(pipe) != self._signatures[i]]
+    
+    def _reload_pipes(self, force=False):
+        pipes = self._pipes[:]
+        signatures = self._signatures[:]
+        reloaded = 0
+        for i, pipe in enumerate(pipes):
+            current = resource_signatures(pipe)
+            if not (force or current != signatures[i]):
+                continue
+            pipeline_logger.info(u"reloading %s", pipe.__class__.__module__)
+            try:
+                new_pipe = pipe.reload()
+            except Exception:
+                pipeline_logger.exception(u"could not reload %s, keeping current version", pipe.__class__.__module__)
+                continue
+            pipes[i] = new_pipe
+            # signatures taken before building: if a file changes during build, it will be reloaded again.
+            signatures[i] = current
+            reloaded += int(new_pipe is not pipe)
+        return pipes, signatures, reloaded
+    
+    def reload(self, force=False):
+        """
+        Reload the pipes whose resources changed (every pipe if force is
+        True). New pipes are built while the current ones are still in use,
+        then the list of pipes is replaced at once: documents being processed
+        keep using the old pipes, the next ones use the new pipes. A pipe that
+        fails to load is kept as it is. Returns the number of reloaded pipes.
+        """
+        with self._reload_lock:
+            pipes, signatures, reloaded = self._reload_pipes(force)
+            self._pipes = pipes
+            self._signatures = signatures
+        return reloaded
+    
+    def reloaded(self, force=False):
+        """
+        Return a new pipeline where the pipes whose resources changed are
+        reloaded, the pipeline itself is left untouched. Returns self if no
+        pipe was reloaded.
+        """
+        with self._reload_lock:
+            pipes, signatures, reloaded = self._reload_pipes(force)
+        if reloaded == 0:
+            return self
+        pipeline = Pipeline(pipes, log_level=self._log_level, log_file=self._log_file, pipeline_mode=self._pipeline_mode)
+        pipeline._signatures = signatures
+        return pipeline
+    
+    def watch(self, interval=5.0):
+        """
+        Check for changed resources every interval seconds in a background
+        thread and reload the corresponding pipes.
+        """
+        if self._watcher is not None:
+            return
+        stop = threading.Event()
+        def run():
+            while not stop.wait(interval):
+                self.reload()
+        thread = threading.Thread(target=run, name="sem-pipeline-watcher")
+        thread.daemon = True
+        self._watcher = (thread, stop)
+        thread.start()
+    
+    def stop_watching(self):
+        if self._watcher is not None:
+            thread, stop = self._watcher
+            stop.set()
+            thread.join()
+            self._watcher = None
     
     def process_document(self, document, **kwargs):
-        for pipe in self._pipes:
+        pipes = self._pipes # pipes may be swapped by reload, a document is processed by a single version
+        for pipe in pipes:
             if self.pipeline_mode == "all" or pipe.pipeline_mode in ("all", self.pipeline_mode):
                 pipe.process_document(document, **kwargs)
             else:
                 pipeline_logger.warn(u"pipe %s not executed", pipe)
         return document # allows multiprocessing
     
+    def aprocess(self, document, **kwargs):
+        """
+        Process document without blocking the asyncio event loop (python
+        3.5+), see sem.aio. Returns a coroutine:
+            document = await pipeline.aprocess(document)
+        """
+        import sem.aio
+        return sem.aio.aprocess(self, document, **kwargs)
+    
+    def process_documents(self, documents, max_tokens=None, **kwargs):
+        """
+        Process documents by batches: each pipe processes a whole batch
+        before the next pipe is called, so that pipes can share work between
+        the documents of a batch.
+        
+        Parameters
+        ----------
+        documents : list of sem.storage.Document
+            the documents to process.
+        max_tokens : int
+            the maximum number of tokens in a batch (None: no limit). A
+            document bigger than max_tokens is processed on its own.
+        """
+        documents = list(documents)
+        for batch in token_batches(documents, max_tokens):
+            pipeline_logger.debug(u"processing batch of %i documents", len(batch))
+            pipes = self._pipes # pipes may be swapped by reload, a batch is processed by a single version
+            for pipe in pipes:
+                if self.pipeline_mode == "all" or pipe.pipeline_mode in ("all", self.pipeline_mode):
+                    pipe.process_documents(batch, **kwargs)
+                else:
+                    pipeline_logger.warn(u"pipe %s not executed", pipe)
+        return documents
+    
     @classmethod
     def from_xml(cls, xmlpipes):
         classes = {}
@@ -103,3 +287,251 @@ class Pipeline(SEMModule):
                     arguments[key] = value
             pipes.append(Class(**arguments))
         pipeline = sem.modules.pipeline.Pipeline(pipes)
+
+def branch_copy(document):
+    """
+    Return a copy of document a branch can modify without changing
+    document: tokens, segmentations and annotations are copied, the content
+    and the objects they contain are shared. Lazy columns of tokens are
+    computed in the copy.
+    """
+    branch_document = copy.copy(document)
+    branch_document._corpus = Corpus(document.corpus.fields, [[copy.copy(token) for token in sentence] for sentence in document.corpus.sentences])
+    branch_document._segmentations = dict(document.segmentations)
+    branch_document._annotations = dict([(name, copy.copy(annotation)) for name, annotation in document.annotations.items()])
+    for annotation in branch_document._annotations.values():
+        annotation._annotations = annotation._annotations[:]
+    branch_document._metadatas = dict(document.metadatas)
+    return branch_document
+
+def run_branch(branch, documents, writes=None, **kwargs):
+    """
+    Process documents with branch and return, for each document, what the
+    branch added or modified: a (columns, annotations, segmentations)
+    triple. Columns are the new fields (and the fields in writes), as lists
+    of values for every sentence.
+    """
+    before = [(list(document.corpus.fields), dict(document.annotations), dict(document.segmentations)) for document in documents]
+    branch.process_documents(documents, **kwargs)
+    deltas = []
+    for document, (fields, annotations, segmentations) in zip(documents, before):
+        columns = []
+        for field in document.corpus.fields:
+            if field not in fields or (writes is not None and field in writes):
+                columns.append((field, [[token[field] for token in sentence] for sentence in document.corpus.sentences]))
+        new_annotations = [(name, annotation) for name, annotation in document.annotations.items() if annotations.get(name) is not annotation]
+        new_segmentations = [(name, segmentation) for name, segmentation in document.segmentations.items() if segmentations.get(name) is not segmentation]
+        deltas.append((columns, new_annotations, new_segmentations))
+    return deltas
+
+def merge_delta(document, delta, merged, branch_name):
+    """
+    Merge what a branch did on a copy of document back into document. Fields
+    and annotations already merged from a previous branch are kept.
+    """
+    columns, annotations, segmentations = delta
+    for field, values in columns:
+        if field in merged:
+            pipeline_logger.warn(u'field "%s" of branch "%s" already written by another branch, ignored', field, branch_name)
+            continue
+        if len(values) != len(document.corpus.sentences):
+            raise ValueError(u'branch "{0}" changed the segmentation of document {1}'.format(branch_name, document.name))
+        for sentence, sentence_values in zip(document.corpus.sentences, values):
+            for token, value in zip(sentence, sentence_values):
+                token[field] = value
+        if field not in document.corpus.fields:
+            document.corpus.fields.append(field)
+        merged.add(field)
+    for name, segmentation in segmentations:
+        if name not in document.segmentations:
+            document._segmentations[name] = segmentation
+    for name, annotation in annotations:
+        if (u"annotation", name) in merged:
+            pipeline_logger.warn(u'annotation "%s" of branch "%s" already written by another branch, ignored', name, branch_name)
+            continue
+        # annotations computed in another process reference a copy of the segmentation.
+        reference = annotation.reference
+        if reference is not None and not is_string(reference) and reference.name in document.segmentations:
+            annotation._reference = document.segmentation(reference.name)
+        document._annotations[name] = annotation
+        merged.add((u"annotation", name))
+
+def branch_fields(branch):
+    """
+    Return the fields a branch reads from its input and the fields it
+    writes, None when a pipe of the branch does not tell.
+    """
+    reads = set()
+    writes = set()
+    for pipe in branch:
+        pipe_reads = (pipe.reads() if hasattr(pipe, "reads") else None)
+        pipe_writes = (pipe.writes() if hasattr(pipe, "writes") else None)
+        if reads is not None:
+            reads = (None if pipe_reads is None else reads | (set(pipe_reads) - (writes or set())))
+        if writes is not None:
+            writes = (None if pipe_writes is None else writes | set(pipe_writes))
+    return reads, writes
+
+_branches = None
+
+def _init_branches(branches):
+    global _branches
+    _branches = branches
+
+def _run_branch(index, documents, writes, kwargs):
+    return run_branch(_branches[index], documents, writes, **kwargs)
+
+class Parallel(SEMModule):
+    """
+    Independent branches of a pipeline. Every branch works on its own copy
+    of the documents, branches are run concurrently in threads (or in
+    processes for CPU-bound branches) and what they add to the documents is
+    merged back in the order the branches are declared, so that the result
+    does not depend on which branch finishes first. Daemonic processes (the
+    workers of the tagger) cannot have children, branches of a "process"
+    executor are run in threads there.
+    """
+    
+    def __init__(self, branches, names=None, executor="thread", workers=None, log_level="WARNING", log_file=None, pipeline_mode="all", **kwargs):
+        super(Parallel, self).__init__(log_level=log_level, log_file=log_file, pipeline_mode=pipeline_mode, **kwargs)
+        
+        if executor not in ("thread", "process"):
+            raise ValueError(u'unknown executor "{0}", should be "thread" or "process"'.format(executor))
+        
+        self._branches = branches
+        self._names = names or [u"branch{0}".format(i) for i in range(len(branches))]
+        self._executor = executor
+        self._workers = int(workers or len(branches))
+        self._pool = None
+        self._pool_executor = None # the executor of _pool, see pool
+        self._pool_lock = threading.Lock()
+        
+        self._fields = [branch_fields(branch) for branch in self._branches]
+        self._check_independent()
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_pool_lock"]
+        state["_pool"] = None
+        state["_pool_executor"] = None
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._pool_lock = threading.Lock()
+    
+    def __iter__(self):
+        for branch in self._branches:
+            yield branch
+    
+    def __len__(self):
+        return len(self._branches)
+    
+    @property
+    def branches(self):
+        return self._branches
+    
+    @property
+    def names(self):
+        return self._names
+    
+    def _check_independent(self):
+        for i, (name, (reads, writes)) in enumerate(zip(self._names, self._fields)):
+            for j, (other_name, (other_reads, other_writes)) in enumerate(zip(self._names, self._fields)):
+                if i == j or other_writes is None:
+                    continue
+                if i < j and writes is not None and writes & other_writes:
+                    raise ValueError(u'branches "{0}" and "{1}" both write {2}'.format(name, other_name, u", ".join(sorted(writes & other_writes))))
+                if reads is not None and reads & other_writes:
+                    raise ValueError(u'branch "{0}" reads {1} written by branch "{2}", they are not independent'.format(name, u", ".join(sorted(reads & other_writes)), other_name))
+            if reads is None or writes is None:
+                pipeline_logger.debug(u'fields of branch "%s" are not fully known, independence only partially checked', name)
+    
+    def check_mode(self, expected_mode):
+        for branch in self._branches:
+            for pipe in branch:
+                pipe.check_mode(expected_mode)
+    
+    def reads(self):
+        reads = set()
+        for branch_reads, branch_writes in self._fields:
+            if branch_reads is None:
+                return None
+            reads |= branch_reads
+        return sorted(reads)
+    
+    def writes(self):
+        writes = set()
+        for branch_reads, branch_writes in self._fields:
+            if branch_writes is None:
+                return None
+            writes |= branch_writes
+        return sorted(writes)
+    
+    def resources(self):
+        return sorted(set([path for branch in self._branches for path in branch.resources()]))
+    
+    def reload(self):
+        branches = [branch.reloaded() for branch in self._branches]
+        if all([new is old for new, old in zip(branches, self._branches)]):
+            return self
+        return Parallel(branches, names=self._names, executor=self._executor, workers=self._workers, log_level=self._log_level, log_file=self._log_file, pipeline_mode=self._pipeline_mode)
+    
+    def executor(self):
+        """
+        The executor branches are run with in the current process: "thread"
+        for a "process" executor in a daemonic process.
+        """
+        if self._executor == "process" and multiprocessing.current_process().daemon:
+            return "thread"
+        return self._executor
+    
+    def pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool_executor = self.executor()
+                if self._pool_executor == "process":
+                    self._pool = multiprocessing.Pool(processes=self._workers, initializer=_init_branches, initargs=(self._branches,))
+                else:
+                    if self._executor == "process":
+                        pipeline_logger.warning(u"daemonic processes cannot have children, branches are run in threads instead of processes")
+                    self._pool = multiprocessing.pool.ThreadPool(processes=self._workers)
+            return self._pool
+    
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+                self._pool = None
+                self._pool_executor = None
+    
+    def process_document(self, document, **kwargs):
+        self.process_documents([document], **kwargs)
+        return document
+    
+    def process_documents(self, documents, **kwargs):
+        """
+        Process documents with every branch concurrently, then merge the
+        results of the branches in the order they are declared.
+        """
+        documents = list(documents)
+        if not documents:
+            return documents
+        
+        copies = [[branch_copy(document) for document in documents] for branch in self._branches]
+        if len(self._branches) == 1 or self._workers == 1:
+            all_deltas = [run_branch(branch, branch_documents, writes, **kwargs) for branch, branch_documents, (reads, writes) in zip(self._branches, copies, self._fields)]
+        else:
+            pool = self.pool()
+            if self._pool_executor == "process":
+                results = [pool.apply_async(_run_branch, (i, branch_documents, writes, kwargs)) for i, (branch_documents, (reads, writes)) in enumerate(zip(copies, self._fields))]
+            else:
+                results = [pool.apply_async(functools.partial(run_branch, branch, branch_documents, writes, **kwargs)) for branch, branch_documents, (reads, writes) in zip(self._branches, copies, self._fields)]
+            all_deltas = [result.get() for result in results]
+        
+        for document_index, document in enumerate(documents):
+            merged = set()
+            for name, deltas in zip(self._names, all_deltas):
+                merge_delta(document, deltas[document_index], merged, name)
+        return documents
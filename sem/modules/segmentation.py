@@ -60,6 +60,12 @@ class SEMModule(RootModule):
         else:
             self._tokeniser = tokeniser
     
+    def reads(self):
+        return []
+    
+    def writes(self):
+        return [u"word"]
+    
     def process_document(self, document, **kwargs):
         """
         Updates a document with various segmentations and creates
@@ -48,3 +48,41 @@ class SEMModule(Holder):
     
     def process_document(self, document, **kwargs):
         raise NotImplementedError("process_document not implemented for root type " + self.__class__)
+    
+    def reads(self):
+        """
+        Return the fields the module reads, None if any field may be read.
+        """
+        return None
+    
+    def writes(self):
+        """
+        Return the fields and annotations the module adds or modifies, None
+        if they are not known.
+        """
+        return None
+    
+    def resources(self):
+        """
+        Return the files and directories the module was built from (models,
+        dictionaries, etc.). They are watched to know when the module has to
+        be reloaded.
+        """
+        return []
+    
+    def reload(self):
+        """
+        Return a new module built from the current version of its resources.
+        Modules without resources return themselves.
+        """
+        return self
+    
+    def process_documents(self, documents, **kwargs):
+        """
+        Process a batch of documents. Documents are processed one after the
+        other by default, modules that can share work between documents
+        should override this method.
+        """
+        for document in documents:
+            self.process_document(document, **kwargs)
+        return documents
@@ -0,0 +1,403 @@
+#-*- coding:utf-8 -*-
+
+"""
+file: serve.py
+
+Description: a long-lived tagging server. The pipeline of a master file is
+loaded once and documents are annotated through a local HTTP JSON API.
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+import json
+import logging
+import multiprocessing
+import multiprocessing.pool
+import os.path
+import socket
+import threading
+import time
+import traceback
+
+try:
+    import BaseHTTPServer as httpserver
+    import SocketServer as socketserver
+except ImportError:
+    import http.server as httpserver
+    import socketserver
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+import sem
+import sem.importers
+import sem.workers
+
+from sem.logger import default_handler
+from sem.storage import Document
+from sem.exporters.jason import Exporter as JSONExporter
+from sem.modules.tagger import load_master
+
+serve_logger = logging.getLogger("sem.serve")
+serve_logger.addHandler(default_handler)
+
+_pipeline = None
+def process(data):
+    """
+    Annotate a document given as jason-formatted data with the pipeline of
+    the server. Exceptions are returned instead of raised so that the
+    server always gets a result.
+    """
+    try:
+        document = sem.importers.json_data(data)
+        _pipeline.process_document(document)
+        return (True, JSONExporter().document_to_data(document, {}))
+    except Exception:
+        return (False, traceback.format_exc())
+
+class RequestError(Exception):
+    def __init__(self, code, message):
+        super(RequestError, self).__init__(message)
+        self.code = code
+
+class TaggingServer(socketserver.ThreadingMixIn, httpserver.HTTPServer):
+    """
+    The TaggingServer object. Each request is handled in its own thread and
+    sent to a pool of workers. A request is rejected (503) when
+    max_concurrent documents are already being processed and aborted (504)
+    when its document is not processed within timeout seconds.
+    
+    Worker processes are supervised: a request takes an idle worker and
+    gives it back once its document is processed. A worker that does not
+    answer within timeout seconds is killed with its document, a worker
+    that dies (killed for its memory, crashed in wapiti, ...) is replaced,
+    the request then fails (504 or 500) and its slot is released. Worker
+    threads cannot be killed, the slot of a document that timed out is only
+    released once the thread is done with it.
+    
+    Attributes
+    ----------
+    pipeline : sem.modules.pipeline.Pipeline
+        the pipeline used to annotate documents.
+    workers : int
+        the number of workers. Workers are processes (fork, see
+        sem.workers.Worker), threads on Windows or if use_threads is True.
+    timeout : float
+        the maximum time in seconds to wait for a document to be processed.
+    max_concurrent : int
+        the maximum number of documents being processed at the same time,
+        including those waiting for a worker.
+    max_length : int
+        the maximum size of a request body in bytes.
+    """
+    
+    daemon_threads = True
+    allow_reuse_address = True
+    
+    def __init__(self, pipeline, address=("127.0.0.1", 8000), workers=1, timeout=60.0, max_concurrent=None, max_length=10*1024*1024, use_threads=False):
+        global _pipeline
+        _pipeline = pipeline
+        
+        self.pipeline = pipeline
+        self.workers = max(workers, 1)
+        self.timeout = timeout
+        self.max_concurrent = max_concurrent or 2 * self.workers
+        self.max_length = max_length
+        self.started = time.time()
+        
+        self._slots = threading.BoundedSemaphore(self.max_concurrent)
+        self._lock = threading.Lock()
+        self._stats = {u"requests": 0, u"processed": 0, u"errors": 0, u"rejected": 0, u"timeouts": 0, u"in_flight": 0, u"processing_time": 0.0, u"recycled": 0}
+        self._pool = None # the pool of worker threads
+        self._workers = [] # every worker process
+        self._idle = queue.Queue() # the worker processes waiting for a document
+        if sem.ON_WINDOWS or use_threads:
+            self._pool = multiprocessing.pool.ThreadPool(processes=self.workers)
+        else:
+            for _ in range(self.workers):
+                self._idle.put(self._new_worker())
+        
+        httpserver.HTTPServer.__init__(self, address, RequestHandler)
+    
+    def count(self, key, value=1):
+        with self._lock:
+            self._stats[key] += value
+    
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats[u"workers"] = self.workers
+        stats[u"max_concurrent"] = self.max_concurrent
+        stats[u"uptime"] = time.time() - self.started
+        stats[u"average_time"] = (stats[u"processing_time"] / stats[u"processed"] if stats[u"processed"] else 0.0)
+        return stats
+    
+    def _new_worker(self):
+        worker = sem.workers.Worker(process)
+        with self._lock:
+            self._workers.append(worker)
+        return worker
+    
+    def _replace(self, worker):
+        # the worker is killed with its document, if any.
+        worker.stop(kill=True)
+        with self._lock:
+            self._workers.remove(worker)
+        self.count(u"recycled")
+        self._idle.put(self._new_worker())
+    
+    def _release(self):
+        self.count(u"in_flight", -1)
+        self._slots.release()
+    
+    def _in_thread(self, data):
+        def run():
+            # the slot is released once the thread is done, even if the request timed out.
+            try:
+                return process(data)
+            finally:
+                self._release()
+        
+        try:
+            return self._pool.apply_async(run).get(self.timeout)
+        except multiprocessing.TimeoutError:
+            self.count(u"timeouts")
+            raise RequestError(504, u"document not processed within {0} seconds".format(self.timeout))
+    
+    def _in_process(self, data, start):
+        try:
+            worker = self._idle.get(True, self.timeout)
+        except queue.Empty:
+            self.count(u"timeouts")
+            raise RequestError(504, u"no worker available within {0} seconds".format(self.timeout))
+        
+        try:
+            if not worker.process.is_alive(): # died while idle
+                self._replace(worker)
+                worker = None
+                try: # another request may take the new worker first
+                    worker = self._idle.get(True, max(self.timeout - (time.time() - start), 0))
+                except queue.Empty:
+                    self.count(u"timeouts")
+                    raise RequestError(504, u"no worker available within {0} seconds".format(self.timeout))
+            worker.send(0, data)
+            if not worker.connection.poll(max(self.timeout - (time.time() - start), 0)):
+                self._replace(worker)
+                worker = None
+                self.count(u"timeouts")
+                raise RequestError(504, u"document not processed within {0} seconds".format(self.timeout))
+            index, result, error, rss, peak = worker.connection.recv()
+            if error is not None and error[0] == sem.workers.MEMORY:
+                self._replace(worker)
+                worker = None
+        except (EOFError, IOError, OSError):
+            dead, worker = worker, None
+            self._replace(dead) # joins the process, its exit code is known afterwards
+            self.count(u"errors")
+            serve_logger.error(u"worker exited with code %s", dead.process.exitcode)
+            raise RequestError(500, u"error while processing document")
+        finally:
+            if worker is not None:
+                self._idle.put(worker)
+        
+        if error is not None:
+            return (False, error[1])
+        return result
+    
+    def annotate(self, data):
+        """
+        Annotate a document given as jason-formatted data. Returns the
+        annotated document in the same format.
+        """
+        if not self._slots.acquire(False):
+            self.count(u"rejected")
+            raise RequestError(503, u"too many documents being processed, try again later")
+        self.count(u"in_flight")
+        
+        start = time.time()
+        if self._pool is not None:
+            success, result = self._in_thread(data)
+        else:
+            try:
+                success, result = self._in_process(data, start)
+            finally:
+                self._release()
+        
+        if not success:
+            self.count(u"errors")
+            serve_logger.error(result)
+            raise RequestError(500, u"error while processing document")
+        self.count(u"processed")
+        self.count(u"processing_time", time.time() - start)
+        return result
+    
+    def server_close(self):
+        httpserver.HTTPServer.server_close(self)
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+        with self._lock:
+            workers = list(self._workers)
+            self._workers = []
+        for worker in workers:
+            worker.stop(kill=True)
+
+class UnixTaggingServer(TaggingServer):
+    """
+    A TaggingServer listening on a Unix socket instead of a TCP port.
+    """
+    
+    address_family = socket.AF_UNIX if hasattr(socket, "AF_UNIX") else None
+    
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = self.server_address
+        self.server_port = 0
+
+class RequestHandler(httpserver.BaseHTTPRequestHandler):
+    """
+    GET /health: the server is up.
+    GET /stats: statistics about the processed documents.
+    POST /annotate: annotate a document. The body is either plain text or a
+    jason-formatted document (Content-Type: application/json), the answer is
+    the annotated document in jason format.
+    """
+    
+    server_version = "SEM/{0}".format(sem.version())
+    
+    def address_string(self):
+        return (self.client_address[0] if self.client_address else u"unix")
+    
+    def log_message(self, fmt, *args):
+        serve_logger.info(u"%s %s", self.address_string(), fmt % args)
+    
+    def send_json(self, code, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if code == 503:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def send_error_json(self, code, message):
+        self.send_json(code, {u"error": message})
+    
+    def do_GET(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path == "/health":
+            self.send_json(200, {u"status": u"ok", u"version": sem.version()})
+        elif path == "/stats":
+            self.send_json(200, self.server.stats())
+        else:
+            self.send_error_json(404, u"unknown path: {0}".format(self.path))
+    
+    def do_POST(self):
+        self.server.count(u"requests")
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path not in ("", "/annotate"):
+            self.send_error_json(404, u"unknown path: {0}".format(self.path))
+            return
+        
+        try:
+            data = self.read_document()
+            self.send_json(200, self.server.annotate(data))
+        except RequestError as exc:
+            self.send_error_json(exc.code, u"{0}".format(exc))
+        except Exception: # the client gets an answer whatever happens
+            self.server.count(u"errors")
+            serve_logger.exception(u"unexpected error while processing document")
+            self.send_error_json(500, u"error while processing document")
+    
+    def read_document(self):
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            raise RequestError(400, u"invalid Content-Length")
+        if length > self.server.max_length:
+            raise RequestError(413, u"document too big (maximum {0} bytes)".format(self.server.max_length))
+        
+        try:
+            body = self.rfile.read(length).decode("utf-8")
+        except UnicodeDecodeError:
+            raise RequestError(400, u"invalid UTF-8")
+        content_type = self.headers.get("Content-Type", "text/plain").split(";")[0].strip()
+        if content_type == "application/json":
+            try:
+                data = json.loads(body)
+            except ValueError:
+                raise RequestError(400, u"invalid JSON")
+            if not isinstance(data, dict) or u"content" not in data:
+                raise RequestError(400, u'JSON documents must have a "content" field')
+            return data
+        return {u"name": u"_DOCUMENT_", u"content": body}
+
+def main(args):
+    pipeline, options, exporter, couples = load_master(args.master)
+    
+    serve_logger.setLevel(args.log_level)
+    
+    kwargs = dict(workers=args.workers, timeout=args.timeout, max_concurrent=args.max_concurrent)
+    if args.unix_socket:
+        server = UnixTaggingServer(pipeline, args.unix_socket, **kwargs)
+        serve_logger.warn(u"listening on %s", args.unix_socket)
+    else:
+        server = TaggingServer(pipeline, (args.host, args.port), **kwargs)
+        serve_logger.warn(u"listening on http://%s:%s", *server.server_address[:2])
+    
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+_subparsers = sem.argument_subparsers
+
+parser = _subparsers.add_parser(os.path.splitext(os.path.basename(__file__))[0], description="Load the pipeline of a master file once and annotate documents sent through a local HTTP JSON API.")
+
+parser.add_argument("master",
+                    help="The master configuration file (or pipeline snapshot).")
+parser.add_argument("--host", dest="host", default="127.0.0.1",
+                    help="The host to listen on (default: %(default)s).")
+parser.add_argument("--port", dest="port", type=int, default=8000,
+                    help="The port to listen on (default: %(default)s).")
+parser.add_argument("--unix-socket", dest="unix_socket",
+                    help="Listen on this Unix socket instead of a TCP port.")
+parser.add_argument("-w", "--workers", dest="workers", type=int, default=1,
+                    help="The number of worker processes (default: %(default)s).")
+parser.add_argument("-t", "--timeout", dest="timeout", type=float, default=60.0,
+                    help="The maximum time in seconds to process a document (default: %(default)s).")
+parser.add_argument("-c", "--max-concurrent", dest="max_concurrent", type=int,
+                    help="The maximum number of documents processed or waiting at the same time, other requests are rejected (default: twice the number of workers).")
+parser.add_argument("-l", "--log", dest="log_level", choices=("DEBUG","INFO","WARNING","ERROR","CRITICAL"), default="WARNING",
+                    help="Increase log level (default: %(default)s)")
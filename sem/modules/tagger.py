@@ -31,6 +31,7 @@ SOFTWARE.
 """
 
 import codecs
+import glob
 import logging
 import os
 import shutil
@@ -54,7 +55,7 @@ from functools import partial
 
 import sem
 
-from sem.logger import logging_format, default_handler
+from sem.logger import logging_format, default_handler, file_handler
 from sem.storage import Document
 
 from sem.modules import get_module
@@ -64,6 +65,12 @@ import sem.exporters
 import sem.exporters.conll
 import sem.importers
 import sem.misc
+import sem.cache
+import sem.snapshot
+import sem.batch
+import sem.spool
+import sem.workers
+import sem.stages
 
 sem_tagger_logger = logging.getLogger("sem.tagger")
 sem_tagger_logger.addHandler(default_handler)
@@ -71,30 +78,311 @@ if sem.ON_WINDOWS:
     sem_tagger_logger.warn("multiprocessing not handled on Windows. Documents will be processed sequentially.")
 
 __pipeline = None
-def process(document, exporter, output_directory, couples, encoding, lang_style):
+def process(document, exporter, output_directory, couples, encoding, lang_style, cache=None, cached=False):
     """
     The function used to allow multiprocessing of documents.
     Note that multiprocessing will only work on Linux.
     The function is written to work sequentially on Windows to avoid dupe.
+    If cached is True, the document was restored from the cache and only
+    has to be exported. Otherwise, it is stored in cache (if given) once
+    processed.
     """
-    __pipeline.process_document(document)
+    if not cached:
+        annotate(document, cache=cache)
     
     if exporter is not None:
-        name = document.escaped_name()
-        if u"html" in exporter.extension():
-            shutil.copy(os.path.join(sem.SEM_RESOURCE_DIR, u"css", u"tabs.css"), output_directory)
-            shutil.copy(os.path.join(sem.SEM_RESOURCE_DIR, u"css", exporter._lang, lang_style), output_directory)
-        
-        shortname, ext = os.path.splitext(name)
-        out_path = os.path.join(output_directory, u"{0}.{1}".format(shortname, exporter.extension()))
-        if exporter.extension() == u"ann":
-            filename = shortname + u".txt"
-            with codecs.open(os.path.join(output_directory, filename), "w", encoding) as O:
-                O.write(document.content)
-        exporter.document_to_file(document, couples, out_path, encoding=encoding)
+        export(document, exporter, output_directory, couples, encoding, lang_style)
         
     return document
+
+def annotate(document, cache=None):
+    """
+    Process document with the pipeline and store it in cache (if given).
+    """
+    key = (sem.cache.document_key(document) if cache is not None else None)
+    __pipeline.process_document(document)
+    if cache is not None:
+        cache.store(document, key)
+    return document
+
+def copy_style(exporter, output_directory, lang_style):
+    if u"html" in exporter.extension():
+        shutil.copy(os.path.join(sem.SEM_RESOURCE_DIR, u"css", u"tabs.css"), output_directory)
+        shutil.copy(os.path.join(sem.SEM_RESOURCE_DIR, u"css", exporter._lang, lang_style), output_directory)
+
+def export(document, exporter, output_directory, couples, encoding, lang_style, style=True):
+    """
+    Write document in output_directory. If style is False, the style files
+    of HTML exports are not copied (see copy_style).
+    """
+    if style:
+        copy_style(exporter, output_directory, lang_style)
+    
+    shortname, ext = os.path.splitext(document.escaped_name())
+    out_path = output_path(document, exporter, output_directory)
+    if exporter.extension() == u"ann":
+        filename = shortname + u".txt"
+        with codecs.open(os.path.join(output_directory, filename), "w", encoding) as O:
+            O.write(document.content)
+    exporter.document_to_file(document, couples, out_path, encoding=encoding)
+    return out_path
+
+def output_path(document, exporter, output_directory):
+    shortname, ext = os.path.splitext(document.escaped_name())
+    return os.path.join(output_directory, u"{0}.{1}".format(shortname, exporter.extension()))
+
+def process_file(path, file_format, opts, **kwargs):
+    """
+    Read, process and export the document of a manifest file. Errors are
+    returned instead of raised so that a failing file does not stop a batch
+    run. Returns (path, output path, error).
+    """
+    try:
+        document = sem.misc.documents_from_list([path], file_format, **opts)[0]
+        cache = kwargs.get("cache")
+        cached = (cache is not None and cache.restore(document))
+        process(document, cached=cached, **kwargs)
+        exporter = kwargs.get("exporter")
+        return path, (os.path.abspath(output_path(document, exporter, kwargs["output_directory"])) if exporter is not None else None), None
+    except Exception as exc:
+        return path, None, u"{0}: {1}".format(exc.__class__.__name__, exc)
+
+def run_manifest(manifest, journal_file, shard, max_attempts, n_procs, file_format, opts, limits=None, n_fields=1, telemetry=None, **kwargs):
+    """
+    Process the files of a manifest that are not completed in the journal.
+    Files that fail are tried again until they failed max_attempts times,
+    including the attempts of previous runs. If limits (the arguments of
+    sem.workers.WorkerPool) are given, files are processed in supervised
+    workers, their cost being estimated from their size. Returns the
+    journal. Shards and the journal are keyed on the entries of the manifest,
+    not on the paths of the files (see sem.batch.manifest_entries).
+    """
+    entries = sem.batch.manifest_entries(manifest)
+    if shard is not None:
+        entries = sem.batch.select_shard(entries, shard[0], shard[1], key=lambda entry: entry[0])
+    paths = dict([(entry, path) for entry, path in entries])
+    entries = [entry for entry, path in entries]
+    journal = sem.batch.Journal(journal_file or sem.batch.journal_name(manifest, shard))
+    sem_tagger_logger.info("journal %s: %i file(s) of %i already done", journal.filename, sum([1 for entry in entries if journal.is_done(entry)]), len(entries))
+    
+    do_process_file = partial(process_file, file_format=file_format, opts=opts, **kwargs)
+    supervised = bool(limits or telemetry) and not sem.ON_WINDOWS
+    pool = (multiprocessing.Pool(processes=n_procs) if n_procs > 1 and not sem.ON_WINDOWS and not supervised else None)
+    try:
+        pending = journal.pending(entries, max_attempts)
+        while pending:
+            files = [paths[entry] for entry in pending]
+            if supervised:
+                workers = sem.workers.WorkerPool(do_process_file, n_procs, cost=partial(file_cost, n_fields=n_fields), **limits)
+                results = supervised_results(workers, files)
+            elif pool is not None:
+                results = pool.imap(do_process_file, files)
+            else:
+                results = (do_process_file(path) for path in files)
+            entry_of = dict([(path, entry) for entry, path in zip(pending, files)])
+            for path, out_path, error in results:
+                entry = entry_of[path]
+                if error is None:
+                    journal.record_done(entry, out_path)
+                else:
+                    journal.record_failure(entry, error)
+                    sem_tagger_logger.warn("%s failed (attempt %i of %i): %s", path, journal.attempts(entry), max_attempts, error)
+            if supervised:
+                log_telemetry(workers, telemetry)
+            pending = journal.pending(pending, max_attempts)
+    finally:
+        if pool is not None:
+            pool.terminate()
+        journal.close()
+    
+    failed = [entry for entry in entries if not journal.is_done(entry)]
+    if failed:
+        sem_tagger_logger.error("%i file(s) failed %i times and were not processed, see %s", len(failed), max_attempts, journal.filename)
+    return journal
+    
+def supervised_results(pool, paths):
+    for index, result, error in pool.imap_unordered(paths):
+        if error is None:
+            yield result
+        else:
+            yield paths[index], None, u"{0}: {1}".format(*error)
+
+def run_spool(directory, lease_timeout, poll_interval, exit_when_empty, file_format, opts, **kwargs):
+    """
+    Work on the files of a spool directory (see sem.spool) until it is
+    empty (if exit_when_empty) or forever. Any number of workers may work
+    on the same spool directory, on any host. Returns the number of files
+    processed by this worker.
+    """
+    spool = sem.spool.Spool(directory, lease_timeout=lease_timeout)
+    sem_tagger_logger.info("worker %s working on spool %s", spool.worker, spool.directory)
+    nth = 0
+    try:
+        while True:
+            spool.requeue_expired()
+            lease = spool.claim()
+            if lease is None:
+                if exit_when_empty and not spool.leases():
+                    break
+                time.sleep(poll_interval)
+                continue
+            
+            output_directory = spool.output_directory()
+            with lease:
+                path, out_path, error = process_file(lease.path, file_format, opts, output_directory=output_directory, **kwargs)
+            if error is None:
+                if spool.complete(lease, output_directory):
+                    nth += 1
+                    sem_tagger_logger.info("%s processed", lease.name)
+            else:
+                sem_tagger_logger.warn("%s failed: %s", lease.name, error)
+                spool.fail(lease, error, output_directory)
+    finally:
+        spool.close()
+    return nth
+
+def annotate_item(item, cache=None):
+    """
+    Annotate an (index, (document, cached)) item of the staged executor.
+    """
+    index, (document, cached) = item
+    if not cached:
+        annotate(document, cache=cache)
+    return index, document
+
+def run_staged(names, file_format, opts, n_procs, io_threads, queue_size, limits, quarantine_report, exporter, output_directory, couples, encoding, lang_style, cache=None, n_fields=1, telemetry=None):
+    """
+    Read, process and export documents in three overlapping stages (see
+    sem.stages): reader threads read the documents (or restore them from
+    the cache), the pipeline processes them in the current process or in a
+    pool of processes, writer threads export them. Returns the processed
+    documents.
+    """
+    paths = []
+    for name in names:
+        for path in (glob.glob(name) or [name]):
+            if path not in paths:
+                paths.append(path)
+    documents = [None] * len(paths)
+    
+    def read(path):
+        document = sem.misc.documents_from_list([path], file_format, **opts)[0]
+        return document, (cache is not None and cache.restore(document))
     
+    def write(index, document):
+        documents[index] = document
+        if exporter is not None:
+            export(document, exporter, output_directory, couples, encoding, lang_style, style=False)
+    
+    if exporter is not None:
+        copy_style(exporter, output_directory, lang_style)
+    
+    do_annotate = partial(annotate_item, cache=cache)
+    executor = sem.stages.StagedExecutor(read, write, readers=io_threads, writers=io_threads, queue_size=queue_size)
+    if (limits or telemetry) and not sem.ON_WINDOWS:
+        pool = sem.workers.WorkerPool(do_annotate, n_procs, cost=partial(_item_cost, n_fields=n_fields), **limits)
+        quarantine = []
+        def process_map(values):
+            indices = [] # the worker pool only knows the position of values
+            def feed():
+                for value in values:
+                    indices.append(value[0])
+                    yield value
+            for position, result, error in pool.imap_unordered(feed()):
+                if error is None:
+                    yield result
+                else:
+                    path = paths[indices[position]]
+                    sem_tagger_logger.error("%s quarantined (%s): %s", path, error[0], error[1])
+                    quarantine.append({u"name": path, u"reason": error[0], u"message": error[1]})
+        executor.run(paths, process_map)
+        log_telemetry(pool, telemetry)
+        if quarantine:
+            sem.workers.write_quarantine(quarantine_report, quarantine)
+            sem_tagger_logger.error("%i document(s) quarantined, see %s", len(quarantine), quarantine_report)
+    elif n_procs > 1 and not sem.ON_WINDOWS:
+        pool = multiprocessing.Pool(processes=n_procs)
+        try:
+            executor.run(paths, sem.stages.pool_map(pool, do_annotate, queue_size))
+        finally:
+            pool.terminate()
+    else:
+        executor.run(paths, lambda values: (do_annotate(value) for value in values))
+    
+    return [document for document in documents if document is not None]
+
+BYTES_PER_VALUE = 96 # the estimated memory of a token field value (a short unicode string and its reference)
+
+def pipeline_fields(pipeline):
+    """
+    Return the estimated number of fields of tokens going through pipeline:
+    the word and every field written by a pipe.
+    """
+    fields = set([u"word"])
+    for pipe in pipeline.pipes:
+        fields.update(pipe.writes() or [])
+    return len(fields)
+
+def estimate_cost(document, n_fields=1):
+    """
+    Return the estimated memory needed to process document in bytes: its
+    content and a value for each field of each token.
+    """
+    return len(document.content or u"") * 2 + sem.modules.pipeline.document_size(document) * max(n_fields, 1) * BYTES_PER_VALUE
+
+def file_cost(path, n_fields=1):
+    """
+    Return the estimated memory needed to process the document of a file,
+    assuming about one token every six characters.
+    """
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return 0
+    return size * 2 + (size // 6) * max(n_fields, 1) * BYTES_PER_VALUE
+
+def _item_cost(item, n_fields=1):
+    index, (document, cached) = item
+    return (0 if cached else estimate_cost(document, n_fields))
+
+def log_telemetry(pool, filename=None):
+    """
+    Log the estimated memory of the documents of a worker pool against the
+    memory workers actually used and write the record of each document in
+    filename (one JSON object per line) if given.
+    """
+    telemetry = pool.telemetry()
+    if telemetry[u"items"] == 0:
+        return
+    sem_tagger_logger.info(
+        "peak estimated memory: %.1f MB, peak resident memory of workers: %.1f MB (%.1f MB per worker before processing)",
+        telemetry[u"peak_estimate"] / 2.0**20, telemetry[u"peak_rss"] / 2.0**20, (telemetry[u"baseline_rss"] or 0) / 2.0**20
+    )
+    if filename is not None:
+        sem.workers.write_records(filename, pool.records + [dict(telemetry, summary=True)])
+
+def worker_limits(args):
+    """
+    The arguments of sem.workers.WorkerPool given on the command line, an
+    empty dict if documents do not have to be processed in supervised
+    workers. The cost function of items is not included, it depends on
+    what items are.
+    """
+    limits = {}
+    if getattr(args, "timeout", None):
+        limits["timeout"] = args.timeout
+    if getattr(args, "max_memory", None):
+        limits["max_memory"] = int(args.max_memory * 2**20)
+    if getattr(args, "max_tasks", None):
+        limits["max_tasks"] = args.max_tasks
+    if getattr(args, "recycle_memory", None):
+        limits["recycle_memory"] = int(args.recycle_memory * 2**20)
+    if getattr(args, "memory_budget", None):
+        limits["budget"] = int(args.memory_budget * 2**20)
+    if limits and sem.ON_WINDOWS:
+        sem_tagger_logger.warn("worker limits are not handled on Windows, they are ignored.")
+    return limits
+
 def get_option(cfg, section, option, default=None):
     try:
         return cfg.get(section, option)
@@ -107,7 +395,68 @@ def get_section(cfg, section):
     except configparser.NoSectionError:
         return {}
 
-def load_master(master, force_format="default", pipeline_mode="all"):
+def build_pipes(xmlpipes, master, options, pipeline_mode="all", classes=None):
+    """
+    Build the pipes described in the pipeline of a master file. A
+    "parallel" element holds "branch" elements, each of them being a
+    sequence of pipes that does not depend on the others.
+    """
+    classes = (classes if classes is not None else {})
+    pipes = []
+    for xmlpipe in xmlpipes:
+        if xmlpipe.tag == "export": continue
+        
+        if xmlpipe.tag == "parallel":
+            branches = []
+            names = []
+            for i, xmlbranch in enumerate(xmlpipe):
+                if xmlbranch.tag != "branch":
+                    raise ValueError('"parallel" should only contain "branch" elements, found "{0}"'.format(xmlbranch.tag))
+                names.append(xmlbranch.attrib.get("name", u"branch{0}".format(i)))
+                branches.append(sem.modules.pipeline.Pipeline(build_pipes(list(xmlbranch), master, options, pipeline_mode, classes), pipeline_mode=pipeline_mode))
+            sem_tagger_logger.info("loading parallel branches: {0}".format(u", ".join(names)))
+            pipes.append(sem.modules.pipeline.Parallel(branches, names=names, executor=xmlpipe.attrib.get("executor", "thread"), workers=xmlpipe.attrib.get("workers"), log_level=get_option(options, "log", "log_level", "WARNING"), log_file=get_option(options, "log", "log_file"), pipeline_mode=pipeline_mode))
+            continue
+        
+        Class = classes.get(xmlpipe.tag, None)
+        if Class is None:
+            Class = get_module(xmlpipe.tag)
+            classes[xmlpipe.tag] = Class
+        arguments = {}
+        arguments["expected_mode"] = pipeline_mode
+        for key, value in xmlpipe.attrib.items():
+            if value.startswith(u"~/"):
+                value = os.path.expanduser(value)
+            elif sem.misc.is_relative_path(value):
+                value = os.path.abspath(os.path.join(os.path.dirname(master), value))
+            arguments[key.replace(u"-", u"_")] = value
+        for section in options.sections():
+            if section == "export": continue
+            for key, value in options.items(section):
+                if key not in arguments:
+                    arguments[key] = value
+                else:
+                    sem_tagger_logger.warn('Not adding already existing option: {0}'.format(key))
+        sem_tagger_logger.info("loading {0}".format(xmlpipe.tag))
+        pipes.append(Class(**arguments))
+    return pipes
+
+def load_master(master, force_format="default", pipeline_mode="all", optimise=False):
+    if os.path.isfile(master) and sem.snapshot.is_snapshot(master):
+        try:
+            pipeline, options, exporter, couples = sem.snapshot.load_snapshot(master, force_format, pipeline_mode)
+        except sem.snapshot.SnapshotError as exc:
+            snapshot = master
+            master = sem.snapshot.read_header(snapshot)[u"master"]
+            sem_tagger_logger.warn(u"%s, loading %s instead. Run compile_pipeline again to update it.", exc, master)
+        else:
+            if get_option(options, "log", "log_file") is not None:
+                sem_tagger_logger.addHandler(file_handler(get_option(options, "log", "log_file")))
+            sem_tagger_logger.setLevel(get_option(options, "log", "log_level", "WARNING"))
+            if optimise:
+                pipeline = optimise_pipeline(pipeline)
+            return pipeline, options, exporter, couples
+    
     try:
         tree = ET.parse(os.path.abspath(master))
         root = tree.getroot()
@@ -142,36 +491,19 @@ def load_master(master, force_format="default", pipeline_mode="all"):
         sem_tagger_logger.addHandler(file_handler(get_option(options, "log", "log_file")))
     sem_tagger_logger.setLevel(get_option(options, "log", "log_level", "WARNING"))
     
-    classes = {}
-    pipes = []
-    for xmlpipe in xmlpipes:
-        if xmlpipe.tag == "export": continue
-        
-        Class = classes.get(xmlpipe.tag, None)
-        if Class is None:
-            Class = get_module(xmlpipe.tag)
-            classes[xmlpipe.tag] = Class
-        arguments = {}
-        arguments["expected_mode"] = pipeline_mode
-        for key, value in xmlpipe.attrib.items():
-            if value.startswith(u"~/"):
-                value = os.path.expanduser(value)
-            elif sem.misc.is_relative_path(value):
-                value = os.path.abspath(os.path.join(os.path.dirname(master), value))
-            arguments[key.replace(u"-", u"_")] = value
-        for section in options.sections():
-            if section == "export": continue
-            for key, value in options.items(section):
-                if key not in arguments:
-                    arguments[key] = value
-                else:
-                    sem_tagger_logger.warn('Not adding already existing option: {0}'.format(key))
-        sem_tagger_logger.info("loading {0}".format(xmlpipe.tag))
-        pipes.append(Class(**arguments))
+    pipes = build_pipes(xmlpipes, master, options, pipeline_mode)
     pipeline = sem.modules.pipeline.Pipeline(pipes, pipeline_mode=pipeline_mode)
+    if optimise:
+        pipeline = optimise_pipeline(pipeline)
     
     return pipeline, options, exporter, couples
 
+def optimise_pipeline(pipeline):
+    import sem.planner
+    pipeline, notes = sem.planner.plan(pipeline)
+    sem_tagger_logger.info(u"planner: %i optimisations", len(notes))
+    return pipeline
+
 def main(args):
     """
     Return a document after it passed through a pipeline.
@@ -191,6 +523,11 @@ def main(args):
         to cpu_count, and n_procs otherwise.
         If n_procs is greater than the number of documents, it will be
         adjusted.
+    cache_directory : str
+        the directory where processed documents are cached. Documents found
+        in cache are not processed again.
+    cache_size : float
+        the maximum size of the cache in megabytes.
     """
     
     start = time.time()
@@ -205,6 +542,10 @@ def main(args):
         force_format = args.force_format
     except AttributeError:
         force_format = "default"
+    try:
+        optimise = args.optimise
+    except AttributeError:
+        optimise = False
     
     try:
         pipeline = args.pipeline
@@ -212,7 +553,7 @@ def main(args):
         exporter = args.exporter
         couples = args.couples
     except AttributeError:
-        pipeline, options, exporter, couples = load_master(args.master, force_format)
+        pipeline, options, exporter, couples = load_master(args.master, force_format, optimise=optimise)
     __pipeline = pipeline
     
     if get_option(options, "log", "log_file") is not None:
@@ -236,16 +577,27 @@ def main(args):
         opts["taggings"] = [tagging for tagging in opts.get("taggings", u"").split(u",") if tagging]
         opts["chunkings"] = [chunking for chunking in opts.get("chunkings", u"").split(u",") if chunking]
     
-    documents = sem.misc.documents_from_list(args.infiles, file_format, **opts)
+    manifest = getattr(args, "manifest", None)
+    spool = getattr(args, "spool", None)
+    if manifest is None and spool is None and not args.infiles:
+        raise ValueError("no input files given: give input files, a manifest or a spool directory.")
+    io_threads = getattr(args, "io_threads", 0)
+    staged = io_threads > 0 and manifest is None and spool is None
+    documents = (sem.misc.documents_from_list(args.infiles or [], file_format, **opts) if not staged else [])
     
-    n_procs = getattr(args, "n_procs", 1)
-    if n_procs == 0:
-        n_procs = multiprocessing.cpu_count()
-        sem_tagger_logger.info("no processors given, using %s", n_procs)
-    else:
-        n_procs = min(max(n_procs, 1), multiprocessing.cpu_count())
-    if n_procs > len(documents):
-        n_procs = len(documents)
+    cache = None
+    cache_directory = getattr(args, "cache_directory", None)
+    if cache_directory is not None:
+        master = getattr(args, "master", None)
+        if master is not None and sem.snapshot.is_snapshot(master):
+            master = sem.snapshot.read_header(master)[u"master"]
+        if master is None or not os.path.isfile(master):
+            sem_tagger_logger.warn("cache requires a master file, documents will not be cached.")
+        else:
+            cache_size = getattr(args, "cache_size", None)
+            max_size = (int(cache_size * 1024 * 1024) if cache_size is not None else None)
+            cache = sem.cache.DocumentCache(cache_directory, sem.cache.pipeline_fingerprint(master, force_format), max_size=max_size)
+            sem_tagger_logger.info("using cache %s for pipeline %s", cache.directory, cache.fingerprint)
     
     do_process = partial(
         process,
@@ -253,21 +605,139 @@ def main(args):
         output_directory=output_directory,
         couples=couples,
         encoding=oenc,
-        lang_style=get_option(options, "export", "lang_style", "default.css")
+        lang_style=get_option(options, "export", "lang_style", "default.css"),
+        cache=cache
     )
+    
+    n_procs = getattr(args, "n_procs", 1)
+    if n_procs == 0:
+        n_procs = multiprocessing.cpu_count()
+        sem_tagger_logger.info("no processors given, using %s", n_procs)
+    else:
+        n_procs = min(max(n_procs, 1), multiprocessing.cpu_count())
+    
+    if manifest is not None:
+        shard = getattr(args, "shard", None)
+        journal = run_manifest(
+            manifest,
+            getattr(args, "journal", None),
+            (sem.batch.parse_shard(shard) if shard is not None else None),
+            getattr(args, "max_attempts", 3),
+            n_procs,
+            file_format,
+            opts,
+            limits=worker_limits(args),
+            n_fields=pipeline_fields(pipeline),
+            telemetry=getattr(args, "telemetry", None),
+            exporter=exporter,
+            output_directory=output_directory,
+            couples=couples,
+            encoding=oenc,
+            lang_style=get_option(options, "export", "lang_style", "default.css"),
+            cache=cache
+        )
+        laps = time.time() - start
+        sem_tagger_logger.info('done in %s', timedelta(seconds=laps))
+        return journal
+    
+    if spool is not None:
+        nth = run_spool(
+            spool,
+            getattr(args, "lease_timeout", 300.0),
+            getattr(args, "poll_interval", 1.0),
+            getattr(args, "exit_when_empty", False),
+            file_format,
+            opts,
+            exporter=exporter,
+            couples=couples,
+            encoding=oenc,
+            lang_style=get_option(options, "export", "lang_style", "default.css"),
+            cache=cache
+        )
+        laps = time.time() - start
+        sem_tagger_logger.info('%i file(s) processed in %s', nth, timedelta(seconds=laps))
+        return nth
+    
+    if staged:
+        documents = run_staged(
+            args.infiles,
+            file_format,
+            opts,
+            n_procs,
+            io_threads,
+            getattr(args, "queue_size", 16),
+            worker_limits(args),
+            getattr(args, "quarantine", None) or os.path.join(output_directory, u"quarantine.jsonl"),
+            exporter,
+            output_directory,
+            couples,
+            oenc,
+            get_option(options, "export", "lang_style", "default.css"),
+            cache=cache,
+            n_fields=pipeline_fields(pipeline),
+            telemetry=getattr(args, "telemetry", None)
+        )
+        if cache is not None:
+            cache.evict()
+        laps = time.time() - start
+        sem_tagger_logger.info('done in %s', timedelta(seconds=laps))
+        return documents
+    
+    to_process = list(range(len(documents)))
+    if cache is not None:
+        to_process = []
+        for i, document in enumerate(documents):
+            if cache.restore(document):
+                do_process(document, cached=True)
+            else:
+                to_process.append(i)
+        sem_tagger_logger.info("%i document(s) found in cache, %i to process", len(documents) - len(to_process), len(to_process))
+    
+    if n_procs > len(to_process):
+        n_procs = max(len(to_process), 1)
+    
+    limits = worker_limits(args)
+    telemetry = getattr(args, "telemetry", None)
+    quarantined = set()
     if sem.ON_WINDOWS:
-        for document in documents:
-            do_process(document)
+        for i in to_process:
+            do_process(documents[i])
+    elif limits or telemetry:
+        pool = sem.workers.WorkerPool(do_process, n_procs, cost=partial(estimate_cost, n_fields=pipeline_fields(pipeline)), **limits)
+        quarantine = []
+        for index, document, error in pool.imap_unordered([documents[i] for i in to_process]):
+            i = to_process[index]
+            if error is None:
+                documents[i] = document
+            else:
+                sem_tagger_logger.error("%s quarantined (%s): %s", documents[i].name, error[0], error[1])
+                quarantine.append({u"name": documents[i].name, u"reason": error[0], u"message": error[1]})
+                quarantined.add(i)
+        if pool.recycled:
+            sem_tagger_logger.info("%i worker(s) replaced", pool.recycled)
+        log_telemetry(pool, telemetry)
+        if quarantine:
+            report = getattr(args, "quarantine", None) or os.path.join(output_directory, u"quarantine.jsonl")
+            sem.workers.write_quarantine(report, quarantine)
+            sem_tagger_logger.error("%i document(s) quarantined, see %s", len(quarantine), report)
     else:
         pool = multiprocessing.Pool(processes=n_procs)
-        dpp = (1 if n_procs < len(documents)*2 else 2) # documents per processor
+        dpp = (1 if n_procs < len(to_process)*2 else 2) # documents per processor
         beg = 0
         batch_size = dpp * n_procs
-        while beg <= len(documents):
-            documents[beg : beg + batch_size] = pool.map(do_process, documents[beg : beg + batch_size])
+        while beg <= len(to_process):
+            indices = to_process[beg : beg + batch_size]
+            for i, document in zip(indices, pool.map(do_process, [documents[i] for i in indices])):
+                documents[i] = document
             beg += batch_size
         pool.terminate()
     
+    if cache is not None:
+        cache.update_stats(hits=len(documents) - len(to_process), misses=len(to_process), stores=len(to_process) - len(quarantined))
+        cache.evict()
+    
+    documents = [document for i, document in enumerate(documents) if i not in quarantined]
+    
     laps = time.time() - start
     sem_tagger_logger.info('done in %s', timedelta(seconds=laps))
     
@@ -281,12 +751,52 @@ _subparsers = sem.argument_subparsers
 parser = _subparsers.add_parser(os.path.splitext(os.path.basename(__file__))[0], description="Performs various operations given in a master configuration file that defines a pipeline.")
 
 parser.add_argument("master",
-                    help="The master configuration file. Defines at least the pipeline and may provide some options.")
-parser.add_argument("infiles", nargs="+",
+                    help="The master configuration file. Defines at least the pipeline and may provide some options. May also be a pipeline snapshot (see compile_pipeline).")
+parser.add_argument("infiles", nargs="*",
                     help="The input file(s) for the tagger.")
 parser.add_argument("-o", "--output-directory", dest="output_directory", default=".",
                     help='The output directory (default: "%(default)s").')
 parser.add_argument("-f", "--force-format", dest="force_format", default="default",
                     help='Force the output format given in "master", default otherwise (default: "%(default)s").')
+parser.add_argument("-O", "--optimise", action="store_true",
+                    help="Analyse the pipeline before running it and skip the work whose result is not used: features computed twice, unused features, redundant cleans.")
 parser.add_argument("-p", "--processors", dest="n_procs", type=int, default=1,
                     help='The number of processors to use (default: "%(default)s").')
+parser.add_argument("-c", "--cache", dest="cache_directory",
+                    help="The directory where processed documents are cached. Documents already in cache are not processed again.")
+parser.add_argument("--cache-size", dest="cache_size", type=float,
+                    help="The maximum size of the cache in megabytes, least recently used documents are removed first (default: no limit).")
+parser.add_argument("-m", "--manifest", dest="manifest",
+                    help="A file listing the input files, one per line. Completed files are written in a journal, files already completed in the journal are not processed again.")
+parser.add_argument("--journal", dest="journal",
+                    help='The journal of the manifest (default: the manifest name followed by ".journal", or ".i-of-N.journal" for a shard).')
+parser.add_argument("--shard", dest="shard",
+                    help='Only process the files of shard i of N ("i/N", 0 <= i < N). Files are assigned to shards by the hash of their manifest entry (the line as written in the manifest), so that several processes can share a manifest and a file keeps its shard whatever the mount point.')
+parser.add_argument("--max-attempts", dest="max_attempts", type=int, default=3,
+                    help="The number of times a file of the manifest is tried before giving up on it, across runs (default: %(default)s).")
+parser.add_argument("--io-threads", dest="io_threads", type=int, default=0,
+                    help="Read and export documents in this number of reader and writer threads while they are processed, so that reading and writing overlap with processing (default: %(default)s, documents are read before and exported after being processed).")
+parser.add_argument("--queue-size", dest="queue_size", type=int, default=16,
+                    help="With --io-threads, the maximum number of documents waiting to be processed or exported (default: %(default)s).")
+parser.add_argument("--timeout", dest="timeout", type=float,
+                    help="The maximum number of seconds to process a document. Documents that take longer are quarantined and their worker is replaced (default: no limit).")
+parser.add_argument("--max-memory", dest="max_memory", type=float,
+                    help="The maximum resident memory (in MB) of a worker processing a document. Documents that take more are quarantined and their worker is replaced (default: no limit, Linux only).")
+parser.add_argument("--max-tasks", dest="max_tasks", type=int,
+                    help="The number of documents after which a worker is replaced by a new one (default: never).")
+parser.add_argument("--recycle-memory", dest="recycle_memory", type=float,
+                    help="The resident memory (in MB) above which a worker is replaced after its current document (default: never, Linux only).")
+parser.add_argument("--memory-budget", dest="memory_budget", type=float,
+                    help="The estimated memory (in MB) of the documents processed at once by workers. A document waits until enough documents are processed to fit in the budget, a document larger than the budget is processed alone (default: no limit).")
+parser.add_argument("--telemetry", dest="telemetry",
+                    help="Write the estimated memory and the actual resident memory of workers for each document in this file, one JSON object per line.")
+parser.add_argument("--quarantine", dest="quarantine",
+                    help='The report of quarantined documents, one JSON object per line (default: "quarantine.jsonl" in the output directory).')
+parser.add_argument("--spool", dest="spool",
+                    help="Work on the files dropped in the inbox of a spool directory and write outputs in its outbox. Several workers, on several hosts, may share a spool directory.")
+parser.add_argument("--lease-timeout", dest="lease_timeout", type=float, default=300.0,
+                    help="The number of seconds after which the files of a worker that stopped refreshing its leases (it crashed) are put back in the inbox. Should be larger than the clock difference between hosts (default: %(default)s).")
+parser.add_argument("--poll-interval", dest="poll_interval", type=float, default=1.0,
+                    help="The number of seconds to wait when the inbox is empty (default: %(default)s).")
+parser.add_argument("--exit-when-empty", dest="exit_when_empty", action="store_true",
+                    help="Stop when the spool has no more files to process instead of waiting for new ones.")
@@ -34,12 +34,13 @@ from datetime import timedelta
 
 from .sem_module import SEMModule as RootModule
 import sem.wapiti
-from sem import PY2
+import sem.cache
 
 from sem.storage.document     import Document
 from sem.storage.segmentation import Segmentation
 from sem.logger               import default_handler, file_handler
-from sem.misc                 import check_model_available
+from sem.misc                 import check_model_available, is_string
+from sem.CRF.model            import model_columns
 
 wapiti_label_logger = logging.getLogger("sem.wapiti_label")
 wapiti_label_logger.addHandler(default_handler)
@@ -60,7 +61,11 @@ class SEMModule(RootModule):
         
         self._model = model
         self._field = field
-        self._annotation_fields = annotation_fields
+        self._columns = None # the columns used by the templates of the model, read on first use
+        if is_string(annotation_fields):
+            self._annotation_fields = annotation_fields.split(u",") # comma-separated named fields
+        else:
+            self._annotation_fields = annotation_fields
         
         if wapiti_api:
             if self.pipeline_mode == "all" or expected_mode in ("all", self.pipeline_mode):
@@ -72,6 +77,26 @@ class SEMModule(RootModule):
         else:
             self._label_document = self._label_doc_as_cl
     
+    def __getstate__(self):
+        # python-wapiti models cannot be pickled, they are loaded again when unpickling.
+        state = self.__dict__.copy()
+        state["_wapiti_model"] = (state.get("_wapiti_model", True) is not None)
+        del state["_label_document"]
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__dict__.setdefault("_columns", None)
+        if wapiti_api:
+            if self._wapiti_model:
+                check_model_available(self._model, logger=wapiti_label_logger)
+                self._wapiti_model = WapitiModel(encoding="utf-8", model=self._model)
+            else:
+                self._wapiti_model = None
+            self._label_document = self._label_doc_as_wrapper
+        else:
+            self._label_document = self._label_doc_as_cl
+    
     @property
     def field(self):
         return self._field
@@ -80,6 +105,32 @@ class SEMModule(RootModule):
     def model(self):
         return self._model
     
+    @property
+    def annotation_fields(self):
+        return self._annotation_fields
+    
+    @property
+    def columns(self):
+        """
+        The columns used by the templates of the model, None if they cannot
+        be read. Other columns are not given to wapiti.
+        """
+        if self._columns is None:
+            self._columns = model_columns(self._model)
+        return self._columns
+    
+    def reads(self):
+        return self._annotation_fields
+    
+    def writes(self):
+        return [self._field]
+    
+    def resources(self):
+        return sem.cache.file_resources(self._model)
+    
+    def reload(self):
+        return SEMModule(self._model, self._field, annotation_fields=self._annotation_fields, log_level=self._log_level, log_file=self._log_file, pipeline_mode=self.pipeline_mode, expected_mode=getattr(self, "expected_mode", self.pipeline_mode))
+    
     def check_mode(self, expected_mode):
         if (not self._wapiti_model) and self.pipeline_mode == expected_mode:
             check_model_available(model, logger=wapiti_label_logger)
@@ -119,12 +170,40 @@ class SEMModule(RootModule):
         laps = time.time() - start
         wapiti_label_logger.info('in %s', timedelta(seconds=laps))
     
+    def process_documents(self, documents, encoding="utf-8", **kwargs):
+        """
+        Annotate documents with Wapiti. When using the command-line, all
+        documents are labeled with a single call to Wapiti.
+        """
+        if wapiti_api:
+            return super(SEMModule, self).process_documents(documents, encoding=encoding, **kwargs)
+        
+        start = time.time()
+        
+        if self._log_file is not None:
+            wapiti_label_logger.addHandler(file_handler(self._log_file))
+        wapiti_label_logger.setLevel(self._log_level)
+        
+        to_label = []
+        for document in documents:
+            if self._field in document.corpus.fields:
+                self.process_document(document, encoding=encoding, **kwargs)
+            else:
+                to_label.append(document)
+        
+        wapiti_label_logger.info("annotating %i documents with %s field", len(to_label), self._field)
+        sem.wapiti.label_documents(to_label, self._model, self._field, encoding, annotation_name=self._field, annotation_fields=self._annotation_fields, columns=self.columns)
+        
+        laps = time.time() - start
+        wapiti_label_logger.info('in %s', timedelta(seconds=laps))
+        return documents
+    
     def _label_doc_as_cl(self, document, encoding="utf-8"):
-        sem.wapiti.label_document(document, self._model, self._field, encoding, annotation_name=self._field, annotation_fields=self._annotation_fields)
+        sem.wapiti.label_document(document, self._model, self._field, encoding, annotation_name=self._field, annotation_fields=self._annotation_fields, columns=self.columns)
     
     def _label_doc_as_wrapper(self, document, encoding="utf-8"):
         if self._annotation_fields:
-            fields = [document.corpus.entry(field) for field in self._annotation_fields]
+            fields = self._annotation_fields
         else:
             fields = document.corpus.fields
         tags = []
@@ -135,10 +214,7 @@ class SEMModule(RootModule):
         document.add_annotation_from_tags(tags, self._field, self._field)
     
     def _tag_as_wrapper(self, sequence, fields, encoding="utf-8"):
-        if PY2:
-            seq_str = u"\n".join([u"\t".join([unicode(token[field]) for field in fields]) for token in sequence]).encode(encoding)
-        else:
-            seq_str = u"\n".join([u"\t".join([str(token[field]) for field in fields]) for token in sequence]).encode(encoding)
+        seq_str = sem.wapiti.sentence_unicode(sequence, fields, self.columns).rstrip(u"\n").encode(encoding)
         s = self._wapiti_model.label_sequence(seq_str).decode(encoding)
         return s.strip().split(u"\n")
 
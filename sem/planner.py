@@ -0,0 +1,267 @@
+#-*- coding: utf-8 -*-
+
+"""
+file: planner.py
+
+Description: a planner that analyses a pipeline before it is run and removes
+the work whose result is never used. It finds enrich features computed by an
+earlier enrich (the value is then kept in tokens instead of being computed
+again), features that are neither used by a later pipe nor by the templates
+of a wapiti model, adjacent clean pipes that can be folded and clean pipes
+that do not remove anything.
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import copy
+import logging
+import os.path
+
+from sem.logger import default_handler
+from sem.CRF.model import model_columns
+from sem.features.xml2feature import feature_references
+from sem.modules.pipeline import Pipeline
+from sem.modules.segmentation import SEMModule as SegmentationModule
+from sem.modules.enrich import SEMModule as EnrichModule
+from sem.modules.clean import SEMModule as CleanModule
+from sem.modules.wapiti_label import SEMModule as WapitiLabelModule
+from sem.modules.label_consistency import SEMModule as LabelConsistencyModule
+from sem.modules.export import SEMModule as ExportModule
+
+planner_logger = logging.getLogger("sem.planner")
+planner_logger.addHandler(default_handler)
+
+def fields_before(pipes):
+    """
+    Return the fields of documents before each pipe. The list stops at the
+    first pipe whose effect on fields is unknown, as well as before the
+    first pipe if it is not a segmentation. The fields after the last pipe
+    of the list are returned too.
+    """
+    before = []
+    fields = None
+    for pipe in pipes:
+        if isinstance(pipe, SegmentationModule):
+            after = [u"word"]
+        elif fields is None:
+            break
+        elif isinstance(pipe, EnrichModule):
+            after = fields + [feature.name for feature in pipe.features if feature.display]
+        elif isinstance(pipe, WapitiLabelModule):
+            after = fields + ([pipe.field] if pipe.field not in fields else [])
+        elif isinstance(pipe, CleanModule):
+            after = pipe.allowed[:]
+        elif isinstance(pipe, (LabelConsistencyModule, ExportModule)):
+            after = fields
+        else:
+            break
+        before.append(fields)
+        fields = after
+    return before, fields
+
+def _definitions(pipe):
+    """
+    Return the (key, references) of each feature of an enrich, None if the
+    enrich was not loaded from a file. Features defined the same way in
+    files of the same directory have the same key.
+    """
+    if not pipe.definitions:
+        return None
+    directory = os.path.dirname(os.path.abspath(pipe.source))
+    return [((directory, definition), feature_references(definition, directory)) for definition in pipe.definitions]
+
+def find_reused(pipes, before):
+    """
+    Find the features of an enrich already computed by an earlier enrich.
+    Returns the names reused by each enrich and the names each clean has to
+    keep in tokens, as dicts indexed by pipe position.
+    """
+    reused = {}
+    hidden = {}
+    available = {} # name: (key, fields read to compute it, cleans it went through)
+    for i, pipe in enumerate(pipes[:len(before)]):
+        writes = set(pipe.writes() or [])
+        if isinstance(pipe, EnrichModule):
+            definitions = _definitions(pipe)
+            names = set([feature.name for feature in pipe.features])
+            reads = set(pipe.reads())
+            for j, feature in enumerate(pipe.features):
+                if definitions is None or feature.name in (before[i] or []):
+                    continue
+                key, references = definitions[j]
+                if references is None or references & (names - set([feature.name])):
+                    continue
+                if feature.name in available and available[feature.name][0] == key:
+                    reused.setdefault(i, set()).add(feature.name)
+                    for clean in available[feature.name][2]:
+                        hidden.setdefault(clean, set()).add(feature.name)
+            writes |= names
+            for name in list(available.keys()):
+                if name in names and name not in reused.get(i, set()):
+                    del available[name]
+            if definitions is not None:
+                for feature, (key, references) in zip(pipe.features, definitions):
+                    if feature.name not in available and references is not None and not (references & (names - set([feature.name]))):
+                        available[feature.name] = (key, reads, [])
+        elif isinstance(pipe, CleanModule):
+            for name, (key, reads, cleans) in available.items():
+                if name not in pipe.allowed:
+                    cleans.append(i)
+        elif not isinstance(pipe, (SegmentationModule, WapitiLabelModule, LabelConsistencyModule, ExportModule)):
+            available.clear()
+        # a value cannot be reused if it, or what it was computed from, was written since.
+        for name, (key, reads, cleans) in list(available.items()):
+            if not isinstance(pipe, EnrichModule) and (name in writes or reads & writes):
+                del available[name]
+    return reused, hidden
+
+def plan(pipeline):
+    """
+    Return an optimised copy of pipeline along with the list of what was
+    changed. The pipes of pipeline are not modified, pipes that are changed
+    are shallow copies. Only the pipes whose effect on fields is known
+    (segmentation, enrich, clean, wapiti_label, label_consistency and export)
+    are analysed, the analysis stops at the first other pipe.
+    """
+    pipes = list(pipeline.pipes)
+    before, last_fields = fields_before(pipes)
+    n = len(before)
+    notes = []
+    
+    if n == 0:
+        return pipeline, notes
+    
+    reused, hidden = find_reused(pipes, before)
+    
+    # backward pass: what is used by a later pipe (or the output) is live.
+    live = set(last_fields or [])
+    removed = {}
+    annotation_fields = {}
+    for i in reversed(range(n)):
+        pipe = pipes[i]
+        fields = before[i] or []
+        if isinstance(pipe, WapitiLabelModule):
+            inputs = pipe.annotation_fields
+            if inputs is None:
+                columns = model_columns(pipe.model)
+                columns = (None if columns is None else max(columns | set([-1])) + 1)
+                if columns is not None and columns < len(fields):
+                    inputs = fields[:columns]
+                    annotation_fields[i] = inputs
+                else:
+                    inputs = fields
+            if pipe.field not in fields:
+                live.discard(pipe.field)
+            live |= set(inputs)
+        elif isinstance(pipe, CleanModule):
+            live = (live & set(pipe.allowed)) | pipe.hidden | hidden.get(i, set())
+        elif isinstance(pipe, EnrichModule):
+            definitions = _definitions(pipe)
+            pipe_reused = reused.get(i, set())
+            names = set([feature.name for feature in pipe.features])
+            needed = set()
+            for j in reversed(range(len(pipe.features))):
+                feature = pipe.features[j]
+                if definitions is None or feature.name in live or feature.name in needed:
+                    if feature.name not in pipe_reused:
+                        references = (definitions[j][1] if definitions is not None else set())
+                        needed |= (names if references is None else references)
+                else:
+                    removed.setdefault(i, set()).add(feature.name)
+            live = (live - names) | set(pipe.reads()) | (pipe_reused - removed.get(i, set()))
+        elif isinstance(pipe, LabelConsistencyModule):
+            live |= set(pipe.reads())
+        elif isinstance(pipe, SegmentationModule):
+            live = set()
+        else:
+            live |= set(fields)
+    
+    new_pipes = pipes[:]
+    for i, names in sorted(removed.items()):
+        pipe = copy.copy(pipes[i])
+        pipe._features = [feature for feature in pipe.features if feature.name not in names]
+        pipe._definitions = [definition for feature, definition in zip(pipes[i].features, pipes[i].definitions) if feature.name not in names]
+        pipe._lazy = {}
+        new_pipes[i] = pipe
+        notes.append(u"enrich {0}: not computing unused features {1}".format(pipe.source, u", ".join(sorted(names))))
+        # removed displayed features are not fields anymore, later cleans should not keep them.
+        for j in range(i+1, n):
+            if isinstance(new_pipes[j], CleanModule):
+                if not names & set(new_pipes[j].allowed):
+                    break
+                clean = copy.copy(new_pipes[j])
+                clean._allowed = [field for field in clean.allowed if field not in names]
+                new_pipes[j] = clean
+    for i, names in sorted(reused.items()):
+        pipe = (new_pipes[i] if new_pipes[i] is not pipes[i] else copy.copy(pipes[i]))
+        pipe._reused = set(pipe._reused) | names
+        pipe._lazy = {}
+        new_pipes[i] = pipe
+        notes.append(u"enrich {0}: reusing features {1} computed earlier".format(pipe.source, u", ".join(sorted(names))))
+    for i, names in sorted(hidden.items()):
+        clean = (new_pipes[i] if new_pipes[i] is not pipes[i] else copy.copy(pipes[i]))
+        clean._hidden = set(clean.hidden) | names
+        new_pipes[i] = clean
+        notes.append(u"clean {0}: keeping {1} in tokens for a later enrich".format(u",".join(clean.allowed), u", ".join(sorted(names))))
+    for i, inputs in sorted(annotation_fields.items()):
+        pipe = copy.copy(pipes[i])
+        pipe._annotation_fields = inputs
+        new_pipes[i] = pipe
+        notes.append(u"wapiti_label {0}: the model only uses fields {1}".format(pipe.model, u",".join(inputs)))
+    
+    # enrich pipes that do not compute anything anymore
+    for i in range(n):
+        pipe = new_pipes[i]
+        if isinstance(pipe, EnrichModule) and pipe is not pipes[i] and all([feature.name in pipe._reused for feature in pipe.features]):
+            if not any([feature.display for feature in pipe.features]):
+                new_pipes[i] = None
+                notes.append(u"enrich {0}: removed, nothing it computes is used".format(pipe.source))
+    new_pipes = [pipe for pipe in new_pipes if pipe is not None]
+    
+    # folding adjacent cleans and removing cleans that keep everything.
+    new_before, last_fields = fields_before(new_pipes)
+    folded = []
+    for i, pipe in enumerate(new_pipes):
+        fields = (new_before[i] if i < len(new_before) else None)
+        if isinstance(pipe, CleanModule) and folded and isinstance(folded[-1], CleanModule):
+            previous = folded[-1]
+            if set(pipe.allowed) <= set(previous.allowed) | previous.hidden:
+                clean = copy.copy(pipe)
+                clean._hidden = pipe.hidden & (set(previous.allowed) | previous.hidden)
+                folded[-1] = clean
+                notes.append(u"clean {0}: folded into clean {1}".format(u",".join(previous.allowed), u",".join(pipe.allowed)))
+                continue
+        if isinstance(pipe, CleanModule) and fields is not None and list(pipe.allowed) == list(fields):
+            notes.append(u"clean {0}: removed, it keeps every field".format(u",".join(pipe.allowed)))
+            continue
+        folded.append(pipe)
+    
+    if not notes:
+        return pipeline, notes
+    
+    for note in notes:
+        planner_logger.info(note)
+    planned = Pipeline(folded, log_level=pipeline._log_level, log_file=pipeline._log_file, pipeline_mode=pipeline.pipeline_mode)
+    return planned, notes
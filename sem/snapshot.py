@@ -0,0 +1,162 @@
+#-*- coding: utf-8 -*-
+
+"""
+file: snapshot.py
+
+Description: pipeline snapshots. A snapshot is a fully constructed pipeline
+(and its exporter) serialised on disk along with a header describing the
+resources it was built from, so that loading it can be refused once any
+of them changed.
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import logging
+import os
+import os.path
+import sys
+import tempfile
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+try:
+    import ConfigParser as configparser
+except ImportError:
+    import configparser
+
+import sem
+import sem.cache
+
+from sem.logger import default_handler
+
+snapshot_logger = logging.getLogger("sem.snapshot")
+snapshot_logger.addHandler(default_handler)
+
+SNAPSHOT_FORMAT = 1
+_magic = b"SEM-PIPELINE-SNAPSHOT\n"
+
+class SnapshotError(ValueError):
+    pass
+
+def is_snapshot(filename):
+    try:
+        with open(filename, "rb") as input_stream:
+            return input_stream.read(len(_magic)) == _magic
+    except (IOError, OSError):
+        return False
+
+def resource_entry(path):
+    mtime, size = sem.cache.path_signature(path)
+    return (path, mtime, size, sem.cache.path_digest(path))
+
+def write_snapshot(filename, master, pipeline, options, exporter, couples, force_format="default", pipeline_mode="all"):
+    """
+    Write a snapshot of a pipeline built from master. The header is written
+    in its own pickle so it can be checked before loading the pipeline.
+    """
+    master = os.path.abspath(master)
+    header = {
+        u"format": SNAPSHOT_FORMAT,
+        u"sem_version": sem.version(),
+        u"python_version": tuple(sys.version_info[:2]),
+        u"master": master,
+        u"force_format": force_format,
+        u"pipeline_mode": pipeline_mode,
+        u"resources": [resource_entry(path) for path in [master] + sem.cache.master_resources(master)],
+    }
+    sections = dict([(section, dict(options.items(section))) for section in options.sections()])
+
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_path = tempfile.mkstemp(suffix=u".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as output_stream:
+            output_stream.write(_magic)
+            pickle.dump(header, output_stream, pickle.HIGHEST_PROTOCOL)
+            pickle.dump((pipeline, sections, exporter, couples), output_stream, pickle.HIGHEST_PROTOCOL)
+        if sem.ON_WINDOWS and os.path.exists(filename):
+            os.remove(filename)
+        os.rename(tmp_path, filename)
+    except Exception:
+        sem.cache.remove_file(tmp_path)
+        raise
+    return header
+
+def read_header(filename):
+    with open(filename, "rb") as input_stream:
+        if input_stream.read(len(_magic)) != _magic:
+            raise SnapshotError("not a pipeline snapshot: {0}".format(filename))
+        return pickle.load(input_stream)
+
+def stale_reasons(header):
+    """
+    Return the reasons why a snapshot cannot be used, an empty list means
+    the snapshot is valid. Resources are compared by mtime and size first,
+    their hash is only computed when those differ.
+    """
+    reasons = []
+    if header.get(u"format") != SNAPSHOT_FORMAT:
+        reasons.append(u"snapshot format {0} (expected {1})".format(header.get(u"format"), SNAPSHOT_FORMAT))
+    if header.get(u"sem_version") != sem.version():
+        reasons.append(u"built with SEM {0}".format(header.get(u"sem_version")))
+    if tuple(header.get(u"python_version", ())) != tuple(sys.version_info[:2]):
+        reasons.append(u"built with python {0}".format(u".".join([str(v) for v in header.get(u"python_version", ())])))
+    for path, mtime, size, digest in header.get(u"resources", []):
+        if not os.path.exists(path):
+            reasons.append(u"{0} does not exist anymore".format(path))
+        elif sem.cache.path_signature(path) != (mtime, size) and sem.cache.path_digest(path) != digest:
+            reasons.append(u"{0} changed".format(path))
+    return reasons
+
+def load_snapshot(filename, force_format="default", pipeline_mode="all"):
+    """
+    Load a pipeline snapshot. Returns the same (pipeline, options, exporter,
+    couples) tuple as sem.modules.tagger.load_master. Raises SnapshotError
+    if the snapshot is stale or was built with other arguments.
+    """
+    header = read_header(filename)
+    reasons = stale_reasons(header)
+    if force_format not in (None, "default", header[u"force_format"]):
+        reasons.append(u"built with format {0}".format(header[u"force_format"]))
+    if pipeline_mode != header[u"pipeline_mode"]:
+        reasons.append(u"built in mode {0}".format(header[u"pipeline_mode"]))
+    if reasons:
+        raise SnapshotError(u"snapshot {0} cannot be used: {1}".format(filename, u", ".join(reasons)))
+
+    with open(filename, "rb") as input_stream:
+        input_stream.read(len(_magic))
+        pickle.load(input_stream)
+        pipeline, sections, exporter, couples = pickle.load(input_stream)
+
+    options = configparser.RawConfigParser()
+    for section, items in sections.items():
+        options.add_section(section)
+        for key, value in items.items():
+            options.set(section, key, value)
+
+    snapshot_logger.info(u"loaded pipeline snapshot %s", filename)
+    return pipeline, options, exporter, couples
@@ -0,0 +1,288 @@
+#-*- coding: utf-8 -*-
+
+"""
+file: spool.py
+
+Description: a work queue in a spool directory shared by several workers,
+possibly on different hosts (a shared NFS volume for instance). Producers
+drop files in the inbox, workers claim them by renaming them in their own
+lease directory (renames are atomic, only one worker gets a file), then
+publish their outputs in the outbox. Workers refresh the mtime of their
+leases while they work, leases that were not refreshed for too long (the
+worker crashed) are put back in the inbox by other workers.
+
+Layout of a spool directory:
+    inbox/           files waiting to be processed
+    leases/<worker>/ files being processed by a worker
+    outbox/          outputs of processed files
+    done/            processed files
+    failed/          files that could not be processed and their errors
+    tmp/             files being written, invisible to the other directories
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import codecs
+import logging
+import os
+import os.path
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+import sem
+
+from sem.logger import default_handler
+
+spool_logger = logging.getLogger("sem.spool")
+spool_logger.addHandler(default_handler)
+
+INBOX = u"inbox"
+LEASES = u"leases"
+OUTBOX = u"outbox"
+DONE = u"done"
+FAILED = u"failed"
+TMP = u"tmp"
+
+def worker_name():
+    return u"{0}-{1}".format(socket.gethostname(), os.getpid())
+
+def _replace(source, target):
+    if sem.ON_WINDOWS and os.path.exists(target):
+        os.remove(target)
+    os.rename(source, target)
+
+class Lease(object):
+    """
+    A file claimed by a worker. While the lease is held, a thread refreshes
+    the mtime of the file every interval seconds so that other workers know
+    the worker is alive. If the file disappears (the lease expired and the
+    file was put back in the inbox), the lease is lost.
+    """
+
+    def __init__(self, path, interval):
+        self._path = path
+        self._interval = interval
+        self._stop = threading.Event()
+        self._lost = False
+        self._thread = None
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def name(self):
+        return os.path.basename(self._path)
+
+    @property
+    def lost(self):
+        return self._lost or not os.path.exists(self._path)
+
+    def _refresh(self):
+        while not self._stop.wait(self._interval):
+            try:
+                os.utime(self._path, None)
+            except OSError:
+                self._lost = True
+                return
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._refresh)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
+
+class Spool(object):
+    """
+    A spool directory, see the description of the module.
+
+    Attributes
+    ----------
+    _directory : str
+        the root of the spool directory.
+    _worker : str
+        the name of the worker, unique across hosts.
+    _lease_timeout : float
+        the number of seconds after which a lease that was not refreshed is
+        considered expired.
+    """
+
+    def __init__(self, directory, worker=None, lease_timeout=300.0):
+        self._directory = os.path.abspath(os.path.expanduser(directory))
+        self._worker = worker or worker_name()
+        self._lease_timeout = lease_timeout
+
+        for name in (INBOX, LEASES, OUTBOX, DONE, FAILED, TMP):
+            self._makedirs(self.path(name))
+        self._makedirs(self.lease_directory)
+
+    @staticmethod
+    def _makedirs(path):
+        try:
+            os.makedirs(path)
+        except OSError: # already exists, possibly created by another worker
+            if not os.path.isdir(path):
+                raise
+
+    @property
+    def directory(self):
+        return self._directory
+
+    @property
+    def worker(self):
+        return self._worker
+
+    @property
+    def lease_timeout(self):
+        return self._lease_timeout
+
+    @property
+    def lease_directory(self):
+        return self.path(LEASES, self._worker)
+
+    def path(self, *names):
+        return os.path.join(self._directory, *names)
+
+    def pending(self):
+        """
+        The names of the files in the inbox. Hidden files are files being
+        written by a producer and are ignored.
+        """
+        return sorted([name for name in os.listdir(self.path(INBOX)) if not name.startswith(u".")])
+
+    def leases(self):
+        """
+        Return the (worker, name) of every file currently being processed.
+        """
+        leases = []
+        for worker in os.listdir(self.path(LEASES)):
+            try:
+                leases.extend([(worker, name) for name in os.listdir(self.path(LEASES, worker))])
+            except OSError:
+                pass
+        return leases
+
+    def submit(self, filename, name=None):
+        """
+        Copy a file in the inbox. The file is copied in tmp first, so that
+        workers never see partial files.
+        """
+        name = name or os.path.basename(filename)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path(TMP))
+        os.close(fd)
+        shutil.copyfile(filename, tmp_path)
+        _replace(tmp_path, self.path(INBOX, name))
+        return name
+
+    def claim(self):
+        """
+        Claim a file of the inbox, return its lease or None if the inbox is
+        empty. Other workers claiming the same file fail to rename it and
+        try the next one.
+        """
+        for name in self.pending():
+            lease_path = os.path.join(self.lease_directory, name)
+            try:
+                os.rename(self.path(INBOX, name), lease_path)
+            except OSError:
+                continue
+            os.utime(lease_path, None)
+            return Lease(lease_path, self._lease_timeout / 3.0)
+        return None
+
+    def requeue_expired(self, now=None):
+        """
+        Put back in the inbox the files whose lease expired. Returns their
+        names.
+        """
+        now = (now if now is not None else time.time())
+        requeued = []
+        for worker, name in self.leases():
+            path = self.path(LEASES, worker, name)
+            try:
+                if now - os.stat(path).st_mtime < self._lease_timeout:
+                    continue
+                os.rename(path, self.path(INBOX, name))
+            except OSError: # completed or requeued by someone else in the meantime
+                continue
+            spool_logger.warn(u"lease of %s by %s expired, %s is back in the inbox", name, worker, name)
+            requeued.append(name)
+        return requeued
+
+    def output_directory(self):
+        """
+        Return a new temporary directory to write the outputs of a file in,
+        see complete.
+        """
+        return tempfile.mkdtemp(dir=self.path(TMP), prefix=self._worker + u"-")
+
+    def complete(self, lease, output_directory):
+        """
+        Move the processed file in done and publish the files written in
+        output_directory in the outbox. If the lease was lost, nothing is
+        published (the file is processed again by another worker). Returns
+        whether the outputs were published.
+        """
+        try:
+            os.rename(lease.path, self.path(DONE, lease.name))
+            published = True
+        except OSError:
+            spool_logger.warn(u"lease of %s was lost, outputs are discarded", lease.name)
+            published = False
+        if published:
+            for name in os.listdir(output_directory):
+                _replace(os.path.join(output_directory, name), self.path(OUTBOX, name))
+        shutil.rmtree(output_directory, ignore_errors=True)
+        return published
+
+    def fail(self, lease, error, output_directory=None):
+        """
+        Move a file that could not be processed in failed, along with its
+        error.
+        """
+        if output_directory is not None:
+            shutil.rmtree(output_directory, ignore_errors=True)
+        try:
+            os.rename(lease.path, self.path(FAILED, lease.name))
+        except OSError:
+            return
+        with codecs.open(self.path(FAILED, lease.name + u".error"), "w", "utf-8") as output_stream:
+            output_stream.write(error + u"\n")
+
+    def close(self):
+        """
+        Remove the lease directory of the worker if it holds no lease.
+        """
+        try:
+            os.rmdir(self.lease_directory)
+        except OSError:
+            pass
@@ -0,0 +1,203 @@
+#-*- coding: utf-8 -*-
+
+"""
+file: stages.py
+
+Description: a three-stage executor. Items are read by a pool of reader
+threads, processed by a CPU stage (the calling thread or a pool of
+processes) and written by a pool of writer threads. Stages are connected
+by bounded queues, so that reading and writing (possibly on slow network
+storage) overlap with processing without holding every item in memory.
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import logging
+import threading
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from sem.logger import default_handler
+
+stages_logger = logging.getLogger("sem.stages")
+stages_logger.addHandler(default_handler)
+
+_end = object() # marks the end of a queue
+
+class StageError(Exception):
+    """
+    An error raised in a reader or a writer thread, it is raised again in
+    the calling thread.
+    """
+    def __init__(self, stage, item, exc):
+        super(StageError, self).__init__(u"{0} failed on {1}: {2}".format(stage, item, exc))
+        self.stage = stage
+        self.item = item
+        self.exc = exc
+
+class StagedExecutor(object):
+    """
+    Read, process and write items in three overlapping stages.
+
+    Attributes
+    ----------
+    _read : callable
+        the function called on each item by the reader threads.
+    _write : callable
+        the function called by the writer threads with the index of the item
+        and the result of process.
+    _readers : int
+        the number of reader threads.
+    _writers : int
+        the number of writer threads.
+    _queue_size : int
+        the maximum number of items waiting between two stages.
+    """
+
+    def __init__(self, read, write, readers=2, writers=2, queue_size=16):
+        self._read = read
+        self._write = write
+        self._readers = max(readers, 1)
+        self._writers = max(writers, 1)
+        self._queue_size = max(queue_size, 1)
+        self._errors = []
+        self._stop = threading.Event()
+
+    def _fail(self, stage, item, exc):
+        stages_logger.exception(exc)
+        self._errors.append(StageError(stage, item, exc))
+        self._stop.set()
+
+    def _put(self, target, value):
+        # gives up when another stage failed, so that threads never block forever.
+        while not self._stop.is_set():
+            try:
+                target.put(value, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _reader(self, items, lock, target):
+        while not self._stop.is_set():
+            with lock:
+                try:
+                    index, item = next(items)
+                except StopIteration:
+                    break
+            try:
+                value = self._read(item)
+            except Exception as exc:
+                self._fail(u"reader", item, exc)
+                break
+            if not self._put(target, (index, value)):
+                break
+        self._put(target, _end)
+
+    def _writer(self, source):
+        while True:
+            element = source.get()
+            if element is _end:
+                break
+            if self._stop.is_set():
+                continue
+            index, result = element
+            try:
+                self._write(index, result)
+            except Exception as exc:
+                self._fail(u"writer", index, exc)
+
+    def _read_values(self, source):
+        finished = 0
+        while finished < self._readers:
+            try:
+                element = source.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            if element is _end:
+                finished += 1
+            else:
+                yield element
+
+    def run(self, items, process_map):
+        """
+        Run the three stages on items. process_map takes an iterable of
+        (index, value) couples (the read items) and yields (index, result)
+        couples, it may process values in any order. Raises StageError if a
+        reader or a writer failed.
+        """
+        self._errors = []
+        self._stop.clear()
+        read_queue = queue.Queue(self._queue_size)
+        write_queue = queue.Queue(self._queue_size)
+        lock = threading.Lock()
+        items = iter(enumerate(items))
+        readers = [threading.Thread(target=self._reader, args=(items, lock, read_queue)) for _ in range(self._readers)]
+        writers = [threading.Thread(target=self._writer, args=(write_queue,)) for _ in range(self._writers)]
+        for thread in readers + writers:
+            thread.daemon = True
+            thread.start()
+
+        try:
+            for index, result in process_map(self._read_values(read_queue)):
+                if not self._put(write_queue, (index, result)):
+                    break
+        except Exception:
+            self._stop.set()
+            raise
+        finally:
+            for _ in writers:
+                write_queue.put(_end)
+            for thread in writers:
+                thread.join()
+            self._stop.set()
+            for thread in readers:
+                thread.join()
+
+        if self._errors:
+            raise self._errors[0]
+
+def pool_map(pool, function, size):
+    """
+    Return a process_map (see StagedExecutor.run) that applies function to
+    values in a multiprocessing pool, with at most size values in the pool
+    at once. function takes and returns (index, value) couples, it has to be
+    picklable.
+    """
+    def process_map(values):
+        slots = threading.Semaphore(size)
+        def feed():
+            for value in values:
+                slots.acquire()
+                yield value
+        for result in pool.imap_unordered(function, feed()):
+            slots.release()
+            yield result
+    return process_map
@@ -27,6 +27,7 @@ SOFTWARE.
 """
 
 from .annotation import Tag, Annotation
+from .automaton import Automaton
 from .coder import Coder
 from .corpus import Entry, Corpus
 from .dictionaries import NUL, compile_token, compile_multiword, compile_map
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+"""
+file: automaton.py
+
+Description: an Aho-Corasick automaton over the tokens of a Trie. Every
+entry of the trie that occurs in a sequence of tokens is found in a single
+pass over the sequence, instead of walking the trie again from every
+position of the sequence.
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from collections import deque
+
+from sem.constants import NUL
+
+_LEAF = {} # the transitions of every state without transitions, never modified
+
+def merge_data(datas):
+    """
+    Merge the data of several tries into the data of a single trie. The
+    value of an entry is the tuple of the indices (in datas) of the tries
+    the entry is in.
+    """
+    merged = {}
+    stack = [(merged, [(index, data) for index, data in enumerate(datas)])]
+    while stack:
+        target, sources = stack.pop()
+        children = {}
+        for index, node in sources:
+            for token, child in node.items():
+                if token == NUL:
+                    target[NUL] = target.get(NUL, ()) + (index,)
+                else:
+                    children.setdefault(token, []).append((index, child))
+        for token, child_sources in children.items():
+            target[token] = {}
+            stack.append((target[token], child_sources))
+    return merged
+
+class Automaton(object):
+    """
+    An Aho-Corasick automaton built from the data of a Trie. States are
+    integers, 0 is the initial state (the root of the trie), every other
+    state is a node of the trie. The empty entry is never matched.
+
+    Attributes
+    ----------
+    _goto : list of dict
+        the transitions of each state (token: state).
+    _fail : list of int
+        the state of the longest proper suffix of each state that is a prefix
+        of some entry.
+    _terminal : list of int
+        the state of the longest suffix of each state (itself included) that
+        is an entry, 0 if there is none.
+    _depth : list of int
+        the number of tokens of each state.
+    _value : list
+        the value of the entry of each state (what is stored under NUL in the
+        trie), None if the state is not an entry.
+    """
+
+    def __init__(self, data):
+        self._goto = [{}]
+        self._fail = [0]
+        self._terminal = [0]
+        self._depth = [0]
+        self._value = [None]
+
+        # breadth first, so that the fail state of a node is known before the node.
+        queue = deque([(0, data)])
+        while queue:
+            state, node = queue.popleft()
+            for token, child in node.items():
+                if token == NUL:
+                    continue
+                target = len(self._goto)
+                self._goto.append({} if len(child) > int(NUL in child) else _LEAF)
+                self._depth.append(self._depth[state] + 1)
+                self._value.append(child.get(NUL))
+                self._goto[state][token] = target
+                fail = 0
+                if state != 0:
+                    fail = self._fail[state]
+                    while fail and token not in self._goto[fail]:
+                        fail = self._fail[fail]
+                    fail = self._goto[fail].get(token, 0)
+                self._fail.append(fail)
+                self._terminal.append(target if NUL in child else self._terminal[fail])
+                queue.append((target, child))
+
+    def __len__(self):
+        return len(self._goto)
+
+    def entries(self):
+        """
+        Return the states that are entries.
+        """
+        return [state for state, value in enumerate(self._value) if value is not None]
+
+    def depth(self, state):
+        return self._depth[state]
+
+    def value(self, state):
+        return self._value[state]
+
+    def find_all(self, tokens):
+        """
+        Return the (start, end, state) of every entry found in tokens, by
+        increasing end. A token that is not in any entry (None for instance)
+        is never matched.
+        """
+        goto = self._goto
+        fail = self._fail
+        terminal = self._terminal
+        depth = self._depth
+        matches = []
+        state = 0
+        for end, token in enumerate(tokens, 1):
+            target = goto[state].get(token)
+            while target is None and state:
+                state = fail[state]
+                target = goto[state].get(token)
+            state = target or 0
+            match = terminal[state]
+            while match:
+                matches.append((end - depth[match], end, match))
+                match = terminal[fail[match]]
+        return matches
+
+    def longest(self, tokens):
+        """
+        Return the state of the longest entry starting at each position of
+        tokens where an entry starts, as a dict (position: state). A token
+        that is not in any entry (None for instance) is never matched.
+        """
+        goto = self._goto
+        fail = self._fail
+        terminal = self._terminal
+        depth = self._depth
+        longest = {}
+        state = 0
+        for end, token in enumerate(tokens, 1):
+            target = goto[state].get(token)
+            while target is None and state:
+                state = fail[state]
+                target = goto[state].get(token)
+            state = target or 0
+            match = terminal[state]
+            while match:
+                # ends are increasing: a later match starting at the same position is longer.
+                longest[end - depth[match]] = match
+                match = terminal[fail[match]]
+        return longest
+
+    def leftmost_longest(self, tokens, limit=None):
+        """
+        Return the (start, end, state) of the matches found by reading tokens
+        from left to right and taking the longest entry at each position,
+        the next match being searched after its end. Only matches that start
+        before limit are returned (default: every match).
+        """
+        longest = self.longest(tokens)
+        depth = self._depth
+        limit = (len(tokens) if limit is None else limit)
+        matches = []
+        end = 0
+        for start in sorted(longest):
+            if start >= limit:
+                break
+            if start >= end:
+                state = longest[start]
+                end = start + depth[state]
+                matches.append((start, end, state))
+        return matches
@@ -82,6 +82,59 @@ class Entry(object):
     def has_mode(self, mode):
         return self.mode == _equivalence[mode]
 
+class LazyColumns(object):
+    """
+    The columns of a sentence whose values are only computed when one of
+    them is accessed. columns is a dict of name: function, the function
+    takes the sentence and sets the values of the column in every token.
+    """
+    
+    def __init__(self, sentence, columns):
+        self.sentence = sentence
+        self.columns = columns
+    
+    def compute(self, name):
+        compute = self.columns.pop(name)
+        compute(self.sentence)
+    
+    def compute_all(self):
+        while self.columns:
+            self.compute(next(iter(self.columns)))
+
+class LazyToken(dict):
+    """
+    A token whose values for the columns of lazy (a LazyColumns) are
+    computed on first access. Values only appear in keys() and items() once
+    they are computed. Pickling and copying a token compute every column
+    and give a plain dict.
+    """
+    
+    __slots__ = ("lazy",)
+    
+    def __init__(self, *args, **kwargs):
+        super(LazyToken, self).__init__(*args, **kwargs)
+        self.lazy = None
+    
+    def __missing__(self, key):
+        if self.lazy is not None and key in self.lazy.columns:
+            self.lazy.compute(key)
+            return dict.__getitem__(self, key)
+        raise KeyError(key)
+    
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or (self.lazy is not None and key in self.lazy.columns)
+    
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+    
+    def __reduce__(self):
+        if self.lazy is not None:
+            self.lazy.compute_all()
+        return (dict, (dict(self),))
+
 class Corpus(object):
     def __init__(self, fields=None, sentences=None):
         if fields:
@@ -117,13 +170,18 @@ class Corpus(object):
         return corpus
     
     def unicode(self, fields, separator=u"\t"):
-        fmt       = u"\t".join([u"{{{0}}}".format(field) for field in fields])
-        sentences = []
-        for sentence in self:
-            sentences.append([])
+        return u"".join(self.iter_unicode(fields, separator))
+    
+    def iter_unicode(self, fields, separator=u"\t"):
+        """
+        Yield the unicode representation of the corpus sentence by sentence.
+        """
+        fmt = u"\t".join([u"{{{0}}}".format(i) for i in range(len(fields))])
+        for nth, sentence in enumerate(self):
+            lines = [u"\n"] if nth > 0 else []
             for token in sentence:
-                sentences[-1].append((fmt.format(**token)) + u"\n")
-        return u"\n".join([u"".join(sentence) for sentence in sentences])
+                lines.append((fmt.format(*[token[field] for field in fields])) + u"\n")
+            yield u"".join(lines)
     
     def to_matrix(self, sentence):
         sent = []
@@ -34,6 +34,8 @@ SOFTWARE.
 
 import codecs
 
+from sem.storage.automaton import Automaton
+
 from sem.constants import NUL
 
 class Trie(object):
@@ -45,10 +47,14 @@ class Trie(object):
     _data : dict
         the structure where all the entries of a multiword dictionary
         are loaded.
+    _automaton : Automaton
+        the Aho-Corasick automaton of _data, built when first needed and
+        dropped when the trie changes.
     """
     
     def __init__(self, filename=None, encoding=None):
         self._data = {}
+        self._automaton = None
         
         if filename:
             encoding = encoding or u"UTF-8"
@@ -85,11 +91,26 @@ class Trie(object):
             length += 1
         return length
     
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_automaton"] = None
+        return state
+    
     @property
     def data(self):
         return self._data
     
+    def automaton(self):
+        """
+        Return the Aho-Corasick automaton of the trie. It is only valid as
+        long as the trie is modified through add, add_with_value and remove.
+        """
+        if getattr(self, "_automaton", None) is None: # tries pickled before automata have none
+            self._automaton = Automaton(self._data)
+        return self._automaton
+    
     def add(self, sequence):
+        self._automaton = None
         iterator = sequence.__iter__()
         d        = self._data
         
@@ -107,6 +128,7 @@ class Trie(object):
         d[NUL] = {}
     
     def add_with_value(self, sequence, value):
+        self._automaton = None
         iterator = iter(sequence)
         d        = self._data
         
@@ -143,6 +165,7 @@ class Trie(object):
         return result and (NUL in d)
     
     def remove(self, sequence):
+        self._automaton = None
         def remove(dic, iterator):
             try:
                 elt = next(iterator)
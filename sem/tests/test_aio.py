@@ -0,0 +1,67 @@
+#-*- encoding: utf-8 -*-
+
+"""
+file: test_aio.py
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import unittest
+import sys
+
+from sem.storage import Document, Corpus
+from sem.modules.pipeline import Pipeline
+from sem.modules.enrich import SEMModule as EnrichModule, Entry
+from sem.features import DictGetterFeature, BOSFeature
+
+@unittest.skipIf(sys.version_info < (3, 5), "asyncio interface requires python 3.5+")
+class TestAio(unittest.TestCase):
+    def test_aprocess(self):
+        import asyncio
+        import sem.aio
+        
+        cwg = DictGetterFeature(entry="word", x=0)
+        pipeline = Pipeline([EnrichModule(bentries=[Entry(u"word")], features=[BOSFeature(name="BOS", entry="word", getter=cwg)])])
+        documents = []
+        for i in range(4):
+            document = Document(u"document{0}".format(i), u"Ceci est un test.")
+            document._corpus = Corpus([u"word"], sentences=[[{u"word":u"Ceci"}, {u"word":u"test"}]])
+            documents.append(document)
+        
+        sem.aio.configure(max_workers=2, max_concurrent=2)
+        try:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            results = loop.run_until_complete(asyncio.gather(*[pipeline.aprocess(document) for document in documents]))
+            loop.close()
+            asyncio.set_event_loop(None)
+        finally:
+            sem.aio.configure()
+        
+        self.assertEquals([document.corpus.fields for document in results], [[u"word", u"BOS"]] * 4)
+        self.assertEquals([token[u"BOS"] for token in results[0].corpus.sentences[0]], [1, 0])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
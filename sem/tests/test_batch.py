@@ -0,0 +1,103 @@
+#-*- encoding: utf-8 -*-
+
+"""
+file: test_batch.py
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import unittest
+import codecs
+import os.path
+import shutil
+import tempfile
+
+import sem.batch
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def test_manifest(self):
+        manifest = os.path.join(self.directory, u"manifest.txt")
+        with codecs.open(manifest, "w", "utf-8") as output_stream:
+            output_stream.write(u"# comment\na.txt\n\n/tmp/b.txt\n")
+        self.assertEquals(sem.batch.read_manifest(manifest), [os.path.join(self.directory, u"a.txt"), u"/tmp/b.txt"])
+    
+    def test_mount_points(self):
+        # the same manifest seen from two mount points: same entries, same shards, same journal.
+        entries = {}
+        for mount in (u"a", u"b"):
+            os.makedirs(os.path.join(self.directory, mount, u"data"))
+            manifest = os.path.join(self.directory, mount, u"manifest.txt")
+            with codecs.open(manifest, "w", "utf-8") as output_stream:
+                output_stream.write(u"\n".join([u"data/file{0}.txt".format(i) for i in range(20)] + [u"./data/../data/x.txt"]))
+            entries[mount] = sem.batch.manifest_entries(manifest)
+        self.assertEquals([entry for entry, path in entries[u"a"]], [entry for entry, path in entries[u"b"]])
+        self.assertEquals(entries[u"a"][-1], (u"data/x.txt", os.path.join(self.directory, u"a", u"data", u"x.txt")))
+        for i in range(3):
+            shard_a = sem.batch.select_shard(entries[u"a"], i, 3, key=lambda entry: entry[0])
+            shard_b = sem.batch.select_shard(entries[u"b"], i, 3, key=lambda entry: entry[0])
+            self.assertEquals([entry for entry, path in shard_a], [entry for entry, path in shard_b])
+        
+        filename = os.path.join(self.directory, u"journal")
+        with sem.batch.Journal(filename) as journal:
+            for entry, path in entries[u"a"]:
+                journal.record_done(entry)
+        self.assertEquals(sem.batch.Journal(filename).pending([entry for entry, path in entries[u"b"]]), [])
+    
+    def test_shard(self):
+        paths = [u"file{0}.txt".format(i) for i in range(100)]
+        shards = [sem.batch.select_shard(paths, i, 3) for i in range(3)]
+        self.assertEquals(sorted(sum(shards, [])), sorted(paths))
+        self.assertEquals(sem.batch.select_shard(list(reversed(paths)), 1, 3), list(reversed(shards[1])))
+        self.assertEquals(sem.batch.parse_shard(u"1/3"), (1, 3))
+        self.assertRaises(ValueError, sem.batch.parse_shard, u"3/3")
+    
+    def test_journal(self):
+        filename = os.path.join(self.directory, u"journal")
+        output = os.path.join(self.directory, u"a.out")
+        with open(output, "w") as output_stream:
+            output_stream.write("output")
+        with sem.batch.Journal(filename) as journal:
+            journal.record_failure(u"a.txt", u"error")
+            journal.record_done(u"a.txt", output)
+            journal.record_failure(u"b.txt", u"error")
+        with open(filename, "a") as output_stream:
+            output_stream.write('{"path": "c.txt", "sta') # killed while writing
+        
+        journal = sem.batch.Journal(filename)
+        self.assertEquals(journal.done[u"a.txt"][u"sha1"], sem.cache.path_digest(output))
+        self.assertEquals(journal.attempts(u"b.txt"), 1)
+        self.assertEquals(journal.pending([u"a.txt", u"b.txt", u"c.txt"], max_attempts=2), [u"b.txt", u"c.txt"])
+        journal.record_failure(u"b.txt", u"error")
+        journal.close()
+        self.assertEquals(sem.batch.Journal(filename).pending([u"a.txt", u"b.txt", u"c.txt"], max_attempts=2), [u"c.txt"])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,103 @@
+#-*- encoding: utf-8 -*-
+
+"""
+file: test_cache.py
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import unittest
+import os.path
+import shutil
+import tempfile
+
+from sem.storage import Document, Corpus, Segmentation, Annotation, Tag, Span
+
+import sem.cache
+
+def make_document():
+    document = Document("document", u"Ceci est un test.")
+    document._corpus = Corpus([u"word"], sentences=[[
+        {u"word":u"Ceci"},
+        {u"word":u"est"},
+        {u"word":u"un"},
+        {u"word":u"test"},
+        {u"word":u"."}
+    ]])
+    return document
+
+def process(document):
+    document.add_segmentation(Segmentation("tokens", spans=[Span(0,4), Span(5,8), Span(9,11), Span(12,16), Span(16,17)]))
+    document.add_segmentation(Segmentation("sentences", reference=document.segmentation("tokens"), spans=[Span(0,5)]))
+    document.add_annotation(Annotation("NER", reference=document.segmentation("tokens"), annotations=[Tag(u"Misc", 3, 4)]))
+    document.corpus.fields.append(u"NER")
+    for token, tag in zip(document.corpus.sentences[0], [u"O", u"O", u"O", u"B-Misc", u"O"]):
+        token[u"NER"] = tag
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def test_restore(self):
+        cache = sem.cache.DocumentCache(self.directory, u"pipeline")
+        document = make_document()
+        key = sem.cache.document_key(document)
+        
+        self.assertFalse(cache.restore(document))
+        process(document)
+        cache.store(document, key)
+        
+        restored = make_document()
+        self.assertTrue(cache.restore(restored))
+        self.assertEquals(restored.corpus.fields, [u"word", u"NER"])
+        self.assertEquals(restored.corpus.sentences, document.corpus.sentences)
+        self.assertEquals(restored.segmentation("sentences").reference, restored.segmentation("tokens"))
+        self.assertEquals(restored.annotation("NER").get_reference_annotations()[0].lb, 12)
+        
+        other = Document("other", u"Ceci est un autre test.")
+        self.assertFalse(cache.restore(other))
+    
+    def test_evict_invalidate(self):
+        cache = sem.cache.DocumentCache(self.directory, u"pipeline")
+        document = make_document()
+        key = sem.cache.document_key(document)
+        process(document)
+        cache.store(document, key)
+        cache.store(document, u"0" * 40)
+        
+        self.assertEquals(cache.report()[u"entries"], 2)
+        self.assertEquals(cache.evict(max_size=1), 2)
+        self.assertEquals(cache.report()[u"entries"], 0)
+        
+        cache.store(document, key)
+        self.assertEquals(sem.cache.invalidate(self.directory, u"other_pipeline"), 0)
+        self.assertEquals(sem.cache.invalidate(self.directory, u"pipeline"), 1)
+        self.assertFalse(os.path.exists(cache.pipeline_directory))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -29,7 +29,12 @@ SOFTWARE.
 """
 
 import unittest
-import codecs, os.path
+import codecs, json, os.path, re, shutil, tempfile
+
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
 
 from sem import SEM_DATA_DIR
 
@@ -38,6 +43,12 @@ from sem.features import BOSFeature, EOSFeature, LowerFeature, SubstringFeature,
 from sem.features import CheckFeature, SubsequenceFeature, TokenFeature
 from sem.features import SomeFeature, AllFeature, NoneFeature
 from sem.features import TokenDictionaryFeature, MultiwordDictionaryFeature, MapperFeature
+from sem.features import AndFeature, NotFeature, TriggeredFeature
+from sem.features.compiler import FeaturePlan
+from sem.features.profiler import FeatureProfiler
+from sem.features.xml2feature import XML2Feature
+from sem.features.directoryfeatures import DirectoryFeature
+from sem.storage import Entry
 
 class TestFeatures(unittest.TestCase):
     def test_basic_getters(self):
@@ -218,6 +229,186 @@ class TestFeatures(unittest.TestCase):
         self.assertEquals(mapper(data, 3), u"révolution")
         self.assertEquals(mapper(data, 4), u"O")
 
+    
+    def test_compiled_features(self):
+        data = [
+            {u"word":u"Ceci"},
+            {u"word":u"est"},
+            {u"word":u"un"},
+            {u"word":u"Test"},
+            {u"word":u"."}
+        ]
+        
+        cwg = DictGetterFeature(entry="word", x=0) # current word getter feature
+        previous_upper = AndFeature(NotFeature(BOSFeature()), CheckFeature(u"^[A-Z]", getter=DictGetterFeature(entry="word", shift=-1))) # fails on the first token without BOS
+        features = [
+            LowerFeature(getter=cwg),
+            previous_upper,
+            SomeFeature(IsUpperFeature(0, getter=cwg), CheckFeature(u"^\\.", getter=cwg)),
+            TriggeredFeature(CheckFeature(u"^[A-Z]", getter=cwg), LowerFeature(getter=cwg)),
+            MapperFeature(getter=cwg, path=None, entries=[u"un\tune"]),
+            SequencerFeature(LowerFeature(getter=cwg), SubstringFeature(to_index=2)),
+        ]
+        plan = FeaturePlan(features)
+        memo = {}
+        
+        for feature in features:
+            self.assertTrue(feature in plan)
+            self.assertEquals(plan.values(feature, data, memo), [feature(data, i) for i in range(len(data))])
+        self.assertEquals(len([key for key in memo if key[0] == u"entry"]), 1) # "word" is read once for every feature
+        self.assertEquals(len([key for key in memo if key[0] == u"LowerFeature"]), 1) # lower is shared
+    
+    def test_type_cache(self):
+        sentences = [
+            [{u"word":u"Ceci"}, {u"word":u"est"}, {u"word":u"un"}, {u"word":u"test"}],
+            [{u"word":u"un"}, {u"word":u"autre"}, {u"word":u"test"}],
+        ]
+        
+        cwg = DictGetterFeature(entry="word", x=0) # current word getter feature
+        feature = SubstitutionFeature(u"[aeiou]", u"V", getter=cwg)
+        plan = FeaturePlan([feature], cache_size=4)
+        
+        for sentence in sentences:
+            self.assertEquals(plan.values(feature, sentence), [feature(sentence, i) for i in range(len(sentence))])
+        info = plan.cache_info()
+        self.assertEquals((info[u"hits"], info[u"misses"]), (2, 5)) # "un" and "test" are computed once
+        self.assertTrue(info[u"size"] <= 4)
+    
+    def test_regex_set(self):
+        data = [
+            {u"word":u"Ceci"},
+            {u"word":u"est"},
+            {u"word":u"un"},
+            {u"word":u"test"},
+            {u"word":u"."}
+        ]
+        
+        cwg = DictGetterFeature(entry="word", x=0) # current word getter feature
+        features = [
+            CheckFeature(u"^[A-Z]", getter=cwg),
+            CheckFeature(u"(t).*\\1", getter=cwg),
+            CheckFeature(u"^CE", flags=re.I, getter=cwg),
+            CheckFeature(u"^\\.$", getter=cwg),
+        ]
+        plan = FeaturePlan(features)
+        memo = {}
+        
+        for feature in features:
+            self.assertEquals(plan.values(feature, data, memo), [feature(data, i) for i in range(len(data))])
+        self.assertEquals(len([key for key in memo if key[0] == u"regexset"]), 1) # every regular expression in a single pass
+        self.assertEquals(plan.cache_info()[u"hits"] + plan.cache_info()[u"misses"], len(data))
+
+    
+    def test_multiword_automaton(self):
+        data = [{u"word":word} for word in u"a b a b c d b c".split()]
+        
+        # "a b c" fails on "d", its suffix "b c" is found without going back.
+        multiword = MultiwordDictionaryFeature(entry="word", path=None, appendice="-x", entries=[u"a b c e", u"b c d", u"b c"])
+        
+        self.assertEquals(multiword(data), [u"O", u"O", u"O", u"B-x", u"I-x", u"I-x", u"B-x", u"I-x"])
+        self.assertEquals([multiword.step(data, i) for i in range(len(data))], [0, 0, 0, 3, 0, 0, 2, 0])
+        
+        multiword._value.add([u"a", u"b", u"a"]) # the automaton is built again
+        self.assertEquals(multiword(data), [u"B-x", u"I-x", u"I-x", u"B-x", u"I-x", u"I-x", u"B-x", u"I-x"])
+        self.assertEquals(multiword.step(data, 0), 3)
+
+    
+    def test_merged_directory(self):
+        data = [{u"word":word} for word in u"Jean Dupont habite à Saint Jean de Luz .".split()]
+        dictionaries = {
+            u"person": u'<dictionary action="multiword" entry="word">\nJean\nJean Dupont\nLuz</dictionary>',
+            u"city": u'<dictionary action="multiword" entry="word">\nSaint Jean de Luz\nSaint Jean</dictionary>',
+            u"punct": u'<dictionary action="token" entry="word">\n.\nà</dictionary>',
+            u".order": u"person\ncity\npunct",
+        }
+        directory = tempfile.mkdtemp()
+        try:
+            for name, content in dictionaries.items():
+                with codecs.open(os.path.join(directory, name), "w", "utf-8") as output_stream:
+                    output_stream.write(content)
+            x2f = XML2Feature([Entry(u"word")], path=os.path.join(directory, u"enrich.xml"))
+            separate = DirectoryFeature(directory, x2f, name=u"directory")
+            merged = DirectoryFeature(directory, x2f, name=u"directory", merged=True)
+        finally:
+            shutil.rmtree(directory)
+        
+        expected = [u"B-person", u"I-person", u"O", u"B-punct", u"B-city", u"I-city", u"I-city", u"I-city", u"B-punct"]
+        self.assertEquals(separate(data), expected)
+        self.assertEquals(merged(data), expected)
+        self.assertEquals(len(merged.merge()[0]), 1) # a single automaton for the entry "word"
+
+    
+    def test_compiled_find_features(self):
+        data = [
+            {u"word":u"Le", u"POS":u"DET"},
+            {u"word":u"chat", u"POS":u"NC"},
+            {u"word":u"de", u"POS":u"P"},
+            {u"word":u"Paris", u"POS":u"NPP"},
+            {u"word":u"dort", u"POS":u"V"}
+        ]
+        
+        noun = CheckFeature(u"^N", getter=DictGetterFeature(entry="POS"))
+        forward = FindForwardFeature(noun, return_entry="word")
+        backward = FindBackwardFeature(noun, return_entry="word")
+        plan = FeaturePlan([forward, backward])
+        memo = {}
+        
+        self.assertEquals(plan.values(forward, data, memo), [u"chat", u"Paris", u"Paris", None, None])
+        self.assertEquals(plan.values(backward, data, memo), [None, None, u"chat", u"chat", u"Paris"])
+        for feature in (forward, backward):
+            self.assertEquals(plan.values(feature, data), [feature(data, i) for i in range(len(data))])
+            self.assertEquals(plan.values(feature, data[:1]), [None])
+
+    
+    def test_rule_features(self):
+        data = [{u"word":word} for word in u"Le Grand Paris compte 2 000 000 habitants et 2 aéroports en Ile de France .".split()]
+        x2f = XML2Feature([Entry(u"word")], path=u"enrich.xml")
+        caps = x2f.parse(ET.fromstring(u'<rule name="caps"><regexp action="check" card="+">^[A-Z]</regexp></rule>'))
+        number = x2f.parse(ET.fromstring(u'<rule name="number"><regexp action="check" card="1,3">^[0-9]+$</regexp><regexp action="check" card="?">^[a-zé]+$</regexp></rule>'.encode("utf-8"))) # bytes: python 2 does not parse non-ASCII unicode
+        location = x2f.parse(ET.fromstring(u'<rule name="loc"><regexp action="check">^[A-Z]</regexp><regexp action="check" card="*">^(de|la)$</regexp><regexp action="check">^[A-Z]</regexp></rule>'))
+        empty = x2f.parse(ET.fromstring(u'<rule name="empty"><regexp action="check" card="?">^x</regexp></rule>'))
+        
+        self.assertEquals(caps(data), [u"B-caps", u"I-caps", u"I-caps"] + [u"O"]*9 + [u"B-caps", u"O", u"B-caps", u"O"])
+        self.assertEquals(number(data), [u"O"]*4 + [u"B-number", u"I-number", u"I-number", u"I-number", u"O", u"B-number", u"I-number"] + [u"O"]*5)
+        self.assertEquals(location(data), [u"B-loc", u"I-loc"] + [u"O"]*10 + [u"B-loc", u"I-loc", u"I-loc", u"O"])
+        self.assertEquals(empty(data), [u"O"]*len(data)) # empty matches are skipped
+        self.assertEquals([caps.step(data, i) for i in range(len(data))], [3, 2, 1] + [0]*9 + [1, 0, 1, 0])
+        self.assertEquals([number.step(data, i) for i in range(len(data))], [0]*4 + [4, 3, 2, 0, 0, 2] + [0]*6)
+        self.assertEquals([location.step(data, i) for i in range(len(data))], [2, 2] + [0]*10 + [3, 0, 0, 0])
+    
+    def test_profiler(self):
+        data = [{u"word":word} for word in u"Ceci est un Test .".split()]
+        cwg = DictGetterFeature(entry="word", x=0) # current word getter feature
+        x2f = XML2Feature([Entry(u"word")], path=u"enrich.xml")
+        trigger = TriggeredFeature(CheckFeature(u"^[A-Z]", getter=cwg), LowerFeature(getter=cwg), name=u"trigger")
+        rule = x2f.parse(ET.fromstring(u'<rule name="caps"><regexp action="check" card="+">^[A-Z]</regexp></rule>'))
+        check = rule._features[0]
+        features = [trigger, rule]
+        expected = [trigger(data, i) for i in range(len(data))]
+        plan = FeaturePlan(features)
+        profiler = FeatureProfiler(features, plan)
+        profiler.attach()
+        
+        for _ in range(2):
+            self.assertEquals(plan.values(trigger, data, {}), expected)
+            profiler.record(trigger, 0.0, len(data))
+        self.assertEquals(rule(data), [u"B-caps", u"O", u"O", u"B-caps", u"O"])
+        
+        rows = dict([(row[u"feature"], row) for row in profiler.report()])
+        self.assertEquals(sorted(rows), [u"caps", u"caps/features[0]", u"trigger", u"trigger/operation", u"trigger/trigger"])
+        self.assertEquals(rows[u"trigger"][u"calls"], 10)
+        self.assertEquals(rows[u"trigger/trigger"][u"calls"], 10) # compiled, evaluated in the plan
+        self.assertEquals((rows[u"trigger/trigger"][u"hits"], rows[u"trigger/trigger"][u"misses"]), (5, 5)) # cached by token type
+        self.assertEquals(rows[u"trigger/operation"][u"hit_rate"], None)
+        self.assertEquals(rows[u"caps/features[0]"][u"calls"], 5) # called by the rule once per token, not compiled
+        self.assertEquals(rows[u"caps/features[0]"][u"type"], u"CheckFeature")
+        self.assertEquals(len(json.loads(profiler.to_json())), 5)
+        
+        profiler.detach()
+        self.assertTrue(rule._features[0] is check)
+        self.assertEquals(rule(data), [u"B-caps", u"O", u"O", u"B-caps", u"O"])
+        self.assertEquals(dict([(row[u"feature"], row[u"calls"]) for row in profiler.report()])[u"caps/features[0]"], 5) # measures are kept
+
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)
@@ -29,19 +29,33 @@ SOFTWARE.
 """
 
 import unittest
-import codecs, os.path
+import codecs, multiprocessing, os.path, shutil, tempfile
 
 from sem import SEM_DATA_DIR
 
 from sem.storage import Document, Corpus
 
-from sem.modules import EnrichModule, CleanModule, WapitiLabelModule, LabelConsistencyModule
+from sem.modules import EnrichModule, CleanModule, WapitiLabelModule, LabelConsistencyModule, SegmentationModule
+from sem.modules.pipeline import Pipeline, Parallel, token_batches
 
 #from sem.information import Entry, Informations
 from sem.modules.enrich import Entry
+from sem.modules.enrich import main as enrich_main, parser as enrich_parser
 from sem.features import DictGetterFeature
 from sem.features import BOSFeature, EOSFeature
 
+def process_parallel(text):
+    # a pipeline with a "process" parallel, run in the daemonic worker of a pool.
+    cwg = DictGetterFeature(entry="word", x=0)
+    bos = EnrichModule(bentries=[Entry(u"word")], features=[BOSFeature(name="BOS", entry="word", getter=cwg)])
+    eos = EnrichModule(bentries=[Entry(u"word")], features=[EOSFeature(name="EOS", entry="word", getter=cwg)])
+    parallel = Parallel([Pipeline([eos]), Pipeline([bos])], names=[u"EOS", u"BOS"], executor="process")
+    try:
+        document = Pipeline([SegmentationModule(u"fr"), parallel]).process_document(Document(u"document", text))
+        return parallel.executor(), [(token[u"BOS"], token[u"EOS"]) for token in document.corpus.sentences[0]]
+    finally:
+        parallel.close()
+
 class TestModules(unittest.TestCase):
     def test_enrich(self):
         document = Document("document", "Ceci est un test.")
@@ -67,6 +81,120 @@ class TestModules(unittest.TestCase):
         
         self.assertEquals(document._corpus.fields, [u"word", u"BOS", u"EOS"])
     
+    def test_enrich_lazy(self):
+        directory = tempfile.mkdtemp()
+        try:
+            infofile = os.path.join(directory, u"enrich.xml")
+            with codecs.open(infofile, "w", "utf-8") as output_stream:
+                output_stream.write(u'<information><entries><before><entry name="word" /></before></entries><features><nullary name="lower" action="lower" /><nullary name="prefix" action="substring" to_index="2" /></features></information>')
+            model = os.path.join(directory, u"model")
+            with codecs.open(model, "w", "utf-8") as output_stream:
+                output_stream.write(u"#mdl#2#1\n#rdr#1/1/0\n17:u:l=%x[0,1],\n")
+            
+            document = Document("document", "Ceci est un test.")
+            document._corpus = Corpus([u"word"], sentences=[[{u"word":u"Ceci"}, {u"word":u"test"}]])
+            
+            enrich = EnrichModule(path=infofile, model=model)
+            enrich.process_document(document)
+            
+            token = document._corpus.sentences[0][0]
+            self.assertEquals(document._corpus.fields, [u"word", u"lower", u"prefix"])
+            self.assertEquals(sorted(token.keys()), [u"lower", u"word"]) # "prefix" is not used by the model
+            self.assertEquals(token[u"prefix"], u"Ce")
+            self.assertEquals(sorted(token.keys()), [u"lower", u"prefix", u"word"])
+            self.assertEquals(document._corpus.sentences[0][1][u"prefix"], u"te") # computed for the whole sentence
+        finally:
+            shutil.rmtree(directory)
+    
+    def test_enrich_stream(self):
+        directory = tempfile.mkdtemp()
+        try:
+            infofile = os.path.join(directory, u"enrich.xml")
+            with codecs.open(infofile, "w", "utf-8") as output_stream:
+                output_stream.write(u'<information><entries><before><entry name="word" /></before><after><entry name="tag" /></after></entries><features><nullary name="lower" action="lower" /><nullary name="EOS" action="EOS" /></features></information>')
+            infile = os.path.join(directory, u"input.conll")
+            with codecs.open(infile, "w", "utf-8") as output_stream:
+                output_stream.write(u"Ceci\tO\nest\tO\n\nUn\tO\ntest\tO\n.\tO\n\nFin\tO\n")
+            
+            expected = u"Ceci\tceci\t0\tO\nest\test\t1\tO\n\nUn\tun\t0\tO\ntest\ttest\t0\tO\n.\t.\t1\tO\n\nFin\tfin\t1\tO\n\n"
+            for n_procs in (1, 2):
+                outfile = os.path.join(directory, u"output-{0}.conll".format(n_procs))
+                enrich_main(enrich_parser.parse_args([infile, infofile, outfile, "-m", "label", "-p", str(n_procs), "--chunk-size", "1"]))
+                with codecs.open(outfile, "r", "utf-8") as input_stream:
+                    self.assertEquals(input_stream.read(), expected)
+        finally:
+            shutil.rmtree(directory)
+    
+    def test_pipeline_batches(self):
+        documents = [Document(u"document{0}".format(i), content) for i, content in enumerate([u"Ceci est un test.", u"Un autre test.", u"Et encore un test ."])]
+        
+        features = []
+        cwg = DictGetterFeature(entry="word", x=0)
+        features.append(BOSFeature(name="BOS", entry="word", getter=cwg))
+        pipeline = Pipeline([SegmentationModule(u"fr"), EnrichModule(bentries=[Entry(u"word")], features=features)])
+        
+        self.assertEquals([len(batch) for batch in token_batches(documents, max_tokens=8)], [2, 1])
+        
+        pipeline.process_documents(documents, max_tokens=8)
+        for document in documents:
+            self.assertEquals(document.corpus.fields, [u"word", u"BOS"])
+            self.assertEquals([token[u"BOS"] for token in document.corpus.sentences[0]][:2], [1, 0])
+        self.assertEquals(len(documents[2].corpus.sentences[0]), 5)
+    
+    def test_pipeline_reload(self):
+        directory = tempfile.mkdtemp()
+        try:
+            dictionary = os.path.join(directory, u"dict.txt")
+            with codecs.open(dictionary, "w", "utf-8") as output_stream:
+                output_stream.write(u"test\n")
+            with codecs.open(os.path.join(directory, u"enrich.xml"), "w", "utf-8") as output_stream:
+                output_stream.write(u'<?xml version="1.0" encoding="UTF-8"?>\n<information><entries><before><entry name="word" /></before></entries>'
+                                    u'<features><dictionary name="dict" action="token" path="dict.txt" entry="word" /></features></information>\n')
+            pipeline = Pipeline([SegmentationModule(u"fr"), EnrichModule(path=os.path.join(directory, u"enrich.xml"))])
+            
+            self.assertEquals(pipeline.changed(), [])
+            self.assertEquals(pipeline.reload(), 0)
+            document = pipeline.process_document(Document(u"document", u"Ceci est un test ."))
+            self.assertEquals([token[u"dict"] for token in document.corpus.sentences[0]], [0, 0, 0, 1, 0])
+            
+            with codecs.open(dictionary, "w", "utf-8") as output_stream:
+                output_stream.write(u"Ceci\ntest\n")
+            self.assertEquals(pipeline.changed(), [1])
+            self.assertEquals(pipeline.reload(), 1)
+            self.assertEquals(pipeline.changed(), [])
+            document = pipeline.process_document(Document(u"document", u"Ceci est un test ."))
+            self.assertEquals([token[u"dict"] for token in document.corpus.sentences[0]], [1, 0, 0, 1, 0])
+        finally:
+            shutil.rmtree(directory)
+    
+    def test_parallel(self):
+        cwg = DictGetterFeature(entry="word", x=0)
+        bos = EnrichModule(bentries=[Entry(u"word")], features=[BOSFeature(name="BOS", entry="word", getter=cwg)])
+        eos = EnrichModule(bentries=[Entry(u"word")], features=[EOSFeature(name="EOS", entry="word", getter=cwg)])
+        parallel = Parallel([Pipeline([eos]), Pipeline([bos, CleanModule(to_keep=[u"word", u"BOS"])])], names=[u"EOS", u"BOS"])
+        pipeline = Pipeline([SegmentationModule(u"fr"), parallel])
+        
+        self.assertEquals(parallel.reads(), [u"word"])
+        self.assertEquals(parallel.writes(), [u"BOS", u"EOS"])
+        
+        document = pipeline.process_document(Document(u"document", u"Ceci est un test."))
+        self.assertEquals(document.corpus.fields, [u"word", u"EOS", u"BOS"])
+        self.assertEquals([token[u"BOS"] for token in document.corpus.sentences[0]], [1, 0, 0, 0, 0])
+        self.assertEquals([token[u"EOS"] for token in document.corpus.sentences[0]], [0, 0, 0, 0, 1])
+        parallel.close()
+        
+        self.assertRaises(ValueError, Parallel, [Pipeline([bos]), Pipeline([bos])])
+        self.assertRaises(ValueError, Parallel, [Pipeline([bos]), Pipeline([EnrichModule(bentries=[Entry(u"BOS")], features=[])])])
+    
+    def test_parallel_in_daemon(self):
+        pool = multiprocessing.Pool(processes=1)
+        try:
+            executor, values = pool.apply(process_parallel, (u"Ceci est un test.",))
+        finally:
+            pool.terminate()
+        self.assertEquals(executor, u"thread") # the workers of a pool cannot have children
+        self.assertEquals(values, [(1, 0), (0, 0), (0, 0), (0, 0), (0, 1)])
+    
     def test_clean(self):
         document = Document("document", "Ceci est un test.")
         corpus = Corpus([u"word", u"remove"], sentences=[[
@@ -0,0 +1,102 @@
+#-*- encoding: utf-8 -*-
+
+"""
+file: test_planner.py
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+import unittest
+import os.path
+import shutil
+import tempfile
+
+from sem.storage import Document
+from sem.modules.pipeline import Pipeline
+from sem.modules import EnrichModule, CleanModule, SegmentationModule
+from sem.planner import plan
+
+_enrich = u"""<information>
+    <entries>
+        <before>
+            <entry name="word" />
+        </before>
+    </entries>
+    <features>
+        <nullary name="lower" action="lower" display="no" />
+        <dictionary name="{0}" action="token" entry="lower">{1}</dictionary>
+        {2}
+    </features>
+</information>
+"""
+
+class TestPlanner(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        enrich1 = _enrich.format(u"first", u"ceci", u'<nullary name="unused" action="substring" to_index="2" />')
+        enrich2 = _enrich.format(u"second", u"test", u"")
+        for name, content in [(u"enrich1.xml", enrich1), (u"enrich2.xml", enrich2)]:
+            with open(os.path.join(self.directory, name), "w") as output_stream:
+                output_stream.write(content)
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def test_plan(self):
+        pipeline = Pipeline([
+            SegmentationModule(u"fr"),
+            EnrichModule(path=os.path.join(self.directory, u"enrich1.xml")),
+            CleanModule(to_keep=u"word,first,unused"),
+            CleanModule(to_keep=u"word"),
+            EnrichModule(path=os.path.join(self.directory, u"enrich2.xml")),
+        ])
+        planned, notes = plan(pipeline)
+        
+        # "first" and "unused" are removed by cleans: they are not computed and cleans do not remove anything anymore.
+        self.assertEquals(len(planned), 3)
+        self.assertEquals([feature.name for feature in planned.pipes[1].features], [u"lower"])
+        self.assertEquals(planned.pipes[2]._reused, set([u"lower"]))
+        self.assertEquals(len(pipeline), 5) # the original pipeline is left untouched
+        
+        document1 = pipeline.process_document(Document(u"document", u"Ceci est un test."))
+        document2 = planned.process_document(Document(u"document", u"Ceci est un test."))
+        self.assertEquals(document2.corpus.fields, [u"word", u"second"])
+        self.assertEquals([[token[u"second"] for token in sentence] for sentence in document1.corpus], [[token[u"second"] for token in sentence] for sentence in document2.corpus])
+    
+    def test_hidden(self):
+        pipeline = Pipeline([
+            SegmentationModule(u"fr"),
+            EnrichModule(path=os.path.join(self.directory, u"enrich1.xml")),
+            CleanModule(to_keep=u"word", hidden=u"lower"),
+        ])
+        document = pipeline.process_document(Document(u"document", u"Ceci est un test."))
+        
+        self.assertEquals(document.corpus.fields, [u"word"])
+        self.assertEquals(sorted(document.corpus.sentences[0][0].keys()), [u"lower", u"word"])
+        self.assertEquals(document.corpus.sentences[0][0][u"lower"], u"ceci")
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,139 @@
+#-*- encoding: utf-8 -*-
+
+"""
+file: test_serve.py
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import unittest
+import json
+import os
+import threading
+import time
+
+try:
+    from urllib2 import urlopen, Request, HTTPError
+except ImportError:
+    from urllib.request import urlopen, Request
+    from urllib.error import HTTPError
+
+from sem.modules import SegmentationModule
+from sem.modules.pipeline import Pipeline
+from sem.modules.serve import TaggingServer
+
+import sem
+
+class SleepModule(object):
+    pipeline_mode = "all"
+    
+    def process_document(self, document, **kwargs):
+        time.sleep(0.5)
+
+class FaultyModule(object):
+    pipeline_mode = "all"
+    
+    def process_document(self, document, **kwargs):
+        if document.content.startswith(u"sleep"):
+            time.sleep(5)
+        elif document.content.startswith(u"crash"):
+            os._exit(1) # a worker killed or crashed in wapiti
+
+class TestServe(unittest.TestCase):
+    def start(self, pipeline, **kwargs):
+        kwargs.setdefault("use_threads", True)
+        server = TaggingServer(pipeline, ("127.0.0.1", 0), **kwargs)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return u"http://127.0.0.1:{0}".format(server.server_address[1])
+    
+    def post(self, url, data, content_type="text/plain"):
+        request = Request(url + u"/annotate", data=data.encode("utf-8"), headers={"Content-Type": content_type})
+        return json.loads(urlopen(request).read().decode("utf-8"))
+    
+    def test_annotate(self):
+        url = self.start(Pipeline([SegmentationModule(u"fr")]))
+        
+        self.assertEquals(json.loads(urlopen(url + u"/health").read().decode("utf-8"))[u"status"], u"ok")
+        
+        data = self.post(url, u"Ceci est un test.")
+        self.assertEquals(len(data[u"segmentations"][u"tokens"][u"spans"]), 5)
+        self.assertEquals(data[u"segmentations"][u"sentences"][u"reference"], u"tokens")
+        
+        data = self.post(url, json.dumps({u"name": u"doc", u"content": u"Un test."}), u"application/json")
+        self.assertEquals(data[u"name"], u"doc")
+        self.assertEquals(len(data[u"segmentations"][u"tokens"][u"spans"]), 3)
+        
+        stats = json.loads(urlopen(url + u"/stats").read().decode("utf-8"))
+        self.assertEquals(stats[u"processed"], 2)
+    
+    def test_limits(self):
+        url = self.start(Pipeline([SleepModule()]), timeout=0.1, max_concurrent=1)
+        
+        try:
+            self.post(url, u"Ceci est un test.")
+            self.fail("request should have timed out")
+        except HTTPError as error:
+            self.assertEquals(error.code, 504)
+        
+        try: # the previous document is still being processed
+            self.post(url, u"Ceci est un test.")
+            self.fail("request should have been rejected")
+        except HTTPError as error:
+            self.assertEquals(error.code, 503)
+    
+    def test_invalid_body(self):
+        url = self.start(Pipeline([SegmentationModule(u"fr")]))
+        
+        request = Request(str(url + u"/annotate"), data=b"\xff\xfeCeci est un test.", headers={"Content-Type": "text/plain"})
+        try:
+            urlopen(request)
+            self.fail("request should have been refused")
+        except HTTPError as error:
+            self.assertEquals(error.code, 400)
+            self.assertEquals(json.loads(error.read().decode("utf-8"))[u"error"], u"invalid UTF-8")
+    
+    @unittest.skipIf(sem.ON_WINDOWS, "worker processes are forked")
+    def test_worker_processes(self):
+        url = self.start(Pipeline([SegmentationModule(u"fr"), FaultyModule()]), timeout=1.0, max_concurrent=1, use_threads=False)
+        
+        for content, code in [(u"sleep", 504), (u"crash", 500), (u"crash", 500)]:
+            try:
+                self.post(url, content)
+                self.fail("request should have failed")
+            except HTTPError as error:
+                self.assertEquals(error.code, code)
+        
+        # workers were replaced and slots released: documents are still processed.
+        data = self.post(url, u"Ceci est un test.")
+        self.assertEquals(len(data[u"segmentations"][u"tokens"][u"spans"]), 5)
+        stats = json.loads(urlopen(url + u"/stats").read().decode("utf-8"))
+        self.assertEquals((stats[u"processed"], stats[u"timeouts"], stats[u"errors"], stats[u"recycled"], stats[u"in_flight"]), (1, 1, 2, 3, 0))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
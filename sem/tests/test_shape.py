@@ -0,0 +1,76 @@
+#-*- encoding: utf-8 -*-
+
+"""
+file: test_shape.py
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+"""
+
+import unittest
+import pickle
+
+from sem.CRF.template import TestPattern
+from sem.CRF.shape import shape, shape_test, LOWER, UPPER, DIGIT, PUNCT, OTHER, CASED
+
+TOKENS = [u"", u"Paris", u"PARIS", u"paris", u"É", u"1984", u"12", u"3", u"3,14", u"...", u"-", u"--", u"a-b", u"ab-", u"-ab", u"_x-1", u"_x-10", u"C3PO", u"l'été", u"#", u"Ⅰ", u"a\nb", u"A\n", u"\n", u"-\n-"]
+
+class TestShape(unittest.TestCase):
+    def test_shape(self):
+        signature = shape(u"Paris-12")
+        self.assertEquals(signature.mask, LOWER | UPPER | DIGIT | PUNCT | CASED)
+        self.assertEquals(signature.first, UPPER | CASED)
+        self.assertEquals(signature.last, DIGIT)
+        self.assertEquals(signature.length, 8)
+        self.assertEquals(signature.prefixes, (u"P", u"Pa", u"Par", u"Pari"))
+        self.assertEquals(signature.suffixes, (u"2", u"12", u"-12", u"s-12"))
+        self.assertTrue(signature.all(LOWER | UPPER | DIGIT | PUNCT))
+        self.assertFalse(signature.all(LOWER | UPPER))
+        numeral = u"Ⅰ" # not \u, str.isupper depends on the unicode database of python
+        self.assertEquals(shape(numeral).mask, OTHER | (CASED if numeral.isupper() else 0))
+        self.assertEquals(shape(u"").first, 0)
+        self.assertTrue(shape(u"Paris-12") is signature)
+    
+    def test_shape_tests(self):
+        patterns = [u"^\\u", u"^\\d\\d\\d\\d$", u"^\\d\\d$", u"^\\d$", u"^\\p*$", u"^\\u*$", u"^\\d*$", u"^\\d+$", u"^\\w\\w*$", u"\\a", u"\\p+", u"\\l$", u"^-", u"-$", u"-", u"^_x-1$"]
+        for pattern in patterns:
+            test = shape_test(pattern)
+            self.assertFalse(test is None, pattern)
+            search = TestPattern(0, 0, pattern)._pattern.search
+            for token in TOKENS:
+                found = test(token)
+                if found is not None:
+                    self.assertEquals(found, search(token) is not None, (pattern, token))
+                else:
+                    self.assertTrue(u"\n" in token)
+        
+        for pattern in [u"^\\d\\d*\\p\\d\\d*$", u"\\u.*\\u", u"^\\U", u"\\u*", u"^(a|b)"]:
+            self.assertTrue(shape_test(pattern) is None, pattern)
+    
+    def test_pickle(self):
+        pattern = pickle.loads(pickle.dumps(TestPattern(0, 0, u"^\\u"), pickle.HIGHEST_PROTOCOL))
+        self.assertTrue(pattern._test(u"Paris"))
+        self.assertEquals(pattern._results, {})
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,90 @@
+#-*- encoding: utf-8 -*-
+
+"""
+file: test_snapshot.py
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import unittest
+import os.path
+import shutil
+import tempfile
+
+import sem.snapshot
+
+from sem.modules.compile_pipeline import compile_pipeline
+from sem.modules.tagger import load_master
+
+_master = u"""<master>
+    <pipeline>
+        <segmentation tokeniser="fr" />
+    </pipeline>
+    <options>
+        <export format="jason" />
+    </options>
+</master>
+"""
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.master = os.path.join(self.directory, u"master.xml")
+        self.snapshot = os.path.join(self.directory, u"master.snapshot")
+        with open(self.master, "w") as output_stream:
+            output_stream.write(_master)
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def test_snapshot(self):
+        compile_pipeline(self.master, self.snapshot)
+        
+        self.assertTrue(sem.snapshot.is_snapshot(self.snapshot))
+        self.assertFalse(sem.snapshot.is_snapshot(self.master))
+        
+        pipeline, options, exporter, couples = sem.snapshot.load_snapshot(self.snapshot)
+        self.assertEquals(len(pipeline), 1)
+        self.assertEquals(couples, {u"format": u"jason"})
+        self.assertEquals(options.get("export", "format"), u"jason")
+    
+    def test_stale(self):
+        compile_pipeline(self.master, self.snapshot)
+        
+        # same content, only mtime changes: the snapshot is still valid
+        mtime = os.stat(self.master).st_mtime + 10
+        os.utime(self.master, (mtime, mtime))
+        self.assertEquals(sem.snapshot.stale_reasons(sem.snapshot.read_header(self.snapshot)), [])
+        
+        with open(self.master, "a") as output_stream:
+            output_stream.write(u"\n")
+        self.assertEquals(len(sem.snapshot.stale_reasons(sem.snapshot.read_header(self.snapshot))), 1)
+        self.assertRaises(sem.snapshot.SnapshotError, sem.snapshot.load_snapshot, self.snapshot)
+        
+        pipeline, options, exporter, couples = load_master(self.snapshot) # falls back to master
+        self.assertEquals(len(pipeline), 1)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
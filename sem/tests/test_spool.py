@@ -0,0 +1,82 @@
+#-*- encoding: utf-8 -*-
+
+"""
+file: test_spool.py
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import unittest
+import os
+import os.path
+import shutil
+import tempfile
+import time
+
+from sem.spool import Spool
+
+class TestSpool(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.source = os.path.join(self.directory, u"document.txt")
+        with open(self.source, "w") as output_stream:
+            output_stream.write("Ceci est un test.")
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def test_claim(self):
+        spool = Spool(os.path.join(self.directory, u"spool"), worker=u"worker1")
+        other = Spool(os.path.join(self.directory, u"spool"), worker=u"worker2")
+        spool.submit(self.source)
+        self.assertEquals(spool.pending(), [u"document.txt"])
+        
+        lease = spool.claim()
+        self.assertEquals(lease.name, u"document.txt")
+        self.assertEquals(other.claim(), None) # only one worker gets a file
+        self.assertEquals(other.leases(), [(u"worker1", u"document.txt")])
+        
+        output_directory = spool.output_directory()
+        with open(os.path.join(output_directory, u"document.json"), "w") as output_stream:
+            output_stream.write("{}")
+        self.assertTrue(spool.complete(lease, output_directory))
+        self.assertEquals(os.listdir(spool.path(u"outbox")), [u"document.json"])
+        self.assertEquals(os.listdir(spool.path(u"done")), [u"document.txt"])
+        self.assertEquals(spool.leases(), [])
+    
+    def test_expired(self):
+        spool = Spool(os.path.join(self.directory, u"spool"), worker=u"worker1", lease_timeout=10.0)
+        other = Spool(os.path.join(self.directory, u"spool"), worker=u"worker2", lease_timeout=10.0)
+        spool.submit(self.source)
+        lease = spool.claim()
+        
+        self.assertEquals(other.requeue_expired(), [])
+        self.assertEquals(other.requeue_expired(now=time.time() + 20), [u"document.txt"]) # worker1 crashed
+        self.assertTrue(lease.lost)
+        self.assertFalse(spool.complete(lease, spool.output_directory()))
+        self.assertEquals(other.claim().name, u"document.txt")
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,68 @@
+#-*- encoding: utf-8 -*-
+
+"""
+file: test_stages.py
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import unittest
+import multiprocessing
+
+from sem.stages import StagedExecutor, StageError, pool_map
+
+def double(item):
+    index, value = item
+    return index, value * 2
+
+class TestStages(unittest.TestCase):
+    def test_run(self):
+        written = {}
+        def write(index, result):
+            written[index] = result
+        
+        executor = StagedExecutor(lambda item: item + 1, write, readers=3, writers=2, queue_size=2)
+        executor.run(range(100), lambda values: (double(value) for value in values))
+        self.assertEquals(written, dict([(i, (i + 1) * 2) for i in range(100)]))
+        
+        written.clear()
+        pool = multiprocessing.Pool(processes=2)
+        try:
+            executor.run(range(100), pool_map(pool, double, 4))
+        finally:
+            pool.terminate()
+        self.assertEquals(written, dict([(i, (i + 1) * 2) for i in range(100)]))
+    
+    def test_error(self):
+        def read(item):
+            if item == 50:
+                raise ValueError(u"unreadable")
+            return item
+        
+        executor = StagedExecutor(read, lambda index, result: None, queue_size=2)
+        self.assertRaises(StageError, executor.run, range(100), lambda values: (double(value) for value in values))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,83 @@
+#-*- encoding: utf-8 -*-
+
+"""
+file: test_workers.py
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import unittest
+import time
+
+from sem.workers import WorkerPool, process_rss
+
+def work(item):
+    if item == u"slow":
+        time.sleep(60)
+    elif item == u"error":
+        raise ValueError(u"invalid document")
+    elif item == u"big":
+        data = b"x" * (256 * 2**20)
+        time.sleep(60)
+    return item.upper()
+
+def timed(item):
+    start = time.time()
+    time.sleep(0.2)
+    return start, time.time()
+
+class TestWorkers(unittest.TestCase):
+    def test_limits(self):
+        items = [u"a", u"slow", u"b", u"error", u"c", u"big", u"d"]
+        pool = WorkerPool(work, processes=2, timeout=2.0, max_memory=(128 * 2**20 if process_rss() is not None else None), max_tasks=2, poll_interval=0.05)
+        results = dict([(index, (result, error)) for index, result, error in pool.imap_unordered(items)])
+        
+        self.assertEquals(sorted(results.keys()), list(range(len(items))))
+        self.assertEquals([results[i][0] for i in (0, 2, 4, 6)], [u"A", u"B", u"C", u"D"]) # the rest of the batch is processed
+        self.assertEquals(results[1][1][0], u"timeout")
+        self.assertEquals(results[3][1][0], u"error")
+        if process_rss() is not None:
+            self.assertEquals(results[5][1][0], u"memory")
+        self.assertTrue(pool.recycled >= 2)
+    
+    def test_budget(self):
+        costs = {u"a": 6, u"b": 6, u"c": 3, u"d": 20, u"e": 1}
+        items = [u"a", u"b", u"c", u"d", u"e"]
+        pool = WorkerPool(timed, processes=3, cost=costs.get, budget=10, poll_interval=0.01)
+        spans = dict([(items[index], result) for index, result, error in pool.imap_unordered(items)])
+        
+        self.assertEquals(sorted(spans.keys()), sorted(items)) # the document over budget is processed alone
+        for first in items:
+            for second in items:
+                overlap = first < second and spans[first][0] < spans[second][1] and spans[second][0] < spans[first][1]
+                if overlap:
+                    self.assertTrue(costs[first] + costs[second] <= 10)
+        telemetry = pool.telemetry()
+        self.assertEquals(telemetry[u"items"], len(items))
+        self.assertTrue(telemetry[u"peak_estimate"] <= 20)
+        self.assertEquals(sorted([record[u"cost"] for record in pool.records]), sorted(costs.values()))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -123,48 +123,109 @@ def label_corpus(corpus, model, field, encoding):
             corpus.sentences[i][j][field] = element
             j += 1
 
-def label_document(document, model, field, encoding, annotation_name=None, annotation_fields=None):
-    if annotation_fields is None:
-        fields = document.corpus.fields
-    else:
-        fields = annotation_fields
-    
-    if annotation_name is None:
-        annotation_name = unicode(field)
-    
+def label_command(model):
+    return [command_name(), "label", "-m", model, "--label"]
+
+def label_unicode(corpus_unicode, model, encoding):
+    """
+    Label CoNLL-formatted data with "wapiti label --label". Returns the
+    labels of each sentence.
+    """
     check_model_available(model, logger=wapiti_logger)
     
-    corpus_unicode = document.corpus.unicode(fields).encode(encoding)
-    
-    cmd = [command_name(), "label", "-m", model, "--label"]
+    cmd = label_command(model)
     
     wapiti_process     = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    w_stdout, w_stderr = wapiti_process.communicate(input=corpus_unicode)
+    w_stdout, w_stderr = wapiti_process.communicate(input=corpus_unicode.encode(encoding))
     
+    check_status(wapiti_process.returncode, w_stderr, encoding)
+    return parse_labels(w_stdout, encoding)
+
+def check_status(returncode, stderr, encoding):
+    """
+    Log the error output of wapiti and raise a RuntimeError if it failed.
+    """
     try:
-        if wapiti_process.returncode != 0:
-            raise RuntimeError("%s exited with status %i" %(command_name(), wapiti_process.returncode))
+        if returncode != 0:
+            raise RuntimeError("%s exited with status %i" %(command_name(), returncode))
     except RuntimeError as rte:
-        for error_part in [line for line in w_stderr.split(u"\n") if line.strip() != ""]:
+        for error_part in [line for line in stderr.decode(encoding, "replace").split(u"\n") if line.strip() != ""]:
             wapiti_logger.error(error_part)
         wapiti_logger.exception(rte)
         raise
-    
-    i    = 0
-    j    = 0
+
+def parse_labels(stdout, encoding):
+    """
+    Return the labels of each sentence in the output of "wapiti label
+    --label".
+    """
     tags = [[]]
-    w_stdout = w_stdout.decode(encoding)
-    document.corpus.fields.append(field)
-    for element in w_stdout.split(u"\n"):
+    for element in stdout.decode(encoding).split(u"\n"):
         element = element.strip()
         if "" == element:
             if len(tags[-1]) > 0:
                 tags.append([])
-                i += 1
-                j  = 0
         else:
             tags[-1].append(element)
-            j += 1
     
-    tags = [t for t in tags if t]
+    return [t for t in tags if t]
+
+_placeholder = u"_"
+
+def sentence_unicode(sentence, fields, columns=None):
+    """
+    Return a sentence as CoNLL-formatted unicode. If columns is given, only
+    the values of those columns are read from tokens, the other columns are
+    not used by the model and a placeholder is written instead, so that
+    values that are computed on access (see sem.storage.corpus.LazyToken)
+    are not computed.
+    """
+    selected = [(field if columns is None or i in columns else None) for i, field in enumerate(fields)]
+    lines = []
+    for token in sentence:
+        lines.append(u"\t".join([(_placeholder if field is None else u"{0}".format(token[field])) for field in selected]))
+        lines.append(u"\n")
+    return u"".join(lines)
+
+def corpus_unicode(corpus, fields, columns=None):
+    """
+    Return a corpus as CoNLL-formatted unicode, see sentence_unicode.
+    """
+    return u"\n".join([sentence_unicode(sentence, fields, columns) for sentence in corpus])
+
+def label_document(document, model, field, encoding, annotation_name=None, annotation_fields=None, columns=None):
+    if annotation_fields is None:
+        fields = document.corpus.fields
+    else:
+        fields = annotation_fields
+    
+    if annotation_name is None:
+        annotation_name = u"{0}".format(field)
+    
+    tags = label_unicode(corpus_unicode(document.corpus, fields, columns), model, encoding)
+    document.corpus.fields.append(field)
     document.add_annotation_from_tags(tags, field, annotation_name)
+
+def label_documents(documents, model, field, encoding, annotation_name=None, annotation_fields=None, columns=None):
+    """
+    Label documents with a single call to wapiti, the model is only loaded
+    once for all documents.
+    """
+    if annotation_name is None:
+        annotation_name = u"{0}".format(field)
+    
+    documents = [document for document in documents if len(document.corpus) > 0]
+    if not documents:
+        return
+    
+    corpora = [corpus_unicode(document.corpus, annotation_fields or document.corpus.fields, columns) for document in documents]
+    tags = label_unicode(u"\n".join(corpora), model, encoding)
+    if len(tags) != sum([len(document.corpus) for document in documents]):
+        raise RuntimeError("wapiti labeled {0} sentences, {1} expected".format(len(tags), sum([len(document.corpus) for document in documents])))
+    
+    beg = 0
+    for document in documents:
+        end = beg + len(document.corpus)
+        document.corpus.fields.append(field)
+        document.add_annotation_from_tags(tags[beg : end], field, annotation_name)
+        beg = end
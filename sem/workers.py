@@ -0,0 +1,315 @@
+#-*- coding: utf-8 -*-
+
+"""
+file: workers.py
+
+Description: a pool of worker processes that are supervised one task at a
+time. Unlike multiprocessing.Pool, a task that runs for too long or makes
+its worker use too much memory can be stopped (its worker is killed and
+replaced) without losing the other tasks. Workers may also be replaced
+after a number of tasks or once their memory grew above a threshold.
+
+author: Yoann Dupont
+
+MIT License
+
+Copyright (c) 2018 Yoann Dupont
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import codecs
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+from sem.logger import default_handler
+
+workers_logger = logging.getLogger("sem.workers")
+workers_logger.addHandler(default_handler)
+
+TIMEOUT = u"timeout"
+MEMORY = u"memory"
+ERROR = u"error"
+CRASH = u"crash"
+
+def process_rss(pid=None):
+    """
+    Return the resident memory of a process in bytes, None if it cannot be
+    known (only /proc is read, so it is only known on Linux).
+    """
+    try:
+        with open("/proc/{0}/statm".format(pid or os.getpid()), "rb") as input_stream:
+            return int(input_stream.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError, IndexError, AttributeError):
+        return None
+
+def peak_rss():
+    """
+    Return the peak resident memory of the current process in bytes, None if
+    it cannot be known.
+    """
+    try:
+        import resource
+    except ImportError: # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return (peak if sys.platform == "darwin" else peak * 1024)
+
+def _work(function, connection):
+    while True:
+        try:
+            task = connection.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        index, item = task
+        try:
+            result = (index, function(item), None)
+        except MemoryError:
+            result = (index, None, (MEMORY, u"MemoryError"))
+        except Exception as exc:
+            result = (index, None, (ERROR, u"{0}: {1}".format(exc.__class__.__name__, exc)))
+        connection.send(result + (process_rss(), peak_rss()))
+    connection.close()
+
+def _wait(connections, timeout):
+    try:
+        from multiprocessing.connection import wait
+    except ImportError: # python 2
+        end = time.time() + timeout
+        while True:
+            ready = [connection for connection in connections if connection.poll(0)]
+            if ready or time.time() >= end:
+                return ready
+            time.sleep(min(0.01, max(end - time.time(), 0)))
+    return wait(connections, timeout)
+
+class Worker(object):
+    def __init__(self, function):
+        self.connection, child_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_work, args=(function, child_connection))
+        self.process.daemon = True
+        self.process.start()
+        child_connection.close()
+        self.task = None # (index, start time, cost) of the current task
+        self.tasks = 0
+
+    def send(self, index, item, cost=0):
+        self.connection.send((index, item))
+        self.task = (index, time.time(), cost)
+
+    def stop(self, kill=False):
+        if kill:
+            self.process.terminate()
+        else:
+            try:
+                self.connection.send(None)
+            except (IOError, OSError):
+                self.process.terminate()
+        self.process.join()
+        self.connection.close()
+
+class WorkerPool(object):
+    """
+    A pool of processes applying function to items, one item at a time.
+
+    Attributes
+    ----------
+    _function : callable
+        the function applied to each item. Workers are forked, it does not
+        have to be picklable, but the items and the results do.
+    _processes : int
+        the number of worker processes.
+    _timeout : float
+        the maximum number of seconds for an item (None: no limit).
+    _max_memory : int
+        the maximum resident memory of a worker processing an item in bytes
+        (None: no limit).
+    _max_tasks : int
+        the number of items after which a worker is replaced (None: never).
+    _recycle_memory : int
+        the resident memory in bytes above which a worker is replaced after
+        its current item (None: never).
+    _cost : callable
+        gives the estimated memory cost of an item in bytes (None: items
+        cost nothing).
+    _budget : int
+        the maximum total cost of the items being processed at once. An item
+        waits until the others leave enough room, an item that costs more
+        than the budget is processed alone (None: no limit).
+    """
+
+    def __init__(self, function, processes=1, timeout=None, max_memory=None, max_tasks=None, recycle_memory=None, cost=None, budget=None, poll_interval=0.1):
+        self._function = function
+        self._processes = max(processes, 1)
+        self._timeout = timeout
+        self._max_memory = max_memory
+        self._max_tasks = max_tasks
+        self._recycle_memory = recycle_memory
+        self._poll_interval = poll_interval
+        self._cost = cost
+        self._budget = budget
+        self._workers = []
+        self._recycled = 0
+        self._records = [] # telemetry of each item, see telemetry
+        self._peak_cost = 0
+        self._peak_rss = 0
+
+        if (max_memory or recycle_memory) and process_rss() is None:
+            workers_logger.warn("memory of processes cannot be measured on this system, memory limits are ignored")
+
+    @property
+    def recycled(self):
+        return self._recycled
+
+    @property
+    def records(self):
+        """
+        The telemetry of each processed item: its index, estimated cost,
+        processing time and the resident memory (current and peak) of its
+        worker once it was processed.
+        """
+        return self._records
+
+    def telemetry(self):
+        """
+        A summary of estimated costs against the memory actually used: the
+        peak of the total estimated cost of items processed at once and the
+        peak of the total resident memory of the workers (sampled while they
+        work). The baseline is the smallest resident memory of a worker after
+        an item, mostly the memory of what the function holds (the pipeline).
+        """
+        rss = [record[u"rss"] for record in self._records if record[u"rss"] is not None]
+        return {
+            u"items": len(self._records),
+            u"peak_estimate": self._peak_cost,
+            u"peak_rss": self._peak_rss,
+            u"baseline_rss": (min(rss) if rss else None),
+            u"max_worker_peak_rss": max([record[u"peak_rss"] or 0 for record in self._records] or [0]),
+        }
+
+    def _sample(self):
+        busy = [worker for worker in self._workers if worker.task is not None]
+        self._peak_cost = max(self._peak_cost, sum([worker.task[2] for worker in busy]))
+        self._peak_rss = max(self._peak_rss, sum([process_rss(worker.process.pid) or 0 for worker in self._workers]))
+
+    def _replace(self, worker, kill=False):
+        worker.stop(kill=kill)
+        self._workers[self._workers.index(worker)] = Worker(self._function)
+        self._recycled += 1
+
+    def imap_unordered(self, items):
+        """
+        Apply function to every item. items may be any iterable, an item is
+        only taken when a worker is available. Yields (index, result, error)
+        tuples in the order items are completed. error is None if function
+        succeeded, otherwise it is a (reason, message) couple, the reason
+        being one of "timeout", "memory", "error" or "crash".
+        """
+        pending = enumerate(items)
+        exhausted = False
+        held = None # the next (index, item, cost), taken but not dispatched yet
+        self._workers = []
+        try:
+            while True:
+                # items are only taken when a worker is idle, items may be produced lazily.
+                for worker in self._workers + [None] * (self._processes - len(self._workers)):
+                    if worker is not None and worker.task is not None:
+                        continue
+                    if held is None and not exhausted:
+                        try:
+                            index, item = next(pending)
+                            held = (index, item, (self._cost(item) if self._cost is not None else 0))
+                        except StopIteration:
+                            exhausted = True
+                    if held is None:
+                        break
+                    in_flight = sum([other.task[2] for other in self._workers if other.task is not None])
+                    if self._budget is not None and in_flight > 0 and in_flight + held[2] > self._budget:
+                        break # waiting for room in the budget
+                    if worker is None:
+                        worker = Worker(self._function)
+                        self._workers.append(worker)
+                    worker.send(*held)
+                    held = None
+
+                busy = [worker for worker in self._workers if worker.task is not None]
+                if exhausted and held is None and not busy:
+                    break
+                if self._cost is not None:
+                    self._sample()
+                ready = _wait([worker.connection for worker in busy], self._poll_interval)
+                for worker in busy:
+                    index, start, cost = worker.task
+                    if worker.connection in ready:
+                        try:
+                            index, result, error, rss, peak = worker.connection.recv()
+                        except (EOFError, IOError, OSError):
+                            worker.task = None
+                            yield index, None, (CRASH, u"worker exited with code {0}".format(worker.process.exitcode))
+                            self._replace(worker, kill=True)
+                            continue
+                        worker.task = None
+                        worker.tasks += 1
+                        self._records.append({u"index": index, u"cost": cost, u"seconds": time.time() - start, u"rss": rss, u"peak_rss": peak})
+                        yield index, result, error
+                        if error is not None and error[0] == MEMORY:
+                            self._replace(worker, kill=True)
+                        elif self._max_tasks and worker.tasks >= self._max_tasks:
+                            self._replace(worker)
+                        elif self._recycle_memory and rss is not None and rss > self._recycle_memory:
+                            workers_logger.info("worker %i uses %i MB, replacing it", worker.process.pid, rss // 2**20)
+                            self._replace(worker)
+                    elif self._timeout is not None and time.time() - start > self._timeout:
+                        worker.task = None
+                        yield index, None, (TIMEOUT, u"not processed within {0} seconds".format(self._timeout))
+                        self._replace(worker, kill=True)
+                    elif self._max_memory is not None and (process_rss(worker.process.pid) or 0) > self._max_memory:
+                        worker.task = None
+                        yield index, None, (MEMORY, u"worker used more than {0} MB".format(self._max_memory // 2**20))
+                        self._replace(worker, kill=True)
+                    elif not worker.process.is_alive():
+                        worker.task = None
+                        yield index, None, (CRASH, u"worker exited with code {0}".format(worker.process.exitcode))
+                        self._replace(worker, kill=True)
+        finally:
+            for worker in self._workers:
+                worker.stop(kill=(worker.task is not None))
+            self._workers = []
+
+def write_records(filename, records):
+    """
+    Append dicts to a file, one JSON object per line.
+    """
+    with codecs.open(filename, "a", "utf-8") as output_stream:
+        for record in records:
+            output_stream.write(json.dumps(record, sort_keys=True) + u"\n")
+
+def write_quarantine(filename, entries):
+    """
+    Append quarantined items to a report, one JSON object per line. Each
+    entry is a dict, usually with the name of the document, the reason and
+    a message.
+    """
+    write_records(filename, entries)